@@ -0,0 +1,45 @@
+"""Undoing and redoing in the app restore the whole game, not only the map"""
+
+import random
+from collections.abc import Iterator
+
+import pygame
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.app import App
+from tetrominos.persistent import History
+
+
+@pytest.fixture(name="app")
+def fixture_app(monkeypatch: pytest.MonkeyPatch) -> Iterator[App]:
+    """Return an app drawing to a window of the dummy video driver"""
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    app = App()
+    yield app
+    app.overlay.profiler.close()
+    pygame.quit()
+
+
+def test_travel_history_restores_the_game(app: App) -> None:
+    """Undo and redo restore the map and the statistics, and restart the timers"""
+    engine = app.engine
+    engine.reset(2)
+    app.history = History(app.game_version())
+    rng = random.Random(2)
+    while engine.stats.pieces_placed < 3:
+        engine.apply(rng.choice(list(Action)))
+        app.process_game_logic()
+    app.process_game_logic(5)
+    played = app.history.current
+
+    app.travel_history(backward=True)
+    previous = app.history.current
+    assert engine.stats == previous.stats
+    assert engine.stats.pieces_placed == 2
+    assert engine.map.snapshot() == previous.map.snapshot()
+    assert engine.gravity_timer == engine.lock_timer == 0
+
+    app.travel_history(backward=False)
+    assert engine.stats == played.stats
+    assert engine.map.snapshot() == played.map.snapshot()
@@ -0,0 +1,40 @@
+"""Comparing benchmark results flags the regressions and the missing benchmarks"""
+
+import argparse
+import json
+from pathlib import Path
+
+import pytest
+
+from tetrominos.benchmark import compare_command
+
+
+def write_results(path: Path, timings: dict[str, float]) -> str:
+    """Write a result file holding the best timing of some benchmarks"""
+    results = {name: {"best": best} for name, best in timings.items()}
+    path.write_text(json.dumps({"results": results}), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    ("current", "status"),
+    [
+        ({"a": 1.0, "b": 1.05}, 0),
+        ({"a": 1.0, "b": 1.5}, 1),
+        ({"a": 1.0}, 1),
+        ({"a": 1.0, "b": 1.0, "c": 1.0}, 0),
+    ],
+)
+def test_compare_status(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str], current: dict[str, float], status: int
+) -> None:
+    """The comparison fails on a regression or a missing benchmark, not on a new one"""
+    arguments = argparse.Namespace(
+        baseline=write_results(tmp_path / "baseline.json", {"a": 1.0, "b": 1.0}),
+        current=write_results(tmp_path / "current.json", current),
+        threshold=0.1,
+    )
+    assert compare_command(arguments) == status
+    output = capsys.readouterr().out
+    assert ("MISSING" in output) == ("b" not in current)
+    assert ("NEW" in output) == ("c" in current)
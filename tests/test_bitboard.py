@@ -0,0 +1,98 @@
+"""The bitboard keeps the occupancy, colors and skyline of the locked blocks consistent,
+shares its empty lines, and a map survives a snapshot round-trip"""
+
+import random
+
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.bitboard import Bitboard, empty_line
+from tetrominos.engine import Engine
+from tetrominos.map import Map
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def test_add_and_read_blocks() -> None:
+    """A block added inside the board is occupied with its color, outside it is ignored"""
+    board = Bitboard(4, 6)
+    board.add((1, 4), RED)
+    board.add((4, 4), RED)
+    board.add((0, -1), RED)
+    assert board.is_occupied((1, 4))
+    assert board.get_color((1, 4)) == RED
+    assert board.get_color((0, 4)) is None
+    assert not board.is_occupied((4, 4))
+    assert not board.is_occupied((-1, 4))
+    assert len(board) == 1
+    assert board.skyline == [6, 4, 6, 6]
+    assert board.top == 4
+
+
+def test_clear_rows_moves_lines_down() -> None:
+    """Clearing a complete row moves the lines above it down with their colors"""
+    board = Bitboard(3, 4)
+    for x in range(3):
+        board.add((x, 3), RED)
+    board.add((1, 2), BLUE)
+    board.add((2, 1), RED)
+    assert board.complete_rows() == [3]
+    board.clear_rows([3])
+    assert dict(board.blocks()) == {(1, 3): BLUE, (2, 2): RED}
+    assert board.skyline == [4, 3, 2]
+    assert board.colors[0] is empty_line(3)
+    assert board.complete_rows() == []
+
+
+def test_empty_lines_are_shared() -> None:
+    """Only the lines holding blocks are allocated, even on a large board"""
+    board = Bitboard(10, 100_000)
+    board.add((3, 99_999), RED)
+    board.add((5, 50_000), BLUE)
+    allocated = [line for line, colors in enumerate(board.colors) if colors is not empty_line(10)]
+    assert allocated == [50_000, 99_999]
+    assert board.top == 50_000
+    assert list(board.blocks()) == [((5, 50_000), BLUE), ((3, 99_999), RED)]
+
+
+def test_bytes_round_trip() -> None:
+    """Loading the bytes of a board gives back its blocks, skyline and empty lines"""
+    board = Bitboard(5, 8)
+    rng = random.Random(0)
+    for _ in range(15):
+        board.add((rng.randrange(5), rng.randrange(3, 8)), rng.choice((RED, BLUE)))
+    copy = Bitboard(5, 8, board.palette[1:])
+    copy.load_bytes(board.to_bytes())
+    assert dict(copy.blocks()) == dict(board.blocks())
+    assert copy.rows == board.rows
+    assert copy.skyline == board.skyline
+    assert all(copy.colors[line] is empty_line(5) for line in range(3))
+
+
+def test_palette_limit() -> None:
+    """A palette can not hold more colors than a byte can index"""
+    board = Bitboard(1, 1)
+    with pytest.raises(ValueError):
+        for red in range(256):
+            board.color_index((red, 0, 0))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_snapshot_round_trip(seed: int) -> None:
+    """A map restored from a snapshot has the same blocks, tetrominos and hashes"""
+    rng = random.Random(seed)
+    engine = Engine(10, 40)
+    engine.reset(seed)
+    while engine.stats.pieces_placed < 30 and not engine.done:
+        engine.step(rng.choice(list(Action)))
+    game_map = engine.map
+
+    copy = Map.from_snapshot(game_map.snapshot())
+    assert dict(copy.board.blocks()) == dict(game_map.board.blocks())
+    assert copy.active_tetromino.state == game_map.active_tetromino.state
+    assert copy.generator.preview == game_map.generator.preview
+    assert copy.zobrist_hash == game_map.zobrist_hash
+    assert copy.features.current() == game_map.features.current()
+    assert copy.game_over == game_map.game_over
+    assert copy.snapshot() == game_map.snapshot()
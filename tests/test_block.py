@@ -0,0 +1,58 @@
+"""Blocks are interned immutable flyweights and merged collections are views"""
+
+import copy
+import pickle
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from tetrominos.block import Block, BlockCollection, ReadOnlyBlockCollection
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def test_blocks_are_interned() -> None:
+    """There is a single block per color, even once pickled or copied"""
+    block = Block(RED)
+    assert Block((255, 0, 0)) is block
+    assert Block(BLUE) is not block
+    assert pickle.loads(pickle.dumps(block)) is block
+    assert copy.deepcopy(block) is block
+
+
+def test_blocks_are_immutable() -> None:
+    """A block can not be changed, as every collection shares it"""
+    with pytest.raises(FrozenInstanceError):
+        setattr(Block(RED), "color", BLUE)
+    assert not hasattr(Block(RED), "__dict__")
+
+
+def test_merge_is_a_live_view() -> None:
+    """A merged collection favors the right operand and reflects later changes
+    of the merged collections, which it never modifies"""
+    left = BlockCollection({(0, 0): Block(RED), (1, 0): Block(RED)})
+    right = BlockCollection({(1, 0): Block(BLUE)})
+    merged = left | right
+    assert merged.collection[(1, 0)] is Block(BLUE)
+
+    left.add((2, 0), Block(RED))
+    assert merged.collection[(2, 0)] is Block(RED)
+    merged.add((3, 0), Block(BLUE))
+    assert (3, 0) not in left.collection and (3, 0) not in right.collection
+    assert len(merged.collection) == 4
+
+
+def test_read_only_collection() -> None:
+    """A read-only collection refuses changes and reflects its mapping"""
+    blocks = {(0, 0): Block(RED)}
+    read_only = ReadOnlyBlockCollection(blocks)
+    with pytest.raises(TypeError):
+        read_only.add((1, 0), Block(RED))
+    with pytest.raises(TypeError):
+        read_only.delete_row(0)
+    blocks[(1, 0)] = Block(BLUE)
+    assert read_only.collection[(1, 0)] is Block(BLUE)
+    merged = read_only | BlockCollection()
+    merged.add((2, 0), Block(RED))
+    assert (2, 0) not in blocks
@@ -0,0 +1,40 @@
+"""The controls time every move of the tetromino, pressed or repeated"""
+
+from tetrominos.action import Action
+from tetrominos.controls import Controls, ControlSettings
+
+
+def always_moves(action: Action) -> bool:
+    """An apply function whose tetromino always moves"""
+    del action
+    return True
+
+
+def test_repeats_are_timed_when_their_tick_was_due() -> None:
+    """A held key repeats its action after the DAS, every ARR, each repeat timed"""
+    controls = Controls(ControlSettings(das_seconds=0.1, arr_seconds=0.05), tick_rate=100)
+    controls.press(Action.LEFT, always_moves, read_at=0)
+    for tick in range(1, 21):
+        controls.tick(always_moves, due_at=tick * 10_000_000)
+    assert controls.pop_moves() == [0, 100_000_000, 150_000_000, 200_000_000]
+    assert not controls.pop_moves()
+
+
+def test_slide_is_timed_once() -> None:
+    """With an ARR of 0, the slide of a held key is a single move"""
+    controls = Controls(ControlSettings(das_seconds=0.01, arr_seconds=0), tick_rate=100)
+    controls.held[Action.RIGHT] = 0
+    moves = iter([True, True, True, False])
+    controls.tick(lambda action: next(moves), due_at=5)
+    assert controls.pop_moves() == [5]
+
+
+def test_press_is_timed_from_the_previous_poll() -> None:
+    """A press handled after a poll may have arrived right after the poll before it"""
+    controls = Controls()
+    controls.poll()
+    first_poll = controls.polled_at
+    controls.poll()
+    controls.press(Action.ROTATE, always_moves)
+    controls.press(Action.DROP, lambda action: False)
+    assert controls.pop_moves() == [first_poll]
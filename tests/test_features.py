@@ -0,0 +1,53 @@
+"""The incrementally updated features of a board stay equal to the features
+measured from scratch, and a placement is evaluated as if it was frozen"""
+
+import random
+
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine
+from tetrominos.features import BoardFeatures, Features, measure_rows
+from tetrominos.map import Map
+
+ACTIONS = (Action.LEFT, Action.RIGHT, Action.ROTATE, Action.DOWN, Action.DROP, Action.DROP)
+
+
+def frozen_features(game_map: Map, cells: tuple[tuple[int, int], ...]) -> Features:
+    """Return the features measured from scratch once cells are frozen and rows cleared"""
+    rows = list(game_map.board.rows)
+    for x, y in cells:
+        rows[y] |= 1 << x
+    kept = [mask for mask in rows if mask != game_map.board.full_row_mask]
+    rows = [0] * (len(rows) - len(kept)) + kept
+    return measure_rows(rows, game_map.columns)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_features_match_recompute(seed: int) -> None:
+    """Freezing tetrominos and clearing rows keep the features exact"""
+    rng = random.Random(seed)
+    engine = Engine(8, 14)
+    engine.reset(seed)
+    for _ in range(3000):
+        engine.step(rng.choice(ACTIONS))
+        board = engine.map.board
+        assert engine.map.features.current() == measure_rows(board.rows, board.columns)
+        assert engine.map.features.current() == BoardFeatures(board).current()
+        if engine.done:
+            engine.reset(rng.randrange(1 << 32))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_evaluated_placements_match_frozen_boards(seed: int) -> None:
+    """The evaluation of every placement equals the features of the board it leads to"""
+    rng = random.Random(seed)
+    engine = Engine(8, 14)
+    engine.reset(seed)
+    while engine.stats.pieces_placed < 12 and not engine.done:
+        engine.step(rng.choice(ACTIONS))
+        placements = engine.map.reachable_placements()
+        evaluations = engine.map.features.evaluate(placement.state for placement in placements)
+        for placement, features in zip(placements, evaluations):
+            expected = frozen_features(engine.map, placement.cells)
+            assert features[:6] == expected[:6]
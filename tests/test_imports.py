@@ -0,0 +1,28 @@
+"""The headless modules load without pygame or numpy, each in a fresh interpreter
+The import times are checked by the benchmark suite, see tetrominos.benchmark imports."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from tetrominos.benchmark import HEADLESS_MODULES
+
+# The modules a headless module must not load
+HEAVY_MODULES = ("pygame", "numpy")
+# Run by a fresh interpreter to list the heavy modules loaded by the module given as argument
+LOADED_SCRIPT = f"""
+import json, sys
+__import__(sys.argv[1])
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+@pytest.mark.parametrize("module", ("tetrominos",) + HEADLESS_MODULES)
+def test_headless_module_import(module: str) -> None:
+    """Importing a headless module does not load pygame or numpy"""
+    output = subprocess.run(
+        [sys.executable, "-c", LOADED_SCRIPT, module], capture_output=True, check=True, text=True
+    ).stdout
+    assert json.loads(output) == []
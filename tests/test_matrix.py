@@ -0,0 +1,60 @@
+"""The matrix redraws the blocks that changed into the same image as a full render"""
+
+import random
+
+import pygame
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine
+from tetrominos.matrix import Matrix
+
+
+def full_render(engine: Engine, backend: str) -> bytes:
+    """Return the pixels of a matrix rendered from scratch"""
+    surface = pygame.Surface((320, 640))
+    Matrix(surface, 30, engine.map, backend).render_matrix()
+    return pygame.image.tobytes(surface, "RGB")
+
+
+@pytest.mark.parametrize("backend", ["rect", "surfarray"])
+def test_incremental_render_matches_full_render(backend: str) -> None:
+    """After every tick, the dirty blocks redrawn give the image of a full render"""
+    engine = Engine()
+    engine.reset(4)
+    rng = random.Random(4)
+    surface = pygame.Surface((320, 640))
+    matrix = Matrix(surface, 30, engine.map, backend)
+    for tick in range(600):
+        engine.step(rng.choice(list(Action)))
+        matrix.render_matrix()
+        if tick % 50 == 0:
+            assert pygame.image.tobytes(surface, "RGB") == full_render(engine, backend)
+    assert engine.stats.pieces_placed
+
+
+def test_unchanged_frame_redraws_nothing() -> None:
+    """A frame without any change since the previous one redraws no block"""
+    engine = Engine()
+    engine.reset(4)
+    matrix = Matrix(pygame.Surface((320, 640)), 30, engine.map)
+    matrix.render_matrix()
+    assert not matrix.render_matrix()
+
+
+def test_viewport_follows_active_tetromino() -> None:
+    """On a board taller than the surface, the viewport scrolls to keep the active
+    tetromino in view and never leaves the board"""
+    engine = Engine(10, 200)
+    engine.reset(4)
+    matrix = Matrix(pygame.Surface((320, 640)), 30, engine.map)
+    assert matrix.visible_lines < engine.map.lines
+    matrix.render_matrix()
+    assert matrix.first_line == 0
+
+    engine.apply(Action.DROP)
+    matrix.render_matrix()
+    lines = [line for _, line in engine.map.active_tetromino.state.cells]
+    assert matrix.first_line <= min(lines)
+    assert max(lines) < matrix.first_line + matrix.visible_lines
+    assert matrix.first_line == engine.map.lines - matrix.visible_lines
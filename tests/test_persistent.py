@@ -0,0 +1,85 @@
+"""The persistent versions of a map follow the map they are made from"""
+
+import random
+
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.block import Block, BlockCollection
+from tetrominos.engine import Engine
+from tetrominos.map import Map
+from tetrominos.persistent import PersistentMap
+from tetrominos.tetromino import BaseTetromino, PieceState
+
+# The I tetromino standing in the first column of a board of 4 lines
+STANDING_I = PieceState("I", 1, (-2, 0))
+
+
+def filled_map() -> Map:
+    """Return a 10x4 map full but for its first column"""
+    game_map = Map(10, 4, seed=1)
+    game_map.locked_blocks = BlockCollection(
+        {(x, y): Block((128, 128, 128)) for x in range(1, 10) for y in range(4)}
+    )
+    return game_map
+
+
+def test_freeze_checks_the_new_tetromino_once_the_rows_are_deleted() -> None:
+    """Clearing the rows under the spawn of the next tetromino does not end the game"""
+    version = PersistentMap.from_map(filled_map()).moved(STANDING_I).freeze()
+    assert version.lines_cleared == 4
+    assert not version.game_over
+    assert version.board.row_list() == [0, 0, 0, 0]
+
+
+def test_freeze_keeps_the_rng_state() -> None:
+    """A frozen version draws the same tetrominos as the version it was made from"""
+    version = PersistentMap.from_map(Map(10, 20, seed=3))
+    assert version.freeze().rng_state == version.rng_state
+
+
+def test_freeze_with_an_empty_preview() -> None:
+    """The next kind becomes active when the preview is empty, and is required then"""
+    version = PersistentMap.from_map(Map(10, 20, seed=3))._replace(preview=())
+    assert version.freeze("O").state.kind == "O"
+    with pytest.raises(ValueError):
+        version.freeze()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_versions_follow_the_engine(seed: int) -> None:
+    """The versions made at every lock, from the map or by freezing the previous
+    version, match the map"""
+    engine = Engine(10, 8)
+    engine.reset(seed)
+    rng = random.Random(seed)
+    made = frozen = PersistentMap.from_map(engine.map)
+    while not engine.done:
+        engine.apply(rng.choice(list(Action)))
+        pieces_placed = engine.stats.pieces_placed
+        placement = engine.state_after_gravity()
+        engine.tick()
+        if engine.stats.pieces_placed == pieces_placed:
+            continue
+        expected = PersistentMap.from_map(engine.map)
+        made = PersistentMap.from_map(engine.map, made, placement)
+        frozen = frozen.moved(placement).freeze(engine.map.generator.preview[-1])
+        assert made.board == expected.board
+        assert frozen.board == expected.board
+        assert frozen.state == expected.state
+        assert frozen.preview == expected.preview
+        assert frozen.locked_hash == expected.locked_hash
+        assert frozen.game_over == engine.map.game_over
+
+
+def test_lock_shares_the_chunks_above_the_stack() -> None:
+    """Locking a tetromino at the bottom of a standard board copies only its chunks"""
+    game_map = Map(10, 20, seed=1)
+    base = PersistentMap.from_map(game_map)
+    game_map.active_tetromino = BaseTetromino.from_state(game_map.ghost_state)
+    locked = game_map.active_tetromino.state
+    game_map.freeze_tetromino()
+    version = PersistentMap.from_map(game_map, base, locked)
+    assert version.board == PersistentMap.from_map(game_map).board
+    shared = [new is old for new, old in zip(version.board.rows, base.board.rows)]
+    assert shared[0] and not shared[-1]
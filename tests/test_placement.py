@@ -0,0 +1,85 @@
+"""The bit-parallel search of the placements finds the same placements as a brute-force
+search over the movements of the game"""
+
+import random
+
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.block import Block, BlockCollection
+from tetrominos.map import Map
+from tetrominos.movement import Rotation, Translation, TranslationDirection
+from tetrominos.tetromino import TETROMINO_CLASSES, PieceState
+
+MOVES = {
+    Action.LEFT: lambda game_map: Translation(game_map, TranslationDirection.LEFT),
+    Action.RIGHT: lambda game_map: Translation(game_map, TranslationDirection.RIGHT),
+    Action.DOWN: lambda game_map: Translation(game_map, TranslationDirection.DOWN),
+    Action.ROTATE: Rotation,
+}
+
+
+def random_map(seed: int, columns: int = 10, lines: int = 12) -> Map:
+    """Return a map whose bottom lines are randomly filled, with holes and overhangs"""
+    rng = random.Random(seed)
+    game_map = Map(columns, lines)
+    blocks = BlockCollection()
+    for y in range(lines // 2, lines):
+        for x in range(columns):
+            if rng.random() < 0.4:
+                blocks.add((x, y), Block((128, 128, 128)))
+    game_map.locked_blocks = blocks
+    return game_map
+
+
+def move(game_map: Map, state: PieceState, action: Action) -> PieceState | None:
+    """Return the state reached by a movement of the game, or None if it is blocked"""
+    game_map.active_tetromino = TETROMINO_CLASSES[state.kind](state.rotation_index, state.origin)
+    movement = MOVES[action](game_map)
+    return movement.simulated_state if movement.validate() else None
+
+
+def brute_force_placements(game_map: Map, start: PieceState) -> set[PieceState]:
+    """Return the resting states reached by trying every movement from every state"""
+    reached: set[PieceState] = set()
+    stack = [start]
+    seen = {start}
+    while stack:
+        state = stack.pop()
+        for action in MOVES:
+            next_state = move(game_map, state, action)
+            if next_state is not None and next_state not in seen:
+                seen.add(next_state)
+                reached.add(next_state)
+                stack.append(next_state)
+    return {state for state in reached if move(game_map, state, Action.DOWN) is None}
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("kind", sorted(TETROMINO_CLASSES))
+def test_placements_match_brute_force(seed: int, kind: str) -> None:
+    """Every resting state reachable with the movements of the game is found once"""
+    game_map = random_map(seed)
+    start = TETROMINO_CLASSES[kind]().state
+    expected = brute_force_placements(game_map, start)
+    game_map.active_tetromino = TETROMINO_CLASSES[kind]()
+    placements = game_map.reachable_placements()
+
+    states = [placement.state for placement in placements]
+    assert len(states) == len(set(states))
+    assert set(states) == expected
+
+
+@pytest.mark.parametrize("kind", sorted(TETROMINO_CLASSES))
+def test_paths_lead_to_placements(kind: str) -> None:
+    """Following the path of a placement with the movements of the game reaches it"""
+    game_map = random_map(7)
+    game_map.active_tetromino = TETROMINO_CLASSES[kind]()
+    start = game_map.active_tetromino.state
+    for placement in game_map.reachable_placements():
+        state = start
+        for action in placement.path:
+            next_state = move(game_map, state, action)
+            assert next_state is not None
+            state = next_state
+        assert state == placement.state
@@ -0,0 +1,78 @@
+"""The frame profiler keeps every sample of the measures recorded,
+and only counts the hot operations while it is enabled and open"""
+
+import csv
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from tetrominos.counters import COUNTING
+from tetrominos.profiler import FrameProfiler
+
+
+@pytest.fixture(autouse=True)
+def no_counting() -> Iterator[None]:
+    """Check that every test closes its profilers, leaving counting disabled"""
+    assert not COUNTING.enabled
+    yield
+    assert not COUNTING.enabled
+
+
+def test_every_sample_is_recorded() -> None:
+    """The samples of a frame all reach the histogram, not only the highest"""
+    profiler = FrameProfiler()
+    profiler.begin_frame()
+    for latency in (1_000_000, 2_000_000, 50_000_000):
+        profiler.record("input_latency", latency)
+    profiler.end_frame()
+    histogram = profiler.histogram("input_latency")
+    assert len(histogram) == 3
+    assert histogram.percentile(50) < 3_000_000
+    profiler.close()
+
+
+def test_samples_are_recorded_while_disabled() -> None:
+    """The samples are recorded whether the frames are recorded or not"""
+    profiler = FrameProfiler(enabled=False)
+    profiler.begin_frame()
+    profiler.record("input_latency", 1_000_000)
+    profiler.end_frame()
+    assert len(profiler.histogram("input_latency")) == 1
+    assert "frame" not in profiler.histograms
+    profiler.close()
+
+
+def test_counting_is_scoped_to_profilers() -> None:
+    """Counting lasts while one profiler is enabled and stops once all are closed"""
+    first = FrameProfiler()
+    second = FrameProfiler(enabled=False)
+    assert COUNTING.enabled
+    assert first.enabled and not second.enabled
+    second.enabled = True
+    first.close()
+    assert COUNTING.enabled and not first.enabled
+    second.enabled = False
+    assert not COUNTING.enabled
+    second.enabled = True
+    second.close()
+
+
+def test_csv_export_keeps_later_samples(tmp_path: Path) -> None:
+    """A sample first recorded after the first frame still has its CSV column"""
+    path = tmp_path / "frames.csv"
+    profiler = FrameProfiler()
+    profiler.export_to(str(path))
+    profiler.begin_frame()
+    profiler.lap("events")
+    profiler.end_frame()
+    profiler.begin_frame()
+    profiler.lap("events")
+    profiler.record("input_latency", 2_000_000)
+    profiler.end_frame()
+    profiler.close()
+
+    with open(path, encoding="utf-8", newline="") as stream:
+        frames = list(csv.DictReader(stream))
+    assert [frame["input_latency"] for frame in frames] == ["", "2000000"]
+    assert all(int(frame["frame"]) >= int(frame["events"]) for frame in frames)
@@ -0,0 +1,69 @@
+"""A replay re-simulates the recorded game up to the same final state"""
+
+import io
+import random
+from pathlib import Path
+
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine, EngineRules
+from tetrominos.replay import (
+    ReplayPlayer,
+    ReplayReader,
+    ReplayWriter,
+    encode_varint,
+    read_varint,
+    replay_headless,
+)
+
+ACTIONS = (Action.NONE, Action.LEFT, Action.RIGHT, Action.ROTATE, Action.DOWN, Action.DROP)
+
+
+def record_game(path: Path, seed: int, max_ticks: int) -> Engine:
+    """Record a game of random actions until it is over or max_ticks ticks passed"""
+    rng = random.Random(seed)
+    engine = Engine(10, 20, EngineRules.for_tick_rate(240))
+    engine.reset(seed)
+    with ReplayWriter(str(path), engine):
+        while not engine.done and engine.stats.ticks < max_ticks:
+            engine.step(rng.choice(ACTIONS))
+    return engine
+
+
+@pytest.mark.parametrize("max_ticks", [500, 100_000])
+@pytest.mark.parametrize("seed", range(3))
+def test_replay_reproduces_game(tmp_path: Path, seed: int, max_ticks: int) -> None:
+    """Replaying a game reaches the same map, hash and statistics"""
+    path = tmp_path / "game.trep"
+    engine = record_game(path, seed, max_ticks)
+
+    replayed = replay_headless(str(path))
+    assert replayed.rules == engine.rules
+    assert replayed.map.zobrist_hash == engine.map.zobrist_hash
+    assert replayed.map.snapshot() == engine.map.snapshot()
+    assert replayed.stats == engine.stats
+    assert replayed.done == engine.done
+
+
+def test_replay_at_any_speed(tmp_path: Path) -> None:
+    """Playing a replay frame by frame at a fractional speed ends in the same state"""
+    path = tmp_path / "game.trep"
+    engine = record_game(path, 5, 3000)
+    player = ReplayPlayer(ReplayReader(str(path)), speed=2.5)
+    while player.play_frame(4):
+        pass
+    assert player.engine.map.zobrist_hash == engine.map.zobrist_hash
+    assert player.engine.stats == engine.stats
+
+
+@pytest.mark.parametrize("value", [0, 1, 0x7F, 0x80, 0x3FFF, 1 << 32, (1 << 64) - 1])
+def test_varint_round_trip(value: int) -> None:
+    """A varint decodes to the value it encodes"""
+    assert read_varint(io.BytesIO(encode_varint(value))) == value
+
+
+def test_truncated_varint() -> None:
+    """A varint cut by the end of the stream is an error"""
+    with pytest.raises(ValueError):
+        read_varint(io.BytesIO(b"\x80"))
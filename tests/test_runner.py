@@ -0,0 +1,29 @@
+"""The games of a run are reproducible, whatever the number of workers"""
+
+from dataclasses import replace
+
+from tetrominos.runner import GameResult, game_seed, play_game, run_games, summarize
+
+
+def outcome(result: GameResult) -> GameResult:
+    """Return a game result without its duration, which varies between runs"""
+    return replace(result, duration=0.0)
+
+
+def test_game_seeds_are_stable() -> None:
+    """A game seed only depends on the seed of the run and the index of the game"""
+    assert game_seed(7, 3) == game_seed(7, 3)
+    assert len({game_seed(7, index) for index in range(100)}) == 100
+
+
+def test_a_game_replays_from_its_seed() -> None:
+    """Playing a game twice with its seed gives the same result"""
+    assert outcome(play_game("random", 12345)) == outcome(play_game("random", 12345))
+
+
+def test_workers_do_not_change_the_results() -> None:
+    """A run gives the same games in one process and across a pool"""
+    in_process = sorted(map(outcome, run_games(6, seed=3, workers=1)), key=lambda r: r.seed)
+    pooled = sorted(map(outcome, run_games(6, seed=3, workers=2)), key=lambda r: r.seed)
+    assert in_process == pooled
+    assert summarize(in_process).games == 6
@@ -0,0 +1,72 @@
+"""The server reads framed messages and rejects the malformed ones"""
+
+import asyncio
+
+import pytest
+
+from tetrominos.engine import EngineRules
+from tetrominos.server import (
+    MAX_TICK_RATE,
+    GameServer,
+    MessageType,
+    encode_message,
+    read_message,
+)
+
+
+def read(data: bytes) -> tuple[MessageType, bytes] | None:
+    """Read a message from a stream holding some bytes"""
+
+    async def read_stream() -> tuple[MessageType, bytes] | None:
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_message(reader)
+
+    return asyncio.run(read_stream())
+
+
+def test_message_round_trip() -> None:
+    """A message reads back as its type and payload"""
+    assert read(encode_message(MessageType.INPUT, b"\x01")) == (MessageType.INPUT, b"\x01")
+    assert read(b"") is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\xff\xff\xff\x7f",
+        b"\x80",
+        b"\x00",
+    ],
+)
+def test_malformed_length(data: bytes) -> None:
+    """Endless, oversized, truncated and empty lengths are rejected"""
+    with pytest.raises(ValueError):
+        read(data)
+
+
+@pytest.mark.parametrize("data", [b"\x80" * 64, b"\x81\x80\x80\x80\x80\x00"])
+def test_endless_length(data: bytes) -> None:
+    """A length whose varint never ends is rejected after MAX_LENGTH_BYTES bytes"""
+    with pytest.raises(ValueError, match="length longer"):
+        read(data)
+
+
+@pytest.mark.parametrize(
+    ("tick_rate", "expected"), [(0, 120), (240, 240), (10**12, MAX_TICK_RATE)]
+)
+def test_session_tick_rate(tick_rate: int, expected: int) -> None:
+    """A session runs at the tick rate asked, the default of the server for 0,
+    at most MAX_TICK_RATE, with the timing rules of its tick rate"""
+
+    async def create_session() -> tuple[EngineRules, float]:
+        game_server = GameServer(tick_rate=120)
+        session = game_server.create_session(1, tick_rate)
+        for task in game_server.tasks:
+            task.cancel()
+        return session.engine.rules, session.tick_interval
+
+    rules, tick_interval = asyncio.run(create_session())
+    assert rules == EngineRules.for_tick_rate(expected)
+    assert tick_interval == 1 / expected
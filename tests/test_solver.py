@@ -0,0 +1,36 @@
+"""The solver finds the solutions of small puzzles and reports the puzzles without any"""
+
+import pytest
+
+from tetrominos.solver import Goal, Puzzle, SolveResult, solve
+
+
+def solve_puzzle(puzzle: Puzzle) -> SolveResult:
+    """Solve a puzzle in process"""
+    return solve(puzzle.to_map(), puzzle.pieces, puzzle.goal)
+
+
+@pytest.mark.parametrize(
+    "puzzle",
+    [
+        Puzzle(("#########.", "#########."), "OT"),
+        Puzzle((".........#", "........##", ".......###", "......####"), "I" * 9),
+    ],
+)
+def test_no_perfect_clear_height(puzzle: Puzzle) -> None:
+    """A puzzle without a perfect clear height passing the parity check has no solution"""
+    result = solve_puzzle(puzzle)
+    assert not result.solved
+
+
+def test_perfect_clear() -> None:
+    """Two vertical I tetrominos fill the gaps of a board"""
+    result = solve_puzzle(Puzzle(("########..",) * 4, "II"))
+    assert result.solved
+    assert len(result.steps) == 2
+
+
+def test_clear_lines() -> None:
+    """An I tetromino lying in the gap of a line clears it"""
+    result = solve_puzzle(Puzzle(("....######",), "I", Goal(lines=1)))
+    assert result.solved
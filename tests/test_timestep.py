@@ -0,0 +1,67 @@
+"""The fixed timestep plays every tick due, skipping frames rather than ticks,
+and only drops the ticks of a lag longer than max_lag"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from tetrominos import timestep
+from tetrominos.timestep import FixedTimestep, LoopSettings
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    """Replace the clock of the timestep by a clock advanced by hand, in nanoseconds"""
+    clock = SimpleNamespace(now=0)
+    monkeypatch.setattr(timestep.time, "perf_counter_ns", lambda: clock.now)
+    return clock
+
+
+def test_slow_frame_keeps_ticks_due(clock: SimpleNamespace) -> None:
+    """A slow frame plays its ticks over the next iterations without rendering"""
+    fixed_timestep = FixedTimestep(LoopSettings(tick_rate=100, max_ticks_per_frame=4))
+    fixed_timestep.pending_ticks()
+    clock.now += 100_000_000
+    played = [fixed_timestep.pending_ticks()]
+    assert fixed_timestep.lagging
+    while fixed_timestep.lagging:
+        played.append(fixed_timestep.pending_ticks())
+    assert played == [4, 4, 2]
+    assert fixed_timestep.ticks == 10
+    assert fixed_timestep.skipped_ticks == 0
+
+
+def test_ticks_follow_wall_time(clock: SimpleNamespace) -> None:
+    """Frames of any duration add up to the ticks of the elapsed time"""
+    fixed_timestep = FixedTimestep(LoopSettings(tick_rate=240))
+    fixed_timestep.pending_ticks()
+    for duration in (1_000_000, 7_000_000, 16_666_667, 33_333_333, 3_000_000) * 20:
+        clock.now += duration
+        fixed_timestep.pending_ticks()
+    assert fixed_timestep.ticks == clock.now * 240 // 1_000_000_000
+    assert not fixed_timestep.lagging
+
+
+def test_long_lag_is_dropped(clock: SimpleNamespace) -> None:
+    """A lag longer than max_lag only keeps max_lag seconds of ticks due"""
+    fixed_timestep = FixedTimestep(LoopSettings(tick_rate=100, max_lag=0.25))
+    fixed_timestep.pending_ticks()
+    clock.now += 5_000_000_000
+    while fixed_timestep.pending_ticks():
+        pass
+    assert fixed_timestep.ticks == 25
+    assert fixed_timestep.skipped_ticks == 475
+
+
+def test_due_time_of_ticks(clock: SimpleNamespace) -> None:
+    """The ticks played in a frame were due one tick apart, before the ticks still due"""
+    fixed_timestep = FixedTimestep(LoopSettings(tick_rate=100, max_ticks_per_frame=4))
+    fixed_timestep.pending_ticks()
+    clock.now += 65_000_000
+    assert fixed_timestep.pending_ticks() == 4
+    assert [fixed_timestep.due_time(ticks) for ticks in range(4)] == [
+        40_000_000,
+        30_000_000,
+        20_000_000,
+        10_000_000,
+    ]
@@ -0,0 +1,22 @@
+"""The vector engine handles the boards the scalar engine handles"""
+
+import numpy as np
+
+from tetrominos.action import Action
+from tetrominos.vector import VectorEngine
+
+
+def test_narrow_board_ends_the_game() -> None:
+    """A board narrower than the new tetromino ends the game instead of raising"""
+    engine = VectorEngine(4, columns=3, lines=10)
+    engine.reset(1)
+    assert engine.done.all()
+
+
+def test_standard_board_plays() -> None:
+    """The games of a standard board go on after the first tetromino appeared"""
+    engine = VectorEngine(4)
+    engine.reset(1)
+    assert not engine.done.any()
+    engine.step(np.full(4, Action.NONE.value))
+    assert not engine.done.any()
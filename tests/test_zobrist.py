@@ -0,0 +1,72 @@
+"""The Zobrist hash of the locked blocks stays equal to the hash computed from scratch,
+and the transposition table keeps the deepest and most recently used entries"""
+
+import random
+
+import pytest
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine
+from tetrominos.map import Map
+from tetrominos.zobrist import TranspositionTable, rows_hash
+
+ACTIONS = (Action.LEFT, Action.RIGHT, Action.ROTATE, Action.DOWN, Action.DROP, Action.DROP)
+
+
+def full_hash(game_map: Map) -> int:
+    """Return the hash of the locked blocks computed from scratch"""
+    return rows_hash(game_map.board.rows, range(game_map.lines))
+
+
+@pytest.mark.parametrize("columns", [8, 10])
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_hash_matches_full_hash(columns: int, seed: int) -> None:
+    """Freezing tetrominos and clearing rows keep the incremental hash exact"""
+    rng = random.Random(seed)
+    engine = Engine(columns, 12)
+    engine.reset(seed)
+    lines_cleared = 0
+    for _ in range(2000):
+        lines_cleared += engine.step(rng.choice(ACTIONS))[1]
+        assert engine.map.locked_hash == full_hash(engine.map)
+        if engine.done:
+            engine.reset(rng.randrange(1 << 32))
+    assert engine.stats.pieces_placed > 0
+    if columns == 8:
+        assert lines_cleared > 0
+
+
+def test_hash_follows_the_locked_blocks() -> None:
+    """Assigning the locked blocks of a map to another map gives the same hashes"""
+    engine = Engine(10, 12)
+    engine.reset(1)
+    rng = random.Random(1)
+    while engine.stats.pieces_placed < 10 and not engine.done:
+        engine.step(rng.choice(ACTIONS))
+    copy = Map(10, 12, seed=1)
+    copy.locked_blocks = engine.map.locked_blocks
+    assert copy.locked_hash == engine.map.locked_hash
+    copy.restore(engine.map.snapshot())
+    assert copy.zobrist_hash == engine.map.zobrist_hash
+
+
+def test_transposition_table_prefers_deeper_entries() -> None:
+    """A shallower store does not replace an entry and a lookup needs the depth"""
+    table = TranspositionTable()
+    table.put(1, "deep", depth=3)
+    table.put(1, "shallow", depth=1)
+    assert table.get(1) == "deep"
+    assert table.get(1, depth=4) is None
+    assert (table.hits, table.misses) == (1, 1)
+
+
+def test_transposition_table_evicts_least_recently_used() -> None:
+    """When full, the table evicts the entry used the longest time ago"""
+    table = TranspositionTable(capacity=2)
+    table.put(1, "a")
+    table.put(2, "b")
+    table.get(1)
+    table.put(3, "c")
+    assert 1 in table and 3 in table
+    assert 2 not in table
+    assert len(table) == 2
@@ -0,0 +1,58 @@
+"""This module contains the command line interface of the package
+Every command is headless and runs the main function of its module:
+- simulate plays games in parallel, see tetrominos.runner
+- benchmark runs or compares the benchmarks, see tetrominos.benchmark
+- replay re-simulates a replay file, see tetrominos.replay
+- solve verifies a puzzle pack, see tetrominos.solver
+
+Only the module of the command that runs is imported, so a short-lived
+process pays for nothing else, and pygame is never imported.
+
+Usage:
+    python -m tetrominos simulate --games 1000 --workers 8
+    python -m tetrominos benchmark imports
+    python -m tetrominos replay game.trep
+    python -m tetrominos solve puzzles.jsonl --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from importlib import import_module
+
+__all__ = ["COMMANDS", "build_parser", "main"]
+
+# The commands, with the module implementing them and their help
+COMMANDS: dict[str, tuple[str, str]] = {
+    "simulate": ("tetrominos.runner", "play headless games in parallel"),
+    "benchmark": ("tetrominos.benchmark", "run or compare the benchmarks"),
+    "replay": ("tetrominos.replay", "re-simulate a replay file"),
+    "solve": ("tetrominos.solver", "verify a puzzle pack"),
+}
+
+
+def build_parser(command: str | None = None) -> argparse.ArgumentParser:
+    """Return the parser of the commands, with the arguments of a command
+    whose module is imported to add them"""
+    parser = argparse.ArgumentParser(
+        prog="python -m tetrominos", description="Headless tools of the game"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (module, help_text) in COMMANDS.items():
+        command_parser = commands.add_parser(name, help=help_text)
+        if name == command:
+            import_module(module).build_parser(command_parser)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run a command and return its exit code"""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv and argv[0] in COMMANDS else None
+    arguments = build_parser(command).parse_args(argv)
+    return import_module(COMMANDS[arguments.command][0]).main(arguments) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
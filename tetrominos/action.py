@@ -0,0 +1,18 @@
+"""This module contains the Action enumeration
+An action is an input applied to the active tetromino of a game
+"""
+
+from enum import Enum
+
+__all__ = ["Action"]
+
+
+class Action(Enum):
+    """Enumeration of all possible inputs of a game"""
+
+    NONE = 0
+    LEFT = 1
+    RIGHT = 2
+    ROTATE = 3
+    DOWN = 4
+    DROP = 5
@@ -2,101 +2,259 @@
 This class contains a very basic game engine based on pygame.
 The approach was heavily inspired by this tutorial:
 http://pygametutorials.wikidot.com/tutorials-basic
+
+The game rules are run by the headless Engine, the App only translates
+the pygame events into actions and renders the map.
 """
 
+import time
+from dataclasses import dataclass, replace
+from typing import NamedTuple
+
 import pygame
 
-from tetrominos.map import Map
+from tetrominos.action import Action
+from tetrominos.controls import Controls, ControlSettings
+from tetrominos.engine import Engine, EngineRules, GameStats
 from tetrominos.matrix import Matrix
-from tetrominos.movement import Rotation, Translation, TranslationDirection
+from tetrominos.overlay import PerformanceOverlay
+from tetrominos.persistent import History, PersistentMap
+from tetrominos.profiler import FrameProfiler
+from tetrominos.replay import ReplayPlayer, ReplayReader, ReplayWriter
+from tetrominos.tetromino import PieceState
+from tetrominos.timestep import FixedTimestep, LoopSettings
 from tetrominos.window import Window
 
 
-GRAVITYTIMEREVENT = pygame.USEREVENT + 1
-LOCKTETROMINOEVENT = pygame.USEREVENT + 2
+KEY_ACTIONS: dict[int, Action] = {
+    pygame.K_LEFT: Action.LEFT,
+    pygame.K_RIGHT: Action.RIGHT,
+    pygame.K_UP: Action.ROTATE,
+    pygame.K_DOWN: Action.DROP,
+}
+QUICK_SAVE_KEY = pygame.K_F5
+QUICK_LOAD_KEY = pygame.K_F9
+OVERLAY_KEY = pygame.K_F3
+UNDO_KEY = pygame.K_z
+REDO_KEY = pygame.K_y
+QUICK_SAVE_PATH = "quicksave.tsnap"
+
+
+class GameVersion(NamedTuple):
+    """A version of the game kept in the undo history: the version of the map
+    and a copy of the statistics of the engine when it was made"""
+
+    map: PersistentMap
+    stats: GameStats
+
+
+@dataclass(frozen=True)
+class AppSettings:
+    """The settings of the app, see App"""
+
+    record_path: str | None = None
+    replay_path: str | None = None
+    playback_speed: float = 1.0
+    profile_path: str | None = None
+    loop: LoopSettings = LoopSettings()
+    controls: ControlSettings = ControlSettings()
 
 
 class App:
-    """A class reprensenting the app"""
+    """A class reprensenting the app
+
+    The app either plays a game, optionally recorded to record_path,
+    or plays back the replay at replay_path at playback_speed times its speed.
+    The game logic runs loop.tick_rate ticks per second with a fixed timestep,
+    independently of the frame rate, see FixedTimestep.
+    A key press moves the tetromino as soon as it is read, and the left and right
+    keys repeat with the DAS and ARR of the controls settings, see Controls.
+    While playing, F5 saves a snapshot of the map to QUICK_SAVE_PATH and F9 loads it.
+    Z undoes the last tetromino locked and Y redoes it: every locked tetromino and
+    every snapshot loaded makes a new version of the game in the history, see History.
+    A version holds the map and the statistics of the game, and undoing or redoing
+    restarts the gravity and lock timers, as every version starts with a new tetromino.
+    Locking a tetromino after an undo drops the undone versions.
+    Loading a snapshot or undoing stops the recording, as the replay could no longer
+    reproduce the game.
 
-    def __init__(self) -> None:
+    F3 toggles an overlay of the frame times of every phase of the game loop,
+    and of the input latency: the time from a key press, or a repeat of a held
+    key, to displaying the frame showing its move, see Controls. Every move is
+    recorded, even while the overlay is hidden.
+    The frame times are also exported to profile_path, as CSV or JSON lines.
+    """
+
+    def __init__(self, settings: AppSettings = AppSettings()) -> None:
         """Initialize a running Pygame instance with a window of a
-        certain size and a clock
+        certain size and a fixed timestep
         """
         # pygame init
         pygame.init()
-        self.clock = pygame.time.Clock()
-        self.running: bool = True
-        pygame.key.set_repeat(500, 500)
-
-        # timer init
-        pygame.time.set_timer(GRAVITYTIMEREVENT, 700, 0)
+        self.timestep = FixedTimestep(settings.loop)
+        self.controls = Controls(settings.controls, settings.loop.tick_rate)
 
         # window init
-        self.window = Window(width_in_pixels=1280, height_in_pixels=720).surface
+        window = Window(width_in_pixels=1280, height_in_pixels=720, vsync=settings.loop.vsync)
 
-        # map init
-        self.map = Map()
+        # engine init, with the timing rules scaled to the tick rate
+        self.engine = Engine(rules=EngineRules.for_tick_rate(settings.loop.tick_rate))
+        self.replay: ReplayWriter | ReplayPlayer | None = None
+        if settings.replay_path is not None:
+            self.replay = ReplayPlayer(
+                ReplayReader(settings.replay_path), settings.playback_speed
+            )
+            self.engine = self.replay.engine
+        elif settings.record_path is not None:
+            self.engine.reset()
+            self.replay = ReplayWriter(settings.record_path, self.engine)
 
         # matrix init
         self.matrix = Matrix(
-            surface=self.window, block_size_in_pixels=30, game_map=self.map
+            surface=window.surface, block_size_in_pixels=30, game_map=self.engine.map
         )
 
+        # undo history init
+        self.history = History(self.game_version())
+
+        # profiling init, only enabled when exporting or showing the overlay
+        profiler = FrameProfiler(enabled=settings.profile_path is not None)
+        if settings.profile_path is not None:
+            profiler.export_to(settings.profile_path)
+        self.overlay = PerformanceOverlay(profiler)
+
+    @property
+    def window(self) -> pygame.Surface:
+        """The surface of the window, where the matrix is drawn"""
+        return self.matrix.surface
+
     def run(self) -> None:
         """Run the Pygame game loop (event -> logic -> rendering) until game is interrupted"""
-        while self.running:
+        profiler = self.overlay.profiler
+        running = True
+        while running:
+            profiler.begin_frame()
+            self.controls.poll()
             for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
                 self.handle_event(event)
-            self.process_game_logic()
-            self.render(frame_per_second_limit=60)
+            profiler.lap("events")
+            self.process_game_logic(self.timestep.pending_ticks())
+            profiler.lap("logic")
+            # the frames are skipped while catching up with the ticks due, see FixedTimestep
+            if not self.timestep.lagging:
+                self.render()
+            self.timestep.wait_for_next_frame()
+            profiler.end_frame()
+        if isinstance(self.replay, ReplayWriter):
+            self.replay.close()
+        profiler.close()
         pygame.quit()
 
     def handle_event(self, event: pygame.event.Event) -> None:
-        """Handle events like pressed keys, mouse motion or exit
+        """Handle events like pressed and released keys or window changes,
+        the exit being handled by the game loop
 
         Args:
             event: a Pygame Event object
         """
-        if event.type == pygame.QUIT:
-            self.running = False
-        if event.type == GRAVITYTIMEREVENT:
-            Translation(self.map, TranslationDirection.DOWN).execute()
-        if event.type == LOCKTETROMINOEVENT:
-            self.map.freeze_tetromino()
-            self.map.locking_grace_period = False
-            # handle row completion
-            self.map.pop_complete_rows()
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_LEFT:
-                Translation(self.map, TranslationDirection.LEFT).execute()
-            if event.key == pygame.K_RIGHT:
-                Translation(self.map, TranslationDirection.RIGHT).execute()
-            if event.key == pygame.K_UP:
-                Rotation(self.map).execute()
-            if event.key == pygame.K_DOWN:
-                while Translation(self.map, TranslationDirection.DOWN).validate():
-                    Translation(self.map, TranslationDirection.DOWN).execute()
-
-    def process_game_logic(self) -> None:
-        """Process game logic"""
-
-        # handle tetromino freezing
-        if (
-            not self.map.locking_grace_period
-            and not Translation(self.map, TranslationDirection.DOWN).validate()
-        ):
-            pygame.time.set_timer(LOCKTETROMINOEVENT, 300, loops=1)
-            self.map.locking_grace_period = True
-
-            # handle row completion
-
-    def render(self, frame_per_second_limit: int):
-        """Print out graphics"""
-        self.window.fill("grey")
-        self.matrix.render_matrix()
-        pygame.display.flip()
-        self.clock.tick(frame_per_second_limit)
+        if event.type == pygame.WINDOWEXPOSED:
+            self.matrix.invalidate()
+        elif event.type == pygame.WINDOWFOCUSLOST:
+            self.controls.release_all()
+        elif event.type == pygame.KEYUP and event.key in KEY_ACTIONS:
+            self.controls.release(KEY_ACTIONS[event.key])
+        elif event.type == pygame.KEYDOWN and event.key == OVERLAY_KEY:
+            self.overlay.toggle()
+        elif event.type == pygame.KEYDOWN and not isinstance(self.replay, ReplayPlayer):
+            if event.key in KEY_ACTIONS:
+                self.controls.press(KEY_ACTIONS[event.key], self.engine.apply)
+            elif event.key == QUICK_SAVE_KEY:
+                self.quick_save()
+            elif event.key == QUICK_LOAD_KEY:
+                self.quick_load()
+            elif event.key in (UNDO_KEY, REDO_KEY):
+                self.travel_history(event.key == UNDO_KEY)
+
+    def quick_save(self) -> None:
+        """Save a snapshot of the map to the quick save file"""
+        with open(QUICK_SAVE_PATH, "wb") as stream:
+            stream.write(self.engine.map.snapshot())
+
+    def quick_load(self) -> None:
+        """Restore the map from the quick save file, if any"""
+        try:
+            with open(QUICK_SAVE_PATH, "rb") as stream:
+                snapshot = stream.read()
+        except FileNotFoundError:
+            return
+        if isinstance(self.replay, ReplayWriter):
+            self.replay.close()
+            self.replay = None
+        self.engine.map.restore(snapshot)
+        self.history.push(self.game_version(self.history.current))
+
+    def game_version(
+        self, base: GameVersion | None = None, locked: PieceState | None = None
+    ) -> GameVersion:
+        """Return the version of the current state of the game, sharing the unchanged
+        chunks of the map of a base version, see PersistentMap.from_map"""
+        return GameVersion(
+            PersistentMap.from_map(self.engine.map, None if base is None else base.map, locked),
+            replace(self.engine.stats),
+        )
+
+    def travel_history(self, backward: bool) -> None:
+        """Restore the game to the previous version of the history, or the next one"""
+        version = self.history.undo() if backward else self.history.redo()
+        if version is None:
+            return
+        if isinstance(self.replay, ReplayWriter):
+            self.replay.close()
+            self.replay = None
+        version.map.restore_into(self.engine.map)
+        self.engine.stats = replace(version.stats)
+        self.engine.gravity_timer = self.engine.lock_timer = 0
+
+    def process_game_logic(self, ticks: int = 1) -> None:
+        """Process game logic: advance the engine by a number of ticks
+        and start a new game when the current one is over.
+        Only the first game is recorded."""
+        if isinstance(self.replay, ReplayPlayer):
+            self.replay.play_frame(ticks)
+            return
+        for index in range(ticks):
+            pieces_placed = self.engine.stats.pieces_placed
+            self.controls.tick(self.engine.apply, self.timestep.due_time(ticks - 1 - index))
+            placement = self.engine.state_after_gravity()
+            self.engine.tick()
+            if self.engine.done:
+                if isinstance(self.replay, ReplayWriter):
+                    self.replay.close()
+                    self.replay = None
+                self.engine.reset()
+                self.history = History(self.game_version())
+            elif self.engine.stats.pieces_placed != pieces_placed:
+                self.history.push(self.game_version(self.history.current, placement))
+
+    def render(self) -> None:
+        """Print out graphics, only pushing the areas that changed to the display"""
+        background = pygame.Color("grey")
+        if self.matrix.drawn_rows is None:
+            self.window.fill(background)
+            self.overlay.drawn_rect = None
+            dirty_rects = [self.window.get_rect()]
+            self.matrix.render_matrix()
+        else:
+            dirty_rects = self.matrix.render_matrix()
+        dirty_rects += self.overlay.render(self.window, background)
+        pygame.display.update(dirty_rects)
+        profiler = self.overlay.profiler
+        profiler.lap("render")
+        displayed_at = time.perf_counter_ns()
+        for read_at in self.controls.pop_moves():
+            profiler.record("input_latency", displayed_at - read_at)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,422 @@
+"""This module contains the benchmark suite
+The micro-benchmarks time the hot paths of a game: building the blocks of a
+tetromino, validating a movement, finding and deleting the complete rows,
+merging block collections and rendering the matrix.
+The macro-benchmarks time scripted games on boards of several sizes and fill levels.
+
+Every benchmark is timed with timeit: the number of calls is calibrated to
+last at least 0.2s, and the best time per call out of several repeats is kept.
+The results are saved as JSON, and two result files can be compared to
+flag the benchmarks that got slower than a threshold. The benchmarks of the
+baseline missing from the new results fail the comparison too, so a renamed
+or removed benchmark does not silently drop out of the regression check.
+
+The imports command checks that the headless modules load without pygame
+and within a time budget, each in a fresh interpreter, as the short-lived
+worker processes of a batch job do. pygame is only loaded by the rendering
+benchmarks.
+
+Usage:
+    python -m tetrominos.benchmark run --output baseline.json
+    python -m tetrominos.benchmark run --output current.json
+    python -m tetrominos.benchmark compare baseline.json current.json --threshold 0.1
+    python -m tetrominos.benchmark imports --budget 0.1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from functools import partial
+from importlib import import_module
+from random import Random
+from statistics import median
+from typing import TYPE_CHECKING
+
+from tetrominos.action import Action
+from tetrominos.block import Block, BlockCollection
+from tetrominos.engine import Engine
+from tetrominos.map import Map
+from tetrominos.movement import Translation, TranslationDirection
+from tetrominos.tetromino import TetrominoT
+
+if TYPE_CHECKING:
+    from tetrominos.matrix import Matrix
+
+__all__ = [
+    "BenchmarkResult",
+    "BENCHMARKS",
+    "HEADLESS_MODULES",
+    "IMPORT_BUDGET",
+    "ImportTiming",
+    "filled_map",
+    "run_benchmark",
+    "run_benchmarks",
+    "compare_results",
+    "unmatched_benchmarks",
+    "time_import",
+]
+
+# A benchmark factory prepares the data of a benchmark
+# and returns the function to time, called without argument
+BenchmarkFactory = Callable[[], Callable[[], object]]
+
+GAME_SIZES: tuple[tuple[int, int], ...] = ((10, 20), (20, 40), (40, 80))
+GAME_FILLS: tuple[float, ...] = (0.0, 0.5)
+GAME_TICKS = 2000
+SCRIPT_ACTIONS: tuple[Action, ...] = tuple(Action)
+
+# The modules of the headless core, which must never load pygame
+HEADLESS_MODULES: tuple[str, ...] = (
+    "tetrominos.block",
+    "tetrominos.tetromino",
+    "tetrominos.map",
+    "tetrominos.movement",
+    "tetrominos.engine",
+    "tetrominos.replay",
+    "tetrominos.runner",
+    "tetrominos.solver",
+)
+# The seconds allowed to import a headless module in a fresh interpreter
+IMPORT_BUDGET = 0.1
+# Run by a fresh interpreter to time the import of a module, given as its first argument
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+duration = time.perf_counter() - start
+print(json.dumps({"duration": duration, "pygame": "pygame" in sys.modules}))
+"""
+
+
+def filled_map(columns: int = 10, lines: int = 20, fill: float = 0.5, full_rows: int = 0) -> Map:
+    """Return a map whose bottom lines are filled with random blocks
+
+    Args:
+        columns: the number of columns of the map
+        lines: the number of lines of the map
+        fill: the fraction of the lines filled from the bottom,
+            every filled line has a single hole so it is not complete
+        full_rows: the number of complete rows among the filled lines
+    """
+    rng = Random(f"{columns}x{lines}:{fill}")
+    game_map = Map(columns, lines, seed=0)
+    blocks = BlockCollection()
+    filled_lines = range(lines - int(lines * fill), lines)
+    for index, y in enumerate(filled_lines):
+        hole = rng.randrange(columns) if index >= full_rows else -1
+        for x in range(columns):
+            if x != hole:
+                blocks.add((x, y), Block(rng.choice(game_map.board.palette[1:])))
+    game_map.locked_blocks = blocks
+    return game_map
+
+
+def bench_get_blocks() -> Callable[[], object]:
+    """Build the blocks of a tetromino"""
+    return TetrominoT().get_blocks
+
+
+def bench_validate() -> Callable[[], object]:
+    """Validate a translation on a half filled map"""
+    game_map = filled_map()
+    return lambda: Translation(game_map, TranslationDirection.DOWN).validate()
+
+
+def bench_is_inbound() -> Callable[[], object]:
+    """Check the bounds of a simulated translation"""
+    return Translation(filled_map(), TranslationDirection.LEFT).is_inbound
+
+
+def bench_is_overlapping() -> Callable[[], object]:
+    """Check the overlap of a simulated translation"""
+    return Translation(filled_map(), TranslationDirection.DOWN).is_overlapping
+
+
+def bench_list_complete_rows() -> Callable[[], object]:
+    """List the complete rows of a half filled map"""
+    return filled_map(full_rows=4).list_complete_rows
+
+
+def bench_restore() -> Callable[[], object]:
+    """Restore a snapshot, the reference of the next benchmark"""
+    game_map = filled_map(full_rows=4)
+    snapshot = game_map.snapshot()
+    return lambda: game_map.restore(snapshot)
+
+
+def bench_restore_pop_complete_rows() -> Callable[[], object]:
+    """Restore a snapshot then delete its four complete rows"""
+    game_map = filled_map(full_rows=4)
+    snapshot = game_map.snapshot()
+
+    def restore_and_pop() -> list[int]:
+        game_map.restore(snapshot)
+        return game_map.pop_complete_rows()
+
+    return restore_and_pop
+
+
+def bench_block_collection_or() -> Callable[[], object]:
+    """Merge the active blocks into the locked blocks of a half filled map"""
+    game_map = filled_map()
+    active_blocks, locked_blocks = game_map.active_blocks, game_map.locked_blocks
+    return lambda: active_blocks | locked_blocks
+
+
+def create_matrix(game_map: Map) -> Matrix:
+    """Return a matrix drawing a map on a window of the dummy video driver
+    pygame is only imported here, so the other benchmarks run without it."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame = import_module("pygame")
+    pygame.display.init()
+    surface = pygame.display.set_mode((1280, 720))
+    return import_module("tetrominos.matrix").Matrix(
+        surface=surface, block_size_in_pixels=30, game_map=game_map
+    )
+
+
+def bench_render_matrix() -> Callable[[], object]:
+    """Render a frame where the active tetromino moved"""
+    game_map = filled_map()
+    matrix = create_matrix(game_map)
+    matrix.render_matrix()
+    moves = [
+        Translation(game_map, TranslationDirection.LEFT).simulated_tetromino,
+        game_map.active_tetromino,
+    ]
+
+    def move_and_render() -> object:
+        moves.reverse()
+        game_map.active_tetromino = moves[0]
+        return matrix.render_matrix()
+
+    return move_and_render
+
+
+def bench_render_matrix_full() -> Callable[[], object]:
+    """Render a whole frame after an invalidation"""
+    matrix = create_matrix(filled_map())
+
+    def invalidate_and_render() -> object:
+        matrix.invalidate()
+        return matrix.render_matrix()
+
+    return invalidate_and_render
+
+
+def scripted_game(columns: int, lines: int, fill: float) -> Callable[[], object]:
+    """Return a benchmark playing GAME_TICKS ticks of random actions,
+    starting from a map filled up to fill and starting again when a game is over"""
+    snapshot = filled_map(columns, lines, fill).snapshot()
+    engine = Engine(columns, lines)
+
+    def play() -> int:
+        rng = Random(0)
+        engine.reset(0)
+        engine.map.restore(snapshot)
+        for _ in range(GAME_TICKS):
+            if engine.step(rng.choice(SCRIPT_ACTIONS))[2]:
+                engine.reset(rng.randrange(1 << 32))
+                engine.map.restore(snapshot)
+        return engine.stats.ticks
+
+    return play
+
+
+BENCHMARKS: dict[str, BenchmarkFactory] = {
+    "tetromino.get_blocks": bench_get_blocks,
+    "movement.validate": bench_validate,
+    "movement.is_inbound": bench_is_inbound,
+    "movement.is_overlapping": bench_is_overlapping,
+    "map.list_complete_rows": bench_list_complete_rows,
+    "map.restore": bench_restore,
+    "map.restore+pop_complete_rows": bench_restore_pop_complete_rows,
+    "block_collection.or": bench_block_collection_or,
+    "matrix.render_matrix": bench_render_matrix,
+    "matrix.render_matrix.full": bench_render_matrix_full,
+}
+BENCHMARKS.update(
+    (f"game.{columns}x{lines}.fill{int(fill * 100)}", partial(scripted_game, columns, lines, fill))
+    for columns, lines in GAME_SIZES
+    for fill in GAME_FILLS
+)
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """The timing of a benchmark, in seconds per call"""
+
+    name: str
+    best: float
+    median: float
+    calls: int
+    repeats: int
+
+
+def run_benchmark(name: str, repeats: int = 5) -> BenchmarkResult:
+    """Time a benchmark of BENCHMARKS"""
+    timer = timeit.Timer(BENCHMARKS[name]())
+    calls, _ = timer.autorange()
+    timings = [timing / calls for timing in timer.repeat(repeat=repeats, number=calls)]
+    return BenchmarkResult(name, min(timings), median(timings), calls, repeats)
+
+
+def run_benchmarks(pattern: str = "", repeats: int = 5) -> Iterator[BenchmarkResult]:
+    """Time the benchmarks whose name contains pattern"""
+    for name in BENCHMARKS:
+        if pattern in name:
+            yield run_benchmark(name, repeats)
+
+
+@dataclass(frozen=True)
+class ImportTiming:
+    """The time to import a module in a fresh interpreter, in seconds,
+    and whether the import loaded pygame"""
+
+    module: str
+    duration: float
+    loads_pygame: bool
+
+
+def time_import(module: str, repeats: int = 5) -> ImportTiming:
+    """Import a module in repeats fresh interpreters and keep the best time"""
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT, module],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        timings.append(json.loads(output))
+    return ImportTiming(
+        module=module,
+        duration=min(timing["duration"] for timing in timings),
+        loads_pygame=any(timing["pygame"] for timing in timings),
+    )
+
+
+def compare_results(
+    baseline: dict[str, dict], current: dict[str, dict], threshold: float = 0.1
+) -> Iterator[tuple[str, float, bool]]:
+    """Compare the best timings of the benchmarks run in both result files
+
+    Returns:
+        (name, current / baseline ratio, True if the ratio exceeds 1 + threshold)
+        for every benchmark
+    """
+    for name, result in current.items():
+        if name in baseline:
+            ratio = result["best"] / baseline[name]["best"]
+            yield name, ratio, ratio > 1 + threshold
+
+
+def unmatched_benchmarks(
+    baseline: dict[str, dict], current: dict[str, dict]
+) -> tuple[list[str], list[str]]:
+    """Return the benchmarks of the baseline missing from the current results,
+    and the new benchmarks of the current results, both sorted"""
+    return sorted(baseline.keys() - current.keys()), sorted(current.keys() - baseline.keys())
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the commands of the benchmark suite to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Run or compare benchmarks")
+    commands = parser.add_subparsers(dest="benchmark_command", required=True)
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--filter", default="", help="only run the benchmarks containing this")
+    run.add_argument("--repeat", type=int, default=5, help="number of timings per benchmark")
+    run.add_argument("--output", default=None, help="JSON file of the results")
+    compare = commands.add_parser("compare", help="flag the regressions between two runs")
+    compare.add_argument("baseline", help="JSON file of the reference results")
+    compare.add_argument("current", help="JSON file of the new results")
+    compare.add_argument("--threshold", type=float, default=0.1, help="tolerated slowdown")
+    imports = commands.add_parser("imports", help="check the import time of the headless core")
+    imports.add_argument(
+        "--budget", type=float, default=IMPORT_BUDGET, help="seconds allowed per module"
+    )
+    imports.add_argument("--repeat", type=int, default=5, help="number of timings per module")
+    return parser
+
+
+def run_command(arguments: argparse.Namespace) -> int:
+    """Run the benchmarks, print them and save them as JSON"""
+    results = {}
+    for result in run_benchmarks(arguments.filter, arguments.repeat):
+        results[result.name] = asdict(result)
+        print(f"{result.name:40} {result.best * 1e6:12.2f} us", file=sys.stderr)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return 0
+
+
+def compare_command(arguments: argparse.Namespace) -> int:
+    """Print the comparison of two result files
+
+    Returns:
+        1 if a benchmark regressed or is missing from the current results, 0 otherwise
+    """
+    with open(arguments.baseline, encoding="utf-8") as baseline:
+        baseline_results = json.load(baseline)["results"]
+    with open(arguments.current, encoding="utf-8") as current:
+        current_results = json.load(current)["results"]
+    regressed = False
+    for name, ratio, regression in compare_results(
+        baseline_results, current_results, arguments.threshold
+    ):
+        regressed |= regression
+        print(f"{name:40} {ratio:8.2f}x {'REGRESSION' if regression else ''}")
+    missing, new = unmatched_benchmarks(baseline_results, current_results)
+    for name in missing:
+        print(f"{name:40} {'':>9} MISSING")
+    for name in new:
+        print(f"{name:40} {'':>9} NEW")
+    return int(regressed or bool(missing))
+
+
+def imports_command(arguments: argparse.Namespace) -> int:
+    """Print the import time of the headless modules
+
+    Returns:
+        1 if a module exceeded the budget or loaded pygame, 0 otherwise
+    """
+    failed = False
+    for module in HEADLESS_MODULES:
+        timing = time_import(module, arguments.repeat)
+        problems = []
+        if timing.duration > arguments.budget:
+            problems.append("OVER BUDGET")
+        if timing.loads_pygame:
+            problems.append("LOADS PYGAME")
+        failed |= bool(problems)
+        print(f"{module:40} {timing.duration * 1e3:8.2f} ms {' '.join(problems)}")
+    return int(failed)
+
+
+def main(arguments: argparse.Namespace) -> int:
+    """Run a command of the benchmark suite and return its exit code"""
+    if arguments.benchmark_command == "compare":
+        return compare_command(arguments)
+    if arguments.benchmark_command == "imports":
+        return imports_command(arguments)
+    return run_command(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main(build_parser().parse_args()))
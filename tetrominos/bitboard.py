@@ -0,0 +1,220 @@
+"""This module contains the Bitboard class
+The Bitboard is a compact storage for the locked blocks of the map.
+Each line is stored as an integer bitmask where the bit x is set when
+the block at column x is occupied.
+A parallel bytearray per line stores the color of every block as an index
+in a small color palette.
+The skyline stores the line of the highest block of every column.
+
+The empty lines all share a single immutable line of colors, so large boards
+only allocate the lines holding blocks, and the lines above the top of the
+stack are skipped by the scans.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+
+__all__ = ["Bitboard", "empty_line"]
+
+# Translation table of the palette indexes into b"0" for empty blocks and b"1" otherwise
+OCCUPANCY_DIGITS = bytes([ord("0")] + [ord("1")] * 255)
+# The last palette index of a bitboard, 255 being left to the colors drawn but never locked
+MAX_COLOR_INDEX = 254
+
+
+@lru_cache(maxsize=None)
+def empty_line(columns: int) -> bytes:
+    """Return the colors of an empty line, shared by all the empty lines"""
+    return bytes(columns)
+
+
+class Bitboard:
+    """The Bitboard stores the locked blocks of a map of a defined size.
+
+    Occupancy tests, full row detection and row clearing only need a few
+    integer operations per line:
+    - rows[y] is the occupancy bitmask of the line y
+    - colors[y][x] is the palette index of the block at (x, y), 0 meaning empty,
+    colors[y] being the shared empty_line until a block is added to the line
+    - skyline[x] is the line of the highest block of the column x, lines if empty
+
+    The skyline is updated when a block is added and recomputed from the top
+    of the stack when rows are cleared.
+    """
+
+    def __init__(
+        self,
+        columns: int,
+        lines: int,
+        palette: Iterable[tuple[int, int, int]] = (),
+    ) -> None:
+        self.columns: int = columns
+        self.lines: int = lines
+        self.rows: list[int] = [0] * lines
+        self.skyline: list[int] = [lines] * columns
+        self.colors: list[bytes | bytearray] = [empty_line(columns)] * lines
+        self.palette: list[tuple[int, int, int]] = [(0, 0, 0)]
+        self.palette_indexes: dict[tuple[int, int, int], int] = {}
+        for color in palette:
+            self.color_index(color)
+
+    @property
+    def full_row_mask(self) -> int:
+        """The occupancy bitmask of a complete row"""
+        return (1 << self.columns) - 1
+
+    @property
+    def top(self) -> int:
+        """The line of the highest block, lines if the board is empty
+        All the lines above it are empty."""
+        return min(self.skyline, default=self.lines)
+
+    def color_index(self, color: tuple[int, int, int]) -> int:
+        """Return the palette index of a color, registering it if needed"""
+        index = self.palette_indexes.get(color)
+        if index is None:
+            index = len(self.palette)
+            if index > MAX_COLOR_INDEX:
+                raise ValueError(
+                    f"A bitboard palette can not hold more than {MAX_COLOR_INDEX} colors"
+                )
+            self.palette.append(color)
+            self.palette_indexes[color] = index
+        return index
+
+    def is_inbound(self, coordinate: tuple[int, int]) -> bool:
+        """Return True if a coordinate is inside the board"""
+        return 0 <= coordinate[0] < self.columns and 0 <= coordinate[1] < self.lines
+
+    def is_occupied(self, coordinate: tuple[int, int]) -> bool:
+        """Return True if a block is locked at a coordinate inside the board"""
+        x, y = coordinate
+        return 0 <= y < self.lines and 0 <= x and bool(self.rows[y] >> x & 1)
+
+    def add(self, coordinate: tuple[int, int], color: tuple[int, int, int]) -> None:
+        """Lock a block of a certain color at a coordinate
+        Blocks outside of the board are ignored.
+        """
+        if not self.is_inbound(coordinate):
+            return
+        x, y = coordinate
+        self.rows[y] |= 1 << x
+        if not isinstance(self.colors[y], bytearray):
+            self.colors[y] = bytearray(self.colors[y])
+        self.colors[y][x] = self.color_index(color)
+        if y < self.skyline[x]:
+            self.skyline[x] = y
+
+    def get_color(self, coordinate: tuple[int, int]) -> tuple[int, int, int] | None:
+        """Return the color of the block locked at a coordinate, None if empty"""
+        if not self.is_occupied(coordinate):
+            return None
+        return self.palette[self.colors[coordinate[1]][coordinate[0]]]
+
+    def scan_drop_distance(self, cells: Iterable[tuple[int, int]]) -> int:
+        """Return the number of lines some blocks can move down together
+        before touching a locked block or the bottom, checking line by line"""
+        cells = tuple(cells)
+        distance = 0
+        while all(
+            y + distance + 1 < self.lines and not self.is_occupied((x, y + distance + 1))
+            for x, y in cells
+        ):
+            distance += 1
+        return distance
+
+    def is_row_complete(self, row: int) -> bool:
+        """Return True if a row is complete"""
+        return self.rows[row] == self.full_row_mask
+
+    def complete_rows(self, lines: Iterable[int] | None = None) -> list[int]:
+        """List the complete rows among some lines, all the lines of the stack
+        by default, and return a sorted list containing their number"""
+        full_row_mask = self.full_row_mask
+        if lines is None:
+            lines = range(self.top, self.lines)
+        return sorted(line for line in lines if self.rows[line] == full_row_mask)
+
+    def clear_rows(self, rows_to_clear: Iterable[int]) -> None:
+        """Delete rows, the rows above falling down"""
+        cleared = sorted(set(rows_to_clear), reverse=True)
+        if not cleared:
+            return
+        top = self.top
+        for row in cleared:
+            del self.rows[row]
+            del self.colors[row]
+        self.rows[0:0] = [0] * len(cleared)
+        self.colors[0:0] = [empty_line(self.columns)] * len(cleared)
+        # the stack only moves down when rows are cleared
+        self.update_skyline(top)
+
+    def clear(self) -> None:
+        """Remove all the locked blocks"""
+        self.rows = [0] * self.lines
+        self.colors = [empty_line(self.columns)] * self.lines
+        self.skyline = [self.lines] * self.columns
+
+    def update_skyline(self, from_line: int = 0) -> None:
+        """Recompute the skyline, scanning the lines down from from_line,
+        above which the lines must be empty"""
+        self.skyline = [self.lines] * self.columns
+        remaining = self.full_row_mask
+        for y in range(from_line, self.lines):
+            found = self.rows[y] & remaining
+            remaining ^= found
+            while found:
+                lowest_bit = found & -found
+                self.skyline[lowest_bit.bit_length() - 1] = y
+                found ^= lowest_bit
+            if not remaining:
+                return
+
+    def to_bytes(self) -> bytes:
+        """Return the palette indexes of all the blocks, one byte per block,
+        line by line from the top"""
+        return b"".join(self.colors)
+
+    def load_bytes(self, buffer: bytes | bytearray | memoryview) -> None:
+        """Replace all the blocks by the palette indexes of a buffer
+        laid out like the output of to_bytes"""
+        columns = self.columns
+        if len(buffer) != columns * self.lines:
+            raise ValueError("The buffer does not match the size of the board")
+        self.clear()
+        for line in range(self.lines):
+            self.load_line(line, buffer[line * columns : (line + 1) * columns])
+        self.update_skyline()
+
+    def load_line(self, line: int, colors: bytes | bytearray | memoryview) -> None:
+        """Replace the blocks of a line by the palette indexes of colors
+        The skyline must be updated once the lines are loaded."""
+        if len(colors) != self.columns:
+            raise ValueError("The colors do not match the size of the line")
+        if colors == empty_line(self.columns):
+            self.colors[line] = empty_line(self.columns)
+            self.rows[line] = 0
+            return
+        self.colors[line] = bytearray(colors)
+        # the occupancy digits of a line read from right to left form its bitmask
+        self.rows[line] = int(self.colors[line].translate(OCCUPANCY_DIGITS)[::-1], 2)
+
+    def blocks(self) -> Iterator[tuple[tuple[int, int], tuple[int, int, int]]]:
+        """Iterate over the locked blocks as (coordinate, color) pairs"""
+        palette = self.palette
+        for y in range(self.top, self.lines):
+            mask = self.rows[y]
+            if not mask:
+                continue
+            row_colors = self.colors[y]
+            x = 0
+            while mask:
+                if mask & 1:
+                    yield (x, y), palette[row_colors[x]]
+                mask >>= 1
+                x += 1
+
+    def __len__(self) -> int:
+        return sum(mask.bit_count() for mask in self.rows)
@@ -1,34 +1,74 @@
 """This class contains the code related to Blocks objects
 The Block is the smallest subdivision of the game matrix.
 A collection of blocks, with known coordinates can be represented in a BlockCollection
+
+Blocks are immutable flyweights: Block(color) always returns the same
+instance for a color, so any number of collections share a handful of blocks.
+Merging collections does not copy them, the merged collection being a
+chained view of the merged ones.
 """
 
 from __future__ import annotations
 
+from collections import ChainMap
+from collections.abc import Mapping, MutableMapping
 from dataclasses import dataclass
+from types import MappingProxyType
+
+from tetrominos.counters import COUNTING, OPERATION_COUNTS
 
-__all__ = ["Block", "BlockCollection"]
+__all__ = ["Block", "BlockCollection", "ReadOnlyBlockCollection"]
 
+# The interned blocks, by color
+INTERNED_BLOCKS: dict[tuple[int, int, int], Block] = {}
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Block:
-    """This class represents a block."""
+    """This class represents a block.
+    Blocks are interned, there is a single block per color."""
 
     color: tuple[int, int, int]
 
+    def __new__(cls, color: tuple[int, int, int]) -> Block:
+        block = INTERNED_BLOCKS.get(color)
+        if block is None:
+            # the slots class is a copy made by the dataclass decorator, super() would not find it
+            block = INTERNED_BLOCKS[color] = object.__new__(cls)
+        return block
+
+    def __getnewargs__(self) -> tuple[tuple[int, int, int]]:
+        """Unpickle the block as the interned block of its color"""
+        return (self.color,)
+
 
 class BlockCollection:
     """The BlockCollection is a dataclass whose purpose is to
     store a collections of blocks with their coordinates
-    The data is contained inside a dict where:
+    The data is contained inside a mapping where:
     - the key is the coordinate
     - the value is a block object
     This structure is intended to improve performance when accessing
     the block existing at a certain coordinate
+
+    The mapping is either a dict or a ChainMap, a view chaining the mappings
+    of other collections without copying them. The blocks added to a view go
+    to its own first mapping, the chained mappings are never modified.
+    A view reflects the later changes of the collections it chains.
     """
 
-    def __init__(self) -> None:
-        self.collection: dict[tuple[int, int], Block] = {}
+    __slots__ = ("collection",)
+
+    def __init__(self, collection: MutableMapping[tuple[int, int], Block] | None = None) -> None:
+        self.collection: MutableMapping[tuple[int, int], Block] = (
+            {} if collection is None else collection
+        )
+
+    @classmethod
+    def view_of(cls, *collections: Mapping[tuple[int, int], Block]) -> BlockCollection:
+        """Return a collection chaining some mappings of blocks, the first ones
+        taking precedence, without copying them"""
+        return cls(ChainMap({}, *collections))
 
     def add(self, coordinate: tuple[int, int], block: Block) -> None:
         """Add a new block to the collection"""
@@ -47,13 +87,27 @@ class BlockCollection:
         self.collection = new_collection
 
     def __or__(self, other_collection) -> BlockCollection:
-        """Define the or operator (|) as a merge operator for this class"""
-        merged_dicts: dict[tuple[int, int], Block] = (
-            self.collection | other_collection.collection
-        )
-        merged_collection = BlockCollection()
+        """Define the or operator (|) as a merge operator for this class,
+        the blocks of other_collection taking precedence like for dicts.
+        The merge is a view of both collections."""
+        if COUNTING.enabled:
+            OPERATION_COUNTS["merges"] += 1
+        return BlockCollection.view_of(other_collection.collection, self.collection)
+
+
+class ReadOnlyBlockCollection(BlockCollection):
+    """A collection of blocks that can not be modified, like the view of
+    the locked blocks of a map: adding or deleting blocks raises a TypeError
+    instead of silently changing a copy. The mapping is wrapped without being
+    copied. Merging it still returns a collection that can be modified."""
 
-        for coordinates, blocks in merged_dicts.items():
-            merged_collection.add(coordinates, blocks)
+    __slots__ = ()
 
-        return merged_collection
+    def __init__(self, collection: Mapping[tuple[int, int], Block]) -> None:
+        super().__init__(MappingProxyType(collection))
+
+    def add(self, coordinate: tuple[int, int], block: Block) -> None:
+        raise TypeError("The collection is read-only, build a BlockCollection to modify it")
+
+    def delete_row(self, row_number: int) -> None:
+        raise TypeError("The collection is read-only, build a BlockCollection to modify it")
@@ -0,0 +1,124 @@
+"""This module contains the controls of the game
+The controls turn the presses and releases of the keys into the actions
+applied to the active tetromino, without depending on pygame:
+- a press applies its action at once, without waiting for the next tick
+- a held shift key, left or right, repeats its action once it was held for
+  the delayed auto-shift (DAS), then every auto-repeat rate (ARR) ticks.
+  An ARR of 0 slides the tetromino as far as it goes instead. The held keys
+  are advanced every logic tick, and the last shift key pressed wins.
+- the other actions are applied once per press
+
+The controls remember when the inputs that moved the tetromino happened,
+so the app measures the latency from an input to displaying the frame showing
+its move. The repeats of a held key happen when the tick repeating them was due.
+pygame does not timestamp its events, so a press is timed from the previous
+poll of the events, the earliest it may have arrived: its latency includes
+the longest time it may have waited in the queue.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from tetrominos.action import Action
+
+__all__ = ["ControlSettings", "Controls"]
+
+REPEATED_ACTIONS = frozenset({Action.LEFT, Action.RIGHT})
+
+
+@dataclass(frozen=True)
+class ControlSettings:
+    """The timings of the held shift keys, in seconds, see Controls"""
+
+    das_seconds: float = 0.167
+    arr_seconds: float = 0.033
+
+    def ticks(self, tick_rate: int) -> tuple[int, int]:
+        """Return the DAS and the ARR in ticks of a game running tick_rate ticks per second,
+        a DAS lasting at least one tick"""
+        return max(1, round(self.das_seconds * tick_rate)), round(self.arr_seconds * tick_rate)
+
+
+class Controls:
+    """The controls apply the actions of the keys through an apply function,
+    like Engine.apply, which returns True if the tetromino moved
+
+    Usage:
+        controls.poll()  # before handling the pending events
+        controls.press(Action.LEFT, engine.apply)  # on a key press
+        controls.release(Action.LEFT)  # on a key release
+        controls.tick(engine.apply, due_at)  # before every logic tick
+        for input_at in controls.pop_moves():  # once a frame is displayed
+            ... record the latency of the input at input_at
+    """
+
+    def __init__(self, settings: ControlSettings = ControlSettings(), tick_rate: int = 240) -> None:
+        self.das_ticks, self.arr_ticks = settings.ticks(tick_rate)
+        # the shift keys held, in the order they were pressed, with the ticks they were held
+        self.held: dict[Action, int] = {}
+        # the times of the inputs that moved the tetromino, in nanoseconds
+        self.moves: list[int] = []
+        # the times of the last poll of the events and of the poll before it
+        self.polled_at: int | None = None
+        self.arrived_after: int | None = None
+
+    def poll(self) -> None:
+        """Note that the pending events are about to be handled: their presses
+        arrived after the previous poll, the time they are timed from"""
+        now = time.perf_counter_ns()
+        self.arrived_after = now if self.polled_at is None else self.polled_at
+        self.polled_at = now
+
+    def press(
+        self, action: Action, apply: Callable[[Action], bool], read_at: int | None = None
+    ) -> bool:
+        """Apply the action of a key pressed at read_at, by default after the
+        previous poll, or now without any poll
+
+        Returns:
+            True if the tetromino moved
+        """
+        if action in REPEATED_ACTIONS:
+            self.held.pop(action, None)
+            self.held[action] = 0
+        moved = apply(action)
+        if moved:
+            if read_at is None:
+                read_at = self.arrived_after
+            self.moves.append(time.perf_counter_ns() if read_at is None else read_at)
+        return moved
+
+    def release(self, action: Action) -> None:
+        """Stop repeating the action of a key released"""
+        self.held.pop(action, None)
+
+    def release_all(self) -> None:
+        """Stop repeating every action, like when the window loses the focus"""
+        self.held.clear()
+
+    def tick(self, apply: Callable[[Action], bool], due_at: int | None = None) -> None:
+        """Advance the last shift key pressed by a tick due at due_at, now by default,
+        and repeat its action once it was held for the DAS"""
+        if not self.held:
+            return
+        action = next(reversed(self.held))
+        held_ticks = self.held[action] = self.held[action] + 1
+        if held_ticks < self.das_ticks:
+            return
+        moved = False
+        if not self.arr_ticks:
+            while apply(action):
+                moved = True
+        elif (held_ticks - self.das_ticks) % self.arr_ticks == 0:
+            moved = apply(action)
+        if moved:
+            self.moves.append(time.perf_counter_ns() if due_at is None else due_at)
+
+    def pop_moves(self) -> list[int]:
+        """Return the times of the inputs that moved the tetromino since the
+        previous call, and forget them"""
+        moves, self.moves = self.moves, []
+        return moves
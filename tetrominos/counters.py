@@ -0,0 +1,51 @@
+"""This module contains the counters of the hot operations
+The code running a hot operation counts it in OPERATION_COUNTS, and the
+FrameProfiler moves the counts of a frame to its own statistics when the
+frame ends. The counters live apart from the profiler, so the headless core
+counts its operations without importing the profiler and its exports.
+
+The operations are only counted while COUNTING is enabled, so the hot paths
+of a game which is not profiled do not pay for the counters. Every profiler
+switches counting for itself: the operations are counted while at least one
+enabled profiler is open, and closing a profiler gives back the previous state.
+"""
+
+from dataclasses import dataclass, field
+from weakref import WeakSet
+
+__all__ = ["OPERATION_COUNTS", "COUNTING", "Counting"]
+
+# The hot operations counted since the end of the previous frame
+OPERATION_COUNTS: dict[str, int] = {
+    "movements": 0,
+    "merges": 0,
+    "draw_calls": 0,
+}
+
+
+@dataclass
+class Counting:
+    """Whether the hot operations are counted in OPERATION_COUNTS
+
+    enabled is only changed through switch, it is True while one of the
+    owners asked for counting. The owners are weak references, so a profiler
+    dropped without being closed stops counting at the next switch.
+    """
+
+    enabled: bool = False
+    owners: WeakSet = field(default_factory=WeakSet)
+
+    def switch(self, owner: object, enabled: bool) -> None:
+        """Start or stop counting on behalf of an owner"""
+        if enabled:
+            self.owners.add(owner)
+        else:
+            self.owners.discard(owner)
+        self.enabled = bool(self.owners)
+
+    def is_enabled_by(self, owner: object) -> bool:
+        """Return True if an owner asked for counting"""
+        return owner in self.owners
+
+
+COUNTING = Counting()
@@ -0,0 +1,305 @@
+"""This module contains the export of training data
+A transition is recorded every time a tetromino locks during a headless game:
+the board and the tetrominos when the tetromino appeared, the placement it
+locked in, the reward of the lock and whether the game is over.
+
+The transitions are stored in columns, one .npy file per field and shard,
+so a reader maps every field without copying it. A writer buffers the
+transitions in bytes and copies them into the preallocated memory-mapped
+shards CHUNK_ROWS at a time, a shard holding SHARD_ROWS transitions.
+After every copy the writer appends the number of valid rows of its shard to
+its index file, so the index never counts rows that were not written,
+even when a worker process is killed.
+
+The fields, see ShardLayout:
+- boards: the locked blocks packed one bit per block, line by line, the
+  block (x, y) being the bit y * columns + x, in little bit order
+- pieces and placements: the (kind index, rotation index, x, y) of the active
+  tetromino when it appeared and when it locked
+- next: the kind indexes of the next tetrominos, see Map.snapshot
+- rewards: the lines cleared by the lock
+- done: True if the game is over after the lock
+
+Usage:
+    python -m tetrominos.runner --games 1000 --export transitions/
+    dataset = TransitionDataset("transitions/")
+    for batch in dataset.batches(4096):
+        boards = dataset.unpack_boards(batch["boards"])
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import uuid
+from collections.abc import Iterator
+from functools import lru_cache
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine
+from tetrominos.tetromino import PieceState
+from tetrominos.zobrist import KIND_INDEXES
+
+__all__ = [
+    "ShardLayout",
+    "Transition",
+    "encode_board",
+    "TransitionWriter",
+    "TransitionRecorder",
+    "TransitionDataset",
+    "shard_writer",
+]
+
+SHARD_ROWS = 1 << 20
+CHUNK_ROWS = 1 << 12
+INDEX_SUFFIX = ".index.jsonl"
+STATE = struct.Struct("<4h")
+REWARD = struct.Struct("<f")
+
+
+class ShardLayout(NamedTuple):
+    """The size of the boards and the preview of the transitions of a shard"""
+
+    columns: int
+    lines: int
+    preview_size: int
+
+    @property
+    def board_bytes(self) -> int:
+        """The size of a packed board"""
+        return (self.columns * self.lines + 7) // 8
+
+    @property
+    def fields(self) -> dict[str, tuple[np.dtype, tuple[int, ...]]]:
+        """The dtype and the shape of a row of every field"""
+        return {
+            "boards": (np.dtype(np.uint8), (self.board_bytes,)),
+            "pieces": (np.dtype("<i2"), (4,)),
+            "next": (np.dtype(np.int8), (self.preview_size,)),
+            "placements": (np.dtype("<i2"), (4,)),
+            "rewards": (np.dtype("<f4"), ()),
+            "done": (np.dtype(np.bool_), ()),
+        }
+
+
+class Transition(NamedTuple):
+    """A transition, the board being packed by encode_board"""
+
+    board: bytes
+    piece: PieceState
+    next_kinds: tuple[str, ...]
+    placement: PieceState
+    reward: float
+    done: bool
+
+
+def encode_board(rows: list[int], columns: int) -> bytes:
+    """Return the packed board of the occupancy bitmasks of the lines, see Bitboard"""
+    packed = 0
+    for y, mask in enumerate(rows):
+        if mask:
+            packed |= mask << (y * columns)
+    return packed.to_bytes((columns * len(rows) + 7) // 8, "little")
+
+
+def encode_state(state: PieceState) -> bytes:
+    """Return the (kind index, rotation index, x, y) of a tetromino state"""
+    return STATE.pack(KIND_INDEXES[state.kind], state.rotation_index, *state.origin)
+
+
+class TransitionWriter:
+    """The writer streams transitions into the shards of a directory
+
+    Every writer has its own prefix, the id of its process followed by a
+    random suffix by default, so the workers of a pool write to the same
+    directory without sharing a file, and a process reusing the id of a
+    previous one never overwrites its shards.
+    """
+
+    def __init__(self, directory: str, layout: ShardLayout, prefix: str | None = None) -> None:
+        self.directory: Path = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.layout: ShardLayout = layout
+        self.prefix: str = f"{os.getpid()}-{uuid.uuid4().hex[:8]}" if prefix is None else prefix
+        self.shard: int = -1
+        self.rows: int = SHARD_ROWS
+        self.arrays: dict[str, np.memmap] = {}
+        self.pending: dict[str, bytearray] = {name: bytearray() for name in layout.fields}
+
+    @property
+    def pending_rows(self) -> int:
+        """The number of transitions buffered since the last copy"""
+        return len(self.pending["done"])
+
+    def append(self, transition: Transition) -> None:
+        """Buffer a transition, copying the buffer to the shards once it is full"""
+        pending = self.pending
+        pending["boards"] += transition.board
+        pending["pieces"] += encode_state(transition.piece)
+        pending["next"] += bytes(KIND_INDEXES[kind] for kind in transition.next_kinds)
+        pending["placements"] += encode_state(transition.placement)
+        pending["rewards"] += REWARD.pack(transition.reward)
+        pending["done"].append(transition.done)
+        if self.pending_rows >= CHUNK_ROWS:
+            self.flush()
+
+    def open_shard(self) -> None:
+        """Preallocate the memory-mapped files of the next shard"""
+        self.shard += 1
+        self.rows = 0
+        self.arrays = {
+            name: np.lib.format.open_memmap(
+                self.directory / f"{self.prefix}-{self.shard:05d}.{name}.npy",
+                mode="w+",
+                dtype=dtype,
+                shape=(SHARD_ROWS, *shape),
+            )
+            for name, (dtype, shape) in self.layout.fields.items()
+        }
+
+    def flush(self) -> None:
+        """Copy the buffered transitions into the shards and index them"""
+        start = 0
+        total = self.pending_rows
+        while start < total:
+            if self.rows == SHARD_ROWS:
+                self.open_shard()
+            count = min(total - start, SHARD_ROWS - self.rows)
+            self.copy_rows(start, count)
+            start += count
+            self.write_index()
+        for buffer in self.pending.values():
+            buffer.clear()
+
+    def copy_rows(self, start: int, count: int) -> None:
+        """Copy count buffered transitions from start to the current shard"""
+        for name, (dtype, shape) in self.layout.fields.items():
+            row_items = int(np.prod(shape))
+            rows = np.frombuffer(
+                self.pending[name], dtype, count * row_items, start * row_items * dtype.itemsize
+            )
+            self.arrays[name][self.rows : self.rows + count] = rows.reshape(count, *shape)
+        self.rows += count
+
+    def write_index(self) -> None:
+        """Append the number of valid rows of the current shard to the index"""
+        entry = {"shard": f"{self.prefix}-{self.shard:05d}", "rows": self.rows}
+        entry.update(self.layout._asdict())
+        index_path = self.directory / f"{self.prefix}{INDEX_SUFFIX}"
+        with open(index_path, "a", encoding="utf-8") as index:
+            index.write(json.dumps(entry) + "\n")
+
+    def close(self) -> None:
+        """Copy the buffered transitions and write the shards to the disk"""
+        self.flush()
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = {}
+        self.rows = SHARD_ROWS
+
+
+@lru_cache(maxsize=None)
+def shard_writer(directory: str, layout: ShardLayout) -> TransitionWriter:
+    """Return the writer of the current process to a directory, so the games
+    played by a worker process share its shards. The writer is closed when
+    the process exits, see multiprocessing.util.Finalize."""
+    writer = TransitionWriter(directory, layout)
+    Finalize(writer, writer.close, exitpriority=0)
+    return writer
+
+
+class TransitionRecorder:
+    """The recorder plays an engine and writes a transition every time a tetromino locks
+
+    Usage:
+        recorder = TransitionRecorder(engine, writer)
+        while not engine.done:
+            recorder.step(action)
+    """
+
+    def __init__(self, engine: Engine, writer: TransitionWriter) -> None:
+        self.engine: Engine = engine
+        self.writer: TransitionWriter = writer
+        self.observation: tuple[bytes, PieceState, tuple[str, ...]] = self.observe()
+
+    def observe(self) -> tuple[bytes, PieceState, tuple[str, ...]]:
+        """Return the packed board, the active tetromino and the next ones"""
+        game_map = self.engine.map
+        return (
+            encode_board(game_map.board.rows, game_map.columns),
+            game_map.active_tetromino.state,
+            game_map.generator.preview,
+        )
+
+    def step(self, action: Action = Action.NONE) -> int:
+        """Apply an action and advance the game by one tick, like Engine.step
+
+        Returns:
+            The number of lines cleared as reward
+        """
+        engine = self.engine
+        engine.apply(action)
+        pieces_placed = engine.stats.pieces_placed
+        placement = engine.state_after_gravity()
+        reward = engine.tick()
+        if engine.stats.pieces_placed != pieces_placed:
+            self.writer.append(Transition(*self.observation, placement, reward, engine.done))
+            self.observation = self.observe()
+        return reward
+
+
+class TransitionDataset:
+    """The dataset reads the shards of a directory without copying them
+
+    Every field of every shard is memory-mapped, trimmed to the rows of the
+    index, so a batch is a view of the files and only the pages read are loaded.
+    """
+
+    def __init__(self, directory: str) -> None:
+        path = Path(directory)
+        rows: dict[str, int] = {}
+        layouts = set()
+        for index_path in sorted(path.glob(f"*{INDEX_SUFFIX}")):
+            with open(index_path, encoding="utf-8") as index:
+                for line in index:
+                    entry = json.loads(line)
+                    rows[entry["shard"]] = max(rows.get(entry["shard"], 0), entry["rows"])
+                    layouts.add(
+                        ShardLayout(entry["columns"], entry["lines"], entry["preview_size"])
+                    )
+        if len(layouts) > 1:
+            raise ValueError(f"The shards of {directory} have different layouts: {layouts}")
+        self.layout: ShardLayout | None = layouts.pop() if layouts else None
+        self.shards: list[dict[str, np.ndarray]] = []
+        for shard, count in sorted(rows.items()):
+            if count and self.layout is not None:
+                self.shards.append(
+                    {
+                        name: np.load(path / f"{shard}.{name}.npy", mmap_mode="r")[:count]
+                        for name in self.layout.fields
+                    }
+                )
+
+    def __len__(self) -> int:
+        return sum(len(shard["done"]) for shard in self.shards)
+
+    def batches(self, batch_size: int) -> Iterator[dict[str, np.ndarray]]:
+        """Yield the fields of batch_size transitions at a time, as views of
+        the shards, the last batch of a shard being smaller"""
+        for shard in self.shards:
+            for start in range(0, len(shard["done"]), batch_size):
+                yield {name: array[start : start + batch_size] for name, array in shard.items()}
+
+    def unpack_boards(self, boards: np.ndarray) -> np.ndarray:
+        """Return the (N, lines, columns) bool array of packed boards"""
+        if self.layout is None:
+            raise ValueError("The dataset is empty")
+        columns, lines = self.layout.columns, self.layout.lines
+        cells = np.unpackbits(boards, axis=1, bitorder="little")[:, : columns * lines]
+        return cells.reshape(-1, lines, columns).astype(bool)
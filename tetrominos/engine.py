@@ -0,0 +1,199 @@
+"""This module contains the Engine class
+The engine runs the game rules on a Map without any display or timer:
+gravity and lock delay are counted in logical ticks, so a game advances as
+fast as the CPU allows.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from random import randrange
+from typing import Any
+
+from tetrominos.action import Action
+from tetrominos.map import Map
+from tetrominos.movement import Rotation, Translation, TranslationDirection
+from tetrominos.tetromino import BaseTetromino, PieceState
+
+__all__ = ["EngineRules", "GameStats", "Engine", "discard_input"]
+
+GRAVITY_SECONDS = 0.7
+LOCK_DELAY_SECONDS = 0.3
+
+
+@dataclass(frozen=True)
+class EngineRules:
+    """The timing rules of a game, expressed in ticks
+    The default values match a 60 ticks per second game where the gravity
+    moves the tetromino every 700ms and a tetromino locks after 300ms
+    """
+
+    gravity_ticks: int = 42
+    lock_delay_ticks: int = 18
+
+    @classmethod
+    def for_tick_rate(cls, tick_rate: int) -> EngineRules:
+        """Return the rules of a game running tick_rate ticks per second"""
+        return cls(round(GRAVITY_SECONDS * tick_rate), round(LOCK_DELAY_SECONDS * tick_rate))
+
+
+@dataclass
+class GameStats:
+    """The statistics of a running game"""
+
+    ticks: int = 0
+    lines_cleared: int = 0
+    pieces_placed: int = 0
+
+
+def discard_input(tick: int, action: Action) -> None:
+    """The default recorder of an engine, which records nothing"""
+    del tick, action
+
+
+class Engine:
+    """The engine is a headless game built on the Map and the movement classes.
+
+    The game is advanced with step(action), which applies an action
+    to the active tetromino and advances the game by one tick.
+
+    The recorder is called with the tick and the action of every input
+    that moved the active tetromino, it discards them by default.
+    """
+
+    def __init__(
+        self,
+        columns: int = 10,
+        lines: int = 20,
+        rules: EngineRules = EngineRules(),
+    ) -> None:
+        self.rules: EngineRules = rules
+        self.seed: int = randrange(1 << 32)
+        self.map: Map = Map(columns, lines, seed=self.seed)
+        self.stats: GameStats = GameStats()
+        self.gravity_timer: int = 0
+        self.lock_timer: int = 0
+        self.recorder: Callable[[int, Action], None] = discard_input
+
+    @property
+    def done(self) -> bool:
+        """Return True if the game is over"""
+        return self.map.game_over
+
+    def reset(self, seed: int | None = None) -> Map:
+        """Start a new game whose tetrominos are drawn from seed
+        A random seed is picked if none is given, so every game can be replayed.
+
+        Returns:
+            The map of the new game
+        """
+        self.seed = randrange(1 << 32) if seed is None else seed
+        self.map.reset(self.seed)
+        self.stats = GameStats()
+        self.gravity_timer = 0
+        self.lock_timer = 0
+        return self.map
+
+    def apply(self, action: Action) -> bool:
+        """Apply an action to the active tetromino without advancing the game
+
+        Returns:
+            True if the active tetromino moved
+        """
+        moved = self.move(action)
+        if moved:
+            self.recorder(self.stats.ticks, action)
+        return moved
+
+    def move(self, action: Action) -> bool:
+        """Move the active tetromino, without recording the action
+
+        Returns:
+            True if the active tetromino moved
+        """
+        if self.done:
+            return False
+        if action is Action.LEFT:
+            movement = Translation(self.map, TranslationDirection.LEFT)
+        elif action is Action.RIGHT:
+            movement = Translation(self.map, TranslationDirection.RIGHT)
+        elif action is Action.ROTATE:
+            movement = Rotation(self.map)
+        elif action is Action.DOWN:
+            movement = Translation(self.map, TranslationDirection.DOWN)
+        elif action is Action.DROP:
+            distance = self.map.drop_distance()
+            if distance:
+                self.map.active_tetromino = BaseTetromino.from_state(self.map.ghost_state)
+            return distance > 0
+        else:
+            return False
+        if not movement.validate():
+            return False
+        movement.execute()
+        return True
+
+    def state_after_gravity(self) -> PieceState:
+        """Return the state of the active tetromino once the gravity of the
+        next tick applied, which is the state it locks in if the tick locks it"""
+        state = self.map.active_tetromino.state
+        if self.gravity_timer + 1 >= self.rules.gravity_ticks and self.map.drop_distance(state):
+            return state.translated((0, 1))
+        return state
+
+    def tick(self) -> int:
+        """Advance the game by one tick: apply gravity, then lock the
+        tetromino once it rested for the lock delay
+
+        Returns:
+            The number of lines cleared during the tick
+        """
+        if self.done:
+            return 0
+        self.stats.ticks += 1
+        self.gravity_timer += 1
+        if self.gravity_timer >= self.rules.gravity_ticks:
+            self.gravity_timer = 0
+            self.move(Action.DOWN)
+
+        if Translation(self.map, TranslationDirection.DOWN).validate():
+            self.lock_timer = 0
+            self.map.locking_grace_period = False
+            return 0
+        self.map.locking_grace_period = True
+        self.lock_timer += 1
+        if self.lock_timer <= self.rules.lock_delay_ticks:
+            return 0
+        return self.lock()
+
+    def lock(self) -> int:
+        """Freeze the active tetromino and delete the complete rows
+
+        Returns:
+            The number of lines cleared
+        """
+        lines_cleared = len(self.map.freeze_tetromino())
+        self.map.locking_grace_period = False
+        self.lock_timer = 0
+        self.gravity_timer = 0
+        self.stats.pieces_placed += 1
+        self.stats.lines_cleared += lines_cleared
+        return lines_cleared
+
+    def step(self, action: Action = Action.NONE) -> tuple[Map, int, bool, dict[str, Any]]:
+        """Apply an action and advance the game by one tick
+
+        Returns:
+            The map, the number of lines cleared as reward,
+            True if the game is over and a dict of information
+        """
+        self.apply(action)
+        reward = self.tick()
+        info = {
+            "seed": self.seed,
+            "ticks": self.stats.ticks,
+            "lines_cleared": self.stats.lines_cleared,
+            "pieces_placed": self.stats.pieces_placed,
+        }
+        return self.map, reward, self.done, info
@@ -0,0 +1,280 @@
+"""This module contains the board evaluation features used by the search heuristics
+- aggregate height: the sum of the heights of the columns
+- holes: the empty blocks below the highest block of their column
+- bumpiness: the sum of the height differences between neighbour columns
+- row transitions: the changes between empty and occupied blocks along the
+  lines, the walls counting as occupied
+- column transitions: the changes between empty and occupied blocks along the
+  columns, the floor counting as occupied and the space above the board as empty
+- wells: the sum of 1 + 2 + ... + depth over the wells, a well being a column
+  lower than both of its neighbours, the walls being infinitely high
+
+The BoardFeatures of a bitboard keeps the contribution of every line and column
+to these features, so freezing a tetromino only updates the lines and columns
+it touched, and a candidate placement is evaluated from the contributions
+it changes, without being applied.
+The empty lines above the stack are never measured: an empty line always
+has two row transitions, the walls, and no column transitions.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from tetrominos.bitboard import Bitboard
+from tetrominos.tetromino import PieceState
+
+__all__ = ["Features", "DELLACHERIE_WEIGHTS", "BoardFeatures", "measure_rows"]
+
+
+class Features(NamedTuple):
+    """The evaluation features of a board, and of the placement leading to it"""
+
+    aggregate_height: int
+    holes: int
+    bumpiness: int
+    row_transitions: int
+    column_transitions: int
+    wells: int
+    lines_cleared: int = 0
+    landing_height: float = 0.0
+
+    def score(self, weights: Features) -> float:
+        """Return the weighted sum of the features"""
+        return sum(feature * weight for feature, weight in zip(self, weights))
+
+
+# The weights of the heuristic of Pierre Dellacherie
+DELLACHERIE_WEIGHTS = Features(
+    aggregate_height=0,
+    holes=-4,
+    bumpiness=0,
+    row_transitions=-1,
+    column_transitions=-1,
+    wells=-1,
+    lines_cleared=1,
+    landing_height=-1,
+)
+
+
+def row_transitions(mask: int, columns: int) -> int:
+    """Return the transitions along a line of occupancy bitmask mask"""
+    walled = mask << 1 | 1 | 1 << (columns + 1)
+    return ((walled ^ walled >> 1) & ((1 << (columns + 1)) - 1)).bit_count()
+
+
+def well_sum(heights: list[int], column: int) -> int:
+    """Return 1 + 2 + ... + depth for the well of a column, 0 if it is not a well"""
+    left = heights[column - 1] if column > 0 else 1 << 30
+    right = heights[column + 1] if column + 1 < len(heights) else 1 << 30
+    depth = min(left, right) - heights[column]
+    return depth * (depth + 1) // 2 if depth > 0 else 0
+
+
+def line_pair(
+    rows: list[int], line: int, full_row_mask: int, changed_rows: dict[int, int] | None = None
+) -> int:
+    """Return the line above a line, then the line itself, the space above the
+    board being empty and the floor occupied, with the masks of changed_rows
+    replacing the ones of rows"""
+    changed_rows = changed_rows or {}
+    upper = changed_rows.get(line - 1, rows[line - 1]) if line > 0 else 0
+    lower = changed_rows.get(line, rows[line]) if line < len(rows) else full_row_mask
+    return upper ^ lower
+
+
+def measure_rows(rows: list[int], columns: int) -> Features:
+    """Return the features of the occupancy bitmasks of the lines of a board"""
+    lines = len(rows)
+    full_row_mask = (1 << columns) - 1
+    heights = [0] * columns
+    remaining = full_row_mask
+    for y, mask in enumerate(rows):
+        found = mask & remaining
+        remaining ^= found
+        while found:
+            lowest_bit = found & -found
+            heights[lowest_bit.bit_length() - 1] = lines - y
+            found ^= lowest_bit
+    blocks = sum(mask.bit_count() for mask in rows)
+    return Features(
+        aggregate_height=sum(heights),
+        holes=sum(heights) - blocks,
+        bumpiness=sum(abs(heights[x] - heights[x + 1]) for x in range(columns - 1)),
+        row_transitions=sum(row_transitions(mask, columns) for mask in rows),
+        column_transitions=sum(
+            line_pair(rows, line, full_row_mask).bit_count() for line in range(lines + 1)
+        ),
+        wells=sum(well_sum(heights, x) for x in range(columns)),
+    )
+
+
+class BoardFeatures:
+    """The features of a bitboard, updated as blocks are added and rows cleared
+
+    The contributions are kept per line, per pair of neighbour lines and per
+    column. add_cells and clear_rows must be called after the bitboard changed.
+    """
+
+    def __init__(self, board: Bitboard) -> None:
+        self.board: Bitboard = board
+        self.heights: list[int] = []
+        self.column_blocks: list[int] = []
+        self.row_transitions: list[int] = []
+        self.column_transitions: list[int] = []
+        self.bumps: list[int] = []
+        self.wells: list[int] = []
+        self.recompute()
+
+    def recompute(self) -> None:
+        """Compute every contribution from the bitboard"""
+        board = self.board
+        stack = board.rows[board.top :]
+        self.heights = [board.lines - top for top in board.skyline]
+        self.column_blocks = [sum(mask >> x & 1 for mask in stack) for x in range(board.columns)]
+        self.row_transitions = [row_transitions(0, board.columns)] * board.lines
+        self.column_transitions = [0] * (board.lines + 1)
+        self.bumps = [0] * max(board.columns - 1, 0)
+        self.wells = [0] * board.columns
+        # the bottom line is always measured for its transitions with the floor
+        self.update_lines(range(min(board.top, board.lines - 1), board.lines))
+        self.update_columns(range(board.columns))
+
+    def update_lines(self, lines: Iterable[int]) -> None:
+        """Update the contributions of some lines"""
+        rows, columns, full_row_mask = self.board.rows, self.board.columns, self.board.full_row_mask
+        for line in lines:
+            self.row_transitions[line] = row_transitions(rows[line], columns)
+            self.column_transitions[line] = line_pair(rows, line, full_row_mask).bit_count()
+            self.column_transitions[line + 1] = line_pair(
+                rows, line + 1, full_row_mask
+            ).bit_count()
+
+    def update_columns(self, columns: Iterable[int]) -> None:
+        """Update the heights of some columns, and the contributions depending on them"""
+        heights, skyline, lines = self.heights, self.board.skyline, self.board.lines
+        updated = set()
+        for column in columns:
+            heights[column] = lines - skyline[column]
+            updated.update((column - 1, column, column + 1))
+        for column in updated:
+            if 0 <= column < len(heights):
+                self.wells[column] = well_sum(heights, column)
+            if 0 <= column < len(self.bumps):
+                self.bumps[column] = abs(heights[column] - heights[column + 1])
+
+    def add_cells(self, cells: Iterable[tuple[int, int]]) -> None:
+        """Update the features after blocks were added to the board at cells"""
+        cells = [(x, y) for x, y in cells if self.board.is_inbound((x, y))]
+        for x, _ in cells:
+            self.column_blocks[x] += 1
+        self.update_lines({y for _, y in cells})
+        self.update_columns({x for x, _ in cells})
+
+    def clear_rows(self, cleared: int, moved_lines: Iterable[int]) -> None:
+        """Update the features after a number of complete rows were cleared,
+        moving the blocks of some lines"""
+        for column in range(self.board.columns):
+            self.column_blocks[column] -= cleared
+        self.update_lines(moved_lines)
+        self.update_columns(range(self.board.columns))
+
+    def current(self) -> Features:
+        """Return the features of the board"""
+        aggregate_height = sum(self.heights)
+        return Features(
+            aggregate_height=aggregate_height,
+            holes=aggregate_height - sum(self.column_blocks),
+            bumpiness=sum(self.bumps),
+            row_transitions=sum(self.row_transitions),
+            column_transitions=sum(self.column_transitions),
+            wells=sum(self.wells),
+        )
+
+    def evaluate(self, states: Iterable[PieceState]) -> list[Features]:
+        """Return the features of the boards reached by freezing tetrominos
+        in some states inside the board, without changing the board"""
+        base = self.current()
+        return [self.evaluate_state(state, base) for state in states]
+
+    def evaluate_state(self, state: PieceState, base: Features) -> Features:
+        """Return the features of the board reached by freezing a tetromino in a state,
+        base being the current features"""
+        board = self.board
+        new_rows: dict[int, int] = {}
+        for x, y in state.cells:
+            new_rows[y] = new_rows.get(y, board.rows[y]) | 1 << x
+        landing_height = board.lines - (min(new_rows) + max(new_rows)) / 2
+        cleared = sum(mask == board.full_row_mask for mask in new_rows.values())
+        if cleared:
+            return self.measure_cleared(new_rows)._replace(
+                lines_cleared=cleared, landing_height=landing_height
+            )
+        row_delta, column_delta = self.line_deltas(new_rows)
+        height_delta, bumpiness_delta, wells_delta = self.column_deltas(state.cells)
+        return Features(
+            aggregate_height=base.aggregate_height + height_delta,
+            holes=base.holes + height_delta - len(state.cells),
+            bumpiness=base.bumpiness + bumpiness_delta,
+            row_transitions=base.row_transitions + row_delta,
+            column_transitions=base.column_transitions + column_delta,
+            wells=base.wells + wells_delta,
+            landing_height=landing_height,
+        )
+
+    def measure_cleared(self, new_rows: dict[int, int]) -> Features:
+        """Return the features of the board once some lines got new occupancy
+        bitmasks and the complete rows were cleared
+        Only the lines of the stack are measured, the others being empty."""
+        board = self.board
+        kept = [
+            mask
+            for mask in (
+                new_rows.get(line, board.rows[line])
+                for line in range(min(board.top, *new_rows), board.lines)
+            )
+            if mask != board.full_row_mask
+        ]
+        features = measure_rows(kept, board.columns)
+        return features._replace(
+            row_transitions=features.row_transitions
+            + (board.lines - len(kept)) * row_transitions(0, board.columns)
+        )
+
+    def line_deltas(self, new_rows: dict[int, int]) -> tuple[int, int]:
+        """Return the changes of the row and column transitions
+        when some lines get new occupancy bitmasks"""
+        board = self.board
+        row_delta = sum(
+            row_transitions(mask, board.columns) - self.row_transitions[line]
+            for line, mask in new_rows.items()
+        )
+        column_delta = sum(
+            line_pair(board.rows, line, board.full_row_mask, new_rows).bit_count()
+            - self.column_transitions[line]
+            for line in set(new_rows) | {line + 1 for line in new_rows}
+        )
+        return row_delta, column_delta
+
+    def column_deltas(self, cells: Iterable[tuple[int, int]]) -> tuple[int, int, int]:
+        """Return the changes of the aggregate height, bumpiness and wells
+        when blocks are added at cells"""
+        lines = self.board.lines
+        heights = list(self.heights)
+        for x, y in cells:
+            heights[x] = max(heights[x], lines - y)
+        changed = [x for x, height in enumerate(heights) if height != self.heights[x]]
+        neighbours = {
+            neighbour
+            for x in changed
+            for neighbour in (x - 1, x, x + 1)
+            if 0 <= neighbour < len(heights)
+        }
+        bumpiness_delta = sum(
+            abs(heights[x] - heights[x + 1]) - self.bumps[x]
+            for x in neighbours
+            if x < len(self.bumps)
+        )
+        wells_delta = sum(well_sum(heights, x) - self.wells[x] for x in neighbours)
+        return sum(heights) - sum(self.heights), bumpiness_delta, wells_delta
@@ -0,0 +1,153 @@
+"""This module contains the load test of the game server
+Bots connect to a server, each creating a session that it plays with random
+inputs until the game is over, while spectators follow some of the sessions.
+The bots are paired on the same seed, like bot-vs-bot matches.
+The load test only connects to the local machine.
+
+Usage:
+    python -m tetrominos.loadtest --sessions 200
+    python -m tetrominos.loadtest --sessions 200 --port 7777
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import socket
+import sys
+import time
+from dataclasses import asdict, dataclass
+from random import Random
+
+from tetrominos.action import Action
+from tetrominos.replay import encode_varint
+from tetrominos.server import GameServer, MessageType, SessionView, encode_message, read_message
+
+__all__ = ["Traffic", "LoadTestResult", "run_load_test"]
+
+BOT_ACTIONS: tuple[Action, ...] = (Action.LEFT, Action.RIGHT, Action.ROTATE, Action.DROP)
+
+
+@dataclass
+class Traffic:
+    """The messages and bytes received by the clients of a load test"""
+
+    messages: int = 0
+    bytes: int = 0
+
+    async def read(self, reader: asyncio.StreamReader) -> tuple[MessageType, bytes] | None:
+        """Read a message and count it"""
+        message = await read_message(reader)
+        if message is not None:
+            self.messages += 1
+            self.bytes += len(message[1]) + 2
+        return message
+
+
+@dataclass(frozen=True)
+class LoadTestResult:
+    """The result of a load test"""
+
+    sessions: int
+    spectators: int
+    ticks: int
+    messages: int
+    bytes: int
+    duration: float
+
+
+def check_localhost(host: str) -> None:
+    """Refuse to run a load test against another machine"""
+    if not ipaddress.ip_address(socket.gethostbyname(host)).is_loopback:
+        raise ValueError(f"The load test only runs against localhost, not {host!r}")
+
+
+async def play_bot(
+    address: tuple[str, int], seed: int, traffic: Traffic, session_ids: asyncio.Queue
+) -> int:
+    """Create a session and play it with random inputs until the game is over
+
+    Returns:
+        The number of ticks of the game
+    """
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(encode_message(MessageType.CREATE, encode_varint(seed) + encode_varint(0)))
+    message = await traffic.read(reader)
+    if message is None or message[0] is not MessageType.WELCOME:
+        raise ValueError("The server did not welcome the bot")
+    view = SessionView(message[1])
+    session_ids.put_nowait(view.session_id)
+    rng = Random(seed)
+    while (message := await traffic.read(reader)) is not None and view.apply_message(message):
+        if rng.random() < 0.2:
+            writer.write(encode_message(MessageType.INPUT, bytes((rng.choice(BOT_ACTIONS).value,))))
+    writer.close()
+    return view.tick
+
+
+async def spectate(address: tuple[str, int], traffic: Traffic, session_ids: asyncio.Queue) -> None:
+    """Follow the session of a bot until its game is over"""
+    session_id = await session_ids.get()
+    reader, writer = await asyncio.open_connection(*address)
+    writer.write(encode_message(MessageType.SPECTATE, encode_varint(session_id)))
+    message = await traffic.read(reader)
+    if message is not None and message[0] is MessageType.WELCOME:
+        view = SessionView(message[1])
+        while (message := await traffic.read(reader)) is not None and view.apply_message(message):
+            pass
+    writer.close()
+
+
+async def run_load_test(
+    sessions: int, spectators: int = 0, host: str = "127.0.0.1", port: int | None = None
+) -> LoadTestResult:
+    """Play sessions on a server of the local machine, started in process
+    when no port is given, and measure the traffic"""
+    check_localhost(host)
+    server = None
+    if port is None:
+        server = await GameServer().serve_tcp(host)
+        port = server.sockets[0].getsockname()[1]
+    traffic = Traffic()
+    session_ids: asyncio.Queue = asyncio.Queue()
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(play_bot((host, port), index // 2, traffic, session_ids) for index in range(sessions)),
+        *(spectate((host, port), traffic, session_ids) for _ in range(min(spectators, sessions))),
+    )
+    duration = time.perf_counter() - start
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    return LoadTestResult(
+        sessions=sessions,
+        spectators=min(spectators, sessions),
+        ticks=sum(results[:sessions]),
+        messages=traffic.messages,
+        bytes=traffic.bytes,
+        duration=duration,
+    )
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the arguments of the load test to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Load test a local game server")
+    parser.add_argument("--sessions", type=int, default=100, help="number of bot sessions")
+    parser.add_argument("--spectators", type=int, default=0, help="number of spectators")
+    parser.add_argument("--host", default="127.0.0.1", help="local address of the server")
+    parser.add_argument("--port", type=int, default=None, help="port, in process if omitted")
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> None:
+    """Run the load test and print its result as JSON"""
+    result = asyncio.run(
+        run_load_test(arguments.sessions, arguments.spectators, arguments.host, arguments.port)
+    )
+    print(json.dumps(asdict(result)), file=sys.stdout)
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
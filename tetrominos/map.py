@@ -1,12 +1,94 @@
 """This modules contains the Map class
+
+A map can be saved as a snapshot: a compact byte buffer made of a fixed header,
+the kinds of the next tetrominos and one palette index per block, line by line.
+The header is SNAPSHOT_HEADER, little endian:
+- the SNAPSHOT_MAGIC bytes and the SNAPSHOT_VERSION
+- the columns and lines of the map
+- the kind index, rotation index and origin of the active tetromino
+- the Zobrist hash of the locked blocks
+- the game over and locking grace period flags
+- the number of next tetrominos
 """
 
+import struct
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping
 from itertools import product
+from typing import NamedTuple
+
+from tetrominos.bitboard import Bitboard
+from tetrominos.block import Block, BlockCollection, ReadOnlyBlockCollection
+from tetrominos.features import BoardFeatures
+from tetrominos.placement import Placement, reachable_placements
+from tetrominos.tetromino import (
+    BOTTOM_PROFILES,
+    TETROMINO_CLASSES,
+    BaseTetromino,
+    PieceState,
+    TetrominoGenerator,
+)
+from tetrominos.zobrist import KIND_INDEXES, piece_key, queue_key, rows_hash
+
+__all__ = ["Map", "LockedBlocks", "SnapshotHeader", "read_snapshot_header"]
+
+SNAPSHOT_MAGIC = b"TTSN"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sBHHBBhhQBB")
+GAME_OVER_FLAG = 1
+LOCKING_GRACE_PERIOD_FLAG = 2
+KINDS: tuple[str, ...] = tuple(TETROMINO_CLASSES)
+
+
+class SnapshotHeader(NamedTuple):
+    """The fields of the header of a map snapshot"""
+
+    magic: bytes
+    version: int
+    columns: int
+    lines: int
+    kind: int
+    rotation_index: int
+    origin_x: int
+    origin_y: int
+    locked_hash: int
+    flags: int
+    preview_size: int
+
+
+def read_snapshot_header(buffer: bytes | bytearray | memoryview) -> SnapshotHeader:
+    """Read and check the header of a map snapshot"""
+    if len(buffer) < SNAPSHOT_HEADER.size:
+        raise ValueError("Truncated map snapshot")
+    header = SnapshotHeader._make(SNAPSHOT_HEADER.unpack_from(buffer))
+    if header.magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a map snapshot")
+    if header.version != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported map snapshot version {header.version}")
+    return header
+
+
+class LockedBlocks(Mapping):
+    """A read-only mapping of the coordinates of the blocks locked in a bitboard
+    to their interned blocks, reading the bitboard on every access instead of
+    copying it, so it reflects the later changes of the board"""
 
-from tetrominos.block import BlockCollection
-from tetrominos.tetromino import BaseTetromino
+    __slots__ = ("board",)
 
-__all__ = ["Map"]
+    def __init__(self, board: Bitboard) -> None:
+        self.board: Bitboard = board
+
+    def __getitem__(self, coordinate: tuple[int, int]) -> Block:
+        color = self.board.get_color(coordinate)
+        if color is None:
+            raise KeyError(coordinate)
+        return Block(color)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return (coordinate for coordinate, _ in self.board.blocks())
+
+    def __len__(self) -> int:
+        return len(self.board)
 
 
 class Map:
@@ -16,58 +98,237 @@ class Map:
     Each block has coordinates expressed as a tuple.
     (0,0) is the block at the top left of the board
     The map is composed of two elements:
-    - a dictionary of locked blocks, each having coordinates
+    - a bitboard storing the locked blocks
     - a moving tetromino object
+    The tetrominos are drawn from a generator seeded with the optional seed.
+
+    The Zobrist hash of the locked blocks and the evaluation features of the
+    board are updated when a tetromino is frozen or rows are deleted,
+    see zobrist_hash and BoardFeatures.
+
+    snapshot() and restore() save and load the whole state of the map as bytes,
+    without copying any object. The random number generator of the generator
+    is not part of a snapshot.
     """
 
-    def __init__(self, columns: int = 10, lines: int = 20) -> None:
-        self.columns: int = columns
-        self.lines: int = lines
-        self.locked_blocks = BlockCollection()
-        self.active_tetromino: BaseTetromino = BaseTetromino.create_random_tetromino()
+    def __init__(self, columns: int = 10, lines: int = 20, seed: int | None = None) -> None:
+        self.board: Bitboard = Bitboard(
+            columns,
+            lines,
+            palette=(tetromino_class.color for tetromino_class in TETROMINO_CLASSES.values()),
+        )
+        self.generator: TetrominoGenerator = TetrominoGenerator(seed)
+        self.active_tetromino: BaseTetromino = self.generator.pop()
         self.locking_grace_period: bool = False
+        self.game_over: bool = False
+        self.locked_hash: int = 0
+        self.features: BoardFeatures = BoardFeatures(self.board)
+
+    @property
+    def columns(self) -> int:
+        """The number of columns of the map"""
+        return self.board.columns
+
+    @property
+    def lines(self) -> int:
+        """The number of lines of the map"""
+        return self.board.lines
+
+    def reset(self, seed: int | None = None) -> None:
+        """Empty the map and start again with a generator seeded with seed"""
+        self.board.clear()
+        self.locked_hash = 0
+        self.features.recompute()
+        self.generator.reset(seed)
+        self.active_tetromino = self.generator.pop()
+        self.locking_grace_period = False
+        self.game_over = False
+
+    @property
+    def zobrist_hash(self) -> int:
+        """The 64-bit Zobrist hash of the locked blocks, the state of the
+        active tetromino and the kinds of the next tetrominos"""
+        return (
+            self.locked_hash
+            ^ piece_key(self.active_tetromino.state)
+            ^ queue_key(self.generator.preview)
+        )
 
     @property
     def active_blocks(self) -> BlockCollection:
         """Return the collection of blocks composing the active tetromino"""
         return self.active_tetromino.get_blocks()
 
+    @property
+    def locked_blocks(self) -> BlockCollection:
+        """Return a read-only view of the locked blocks, see LockedBlocks
+        The locked blocks are stored in the bitboard, so the view can not be
+        modified: the blocks are changed by assigning a collection to locked_blocks.
+        Getting the view does not copy the board."""
+        return ReadOnlyBlockCollection(LockedBlocks(self.board))
+
+    @locked_blocks.setter
+    def locked_blocks(self, blocks: BlockCollection) -> None:
+        self.board.clear()
+        for coordinate, block in blocks.collection.items():
+            self.board.add(coordinate, block.color)
+        self.locked_hash = rows_hash(self.board.rows, range(self.lines))
+        self.features.recompute()
+
     @property
     def all_blocks(self) -> BlockCollection:
         """Return the collection of all the blocks locked or active"""
         return self.active_blocks | self.locked_blocks
 
+    def reachable_placements(self) -> list[Placement]:
+        """Return every final resting placement the active tetromino can reach
+        from its current state, with the path of actions leading to it"""
+        return reachable_placements(
+            self.board.rows, self.board.columns, self.active_tetromino.state
+        )
+
+    @property
+    def snapshot_size(self) -> int:
+        """The size in bytes of a snapshot of the map"""
+        return SNAPSHOT_HEADER.size + len(self.generator.queue) + self.columns * self.lines
+
+    def snapshot(self) -> bytes:
+        """Return a snapshot of the map, see the module documentation for the layout"""
+        buffer = bytearray(self.snapshot_size)
+        self.snapshot_into(buffer)
+        return bytes(buffer)
+
+    def snapshot_into(self, buffer: bytearray | memoryview, offset: int = 0) -> int:
+        """Write a snapshot of the map into a writable buffer at an offset,
+        like a shared memory block, and return the number of bytes written"""
+        view = memoryview(buffer)
+        state = self.active_tetromino.state
+        preview = bytes(KIND_INDEXES[kind] for kind in self.generator.preview)
+        flags = GAME_OVER_FLAG * self.game_over | LOCKING_GRACE_PERIOD_FLAG * (
+            self.locking_grace_period
+        )
+        SNAPSHOT_HEADER.pack_into(
+            view,
+            offset,
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            self.columns,
+            self.lines,
+            KIND_INDEXES[state.kind],
+            state.rotation_index,
+            *state.origin,
+            self.locked_hash,
+            flags,
+            len(preview),
+        )
+        position = offset + SNAPSHOT_HEADER.size
+        view[position : position + len(preview)] = preview
+        position += len(preview)
+        for colors in self.board.colors:
+            view[position : position + self.columns] = colors
+            position += self.columns
+        return position - offset
+
+    def restore(self, buffer: bytes | bytearray | memoryview) -> None:
+        """Restore the state of the map from a snapshot of a map of the same size"""
+        view = memoryview(buffer)
+        header = read_snapshot_header(view)
+        if (header.columns, header.lines) != (self.columns, self.lines):
+            raise ValueError(f"The snapshot is for a map of {header.columns}x{header.lines} blocks")
+        preview_end = SNAPSHOT_HEADER.size + header.preview_size
+        self.board.load_bytes(view[preview_end:])
+        self.locked_hash = header.locked_hash
+        self.features.recompute()
+        self.active_tetromino = TETROMINO_CLASSES[KINDS[header.kind]](
+            header.rotation_index, (header.origin_x, header.origin_y)
+        )
+        self.generator.queue = deque(
+            TETROMINO_CLASSES[KINDS[kind]]() for kind in view[SNAPSHOT_HEADER.size : preview_end]
+        )
+        self.game_over = bool(header.flags & GAME_OVER_FLAG)
+        self.locking_grace_period = bool(header.flags & LOCKING_GRACE_PERIOD_FLAG)
+
+    @classmethod
+    def from_snapshot(cls, buffer: bytes | bytearray | memoryview) -> "Map":
+        """Return a new map restored from a snapshot"""
+        header = read_snapshot_header(buffer)
+        game_map = cls(header.columns, header.lines)
+        game_map.restore(buffer)
+        return game_map
+
+    def drop_distance(self, state: PieceState | None = None) -> int:
+        """Return the number of lines a tetromino state, the active one by default,
+        can move down before resting
+
+        The distance comes from the skyline of the board and the bottom profile
+        of the tetromino, unless the tetromino is below the skyline of one of
+        its columns, like under an overhang, where the lines are scanned.
+        """
+        state = self.active_tetromino.state if state is None else state
+        origin_x, origin_y = state.origin
+        skyline = self.board.skyline
+        distance = self.lines
+        for offset_x, offset_y in BOTTOM_PROFILES[state.kind][state.rotation_index]:
+            gap = skyline[origin_x + offset_x] - origin_y - offset_y - 1
+            if gap < 0:
+                return self.board.scan_drop_distance(state.cells)
+            distance = min(distance, gap)
+        return distance
+
+    @property
+    def ghost_state(self) -> PieceState:
+        """The state where the active tetromino would rest if dropped"""
+        state = self.active_tetromino.state
+        return state.translated((0, self.drop_distance(state)))
+
     def all_possible_coordinates(self) -> list[tuple[int, int]]:
         """Return the list of all valid coordinates considering the size of the map"""
         return list(product(range(self.columns), range(self.lines)))
 
-    def freeze_tetromino(self) -> None:
+    def freeze_tetromino(self) -> list[int]:
         """Incorporate a tetromino to
-        the locked blocks and make a new tetromino must appear
+        the locked blocks, delete the complete rows and make a new tetromino must appear
+        The game is over when a block is locked above the board or when
+        the new tetromino overlaps the locked blocks left once the rows are deleted.
+
+        Returns:
+            The list of the numbers of the rows deleted
         """
-        self.locked_blocks = self.all_blocks
-        self.active_tetromino = BaseTetromino.create_random_tetromino()
+        color = self.active_tetromino.color
+        cells = self.active_tetromino.state.cells
+        touched_lines = {line for _, line in cells if 0 <= line < self.lines}
+        self.locked_hash ^= rows_hash(self.board.rows, touched_lines)
+        for coordinate in cells:
+            if coordinate[1] < 0:
+                self.game_over = True
+            self.board.add(coordinate, color)
+        self.locked_hash ^= rows_hash(self.board.rows, touched_lines)
+        self.features.add_cells(cells)
+        rows_popped = self.pop_complete_rows(touched_lines)
+        self.active_tetromino = self.generator.pop()
+        for coordinate in self.active_tetromino.state.cells:
+            if self.board.is_occupied(coordinate):
+                self.game_over = True
+        return rows_popped
 
     def is_row_complete(self, row: int) -> bool:
-        """return True if a row is complete"""
-        row_size = self.columns
-        row_counter = 0
-        for coordinate in self.locked_blocks.collection.keys():
-            if coordinate[1] == row:
-                row_counter += 1
-        return row_size == row_counter
-
-    def list_complete_rows(self) -> list[int]:
-        """List all complete rows and return a list containing their number"""
-        row_list = []
-        for row_number in range(0, self.lines):
-            if self.is_row_complete(row_number):
-                row_list.append(row_number)
-        return row_list
-
-    def pop_complete_rows(self) -> None:
-        """ "Delete complete rows"""
-        rows_to_pop = self.list_complete_rows()
-
-        for row_number in rows_to_pop:
-            self.locked_blocks.delete_row(row_number)
+        """return True if a row is complete, False for the rows outside of the board"""
+        return 0 <= row < self.lines and self.board.is_row_complete(row)
+
+    def list_complete_rows(self, lines: Iterable[int] | None = None) -> list[int]:
+        """List the complete rows among some lines, all the lines by default,
+        and return a list containing their number"""
+        return self.board.complete_rows(lines)
+
+    def pop_complete_rows(self, lines: Iterable[int] | None = None) -> list[int]:
+        """Delete the complete rows among some lines, all the lines by default,
+        like the lines where a tetromino was locked, and return the list of their number"""
+        rows_to_pop = self.list_complete_rows(lines)
+        if rows_to_pop:
+            # only the non-empty lines above the deleted rows move
+            moved_lines = range(self.board.top, max(rows_to_pop) + 1)
+            self.locked_hash ^= rows_hash(self.board.rows, moved_lines)
+            self.board.clear_rows(rows_to_pop)
+            self.locked_hash ^= rows_hash(self.board.rows, moved_lines)
+            self.features.clear_rows(len(rows_to_pop), moved_lines)
+        return rows_to_pop
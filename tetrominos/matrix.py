@@ -1,27 +1,75 @@
 """In this module, you will find the Matrix class.
 """
 
+from __future__ import annotations
+
 import pygame
 
-from tetrominos.block import BlockCollection
 from tetrominos.map import Map
+from tetrominos.counters import COUNTING, OPERATION_COUNTS
+from tetrominos.surfarray_renderer import SurfarrayRenderer
 
 
 __all__ = ["Matrix"]
 
+GHOST_COLOR = (192, 192, 192)
+# The palette index of the ghost, which the palette of the bitboard never uses
+GHOST_INDEX = 255
+# The number of lines kept visible below and above the active tetromino when scrolling
+SCROLL_MARGIN = 4
+
 
 class Matrix:
     """The game matrix is the graphical representation of
     the game board.
+
+    The ghost of the active tetromino, where it would rest if dropped,
+    is drawn in GHOST_COLOR under the active tetromino. The ghost is never
+    locked, so its color is kept out of the palette of the bitboard.
+
+    The matrix remembers the colors it drew on the surface, as one row of
+    palette indexes per line, so a frame only redraws the blocks that changed
+    since the previous one. The rects of the blocks are computed once.
+
+    A board taller than the surface is shown through a viewport of the lines
+    fitting on the surface, from first_line, which scrolls to follow the
+    active tetromino. Only the lines of the viewport are ever drawn, so the
+    cost of a frame does not depend on the size of the board.
+
+    Two rendering backends are available:
+    - "rect" draws every changed block with its own pygame.draw.rect call
+    - "surfarray" redraws the whole matrix with a single blit when a block
+    changed, which is faster for large boards
     """
 
+    default_color: tuple[int, int, int] = (255, 255, 255)
+
     def __init__(
-        self, surface: pygame.Surface, block_size_in_pixels: int, game_map: Map
+        self,
+        surface: pygame.Surface,
+        block_size_in_pixels: int,
+        game_map: Map,
+        backend: str = "rect",
     ) -> None:
+        if backend not in ("rect", "surfarray"):
+            raise ValueError(f"Unknown rendering backend {backend!r}")
         self.surface: pygame.Surface = surface
         self.block_size_in_pixels: int = block_size_in_pixels
         self.map: Map = game_map
-        self.default_color = (255, 255, 255)
+        self.first_line: int = 0
+        self.block_rects: list[list[pygame.Rect]] = []
+        self.drawn_rows: list[bytes] | None = None
+        self.renderer: SurfarrayRenderer | None = None
+        if backend == "surfarray":
+            self.renderer = SurfarrayRenderer(
+                game_map.columns, self.visible_lines, block_size_in_pixels, pygame.Color("grey")[:3]
+            )
+
+    @property
+    def visible_lines(self) -> int:
+        """The number of lines of the viewport, all the lines fitting on the surface"""
+        fitting_lines = (self.surface.get_height() - 1) // self.block_size_in_pixels
+        return max(1, min(self.map.lines, fitting_lines))
 
     @property
     def width_in_pixels(self) -> int:
@@ -39,7 +87,7 @@ class Matrix:
         Returns:
             The matrix height in pixels
         """
-        return self.map.lines * self.block_size_in_pixels
+        return self.visible_lines * self.block_size_in_pixels
 
     @property
     def origin(self) -> tuple[int, int]:
@@ -53,29 +101,131 @@ class Matrix:
         top = int((self.surface.get_height() - self.height_in_pixels) / 2)
         return (left, top)
 
-    def render_matrix(self) -> None:
-        """This method renders the game matrix"""
+    def invalidate(self) -> None:
+        """Forget what was drawn, the next frame redraws the whole matrix"""
+        self.block_rects = []
+        self.drawn_rows = None
+
+    def scroll_to(self, line: int) -> None:
+        """Scroll the viewport so that it starts at a line, within the board"""
+        self.first_line = max(0, min(line, self.map.lines - self.visible_lines))
+
+    def follow_active_tetromino(self) -> None:
+        """Scroll the viewport when the active tetromino gets closer than
+        SCROLL_MARGIN lines to its top or bottom edge"""
+        lines = [line for _, line in self.map.active_tetromino.state.cells]
+        margin = min(SCROLL_MARGIN, (self.visible_lines - 1) // 2)
+        if min(lines) - margin < self.first_line:
+            self.scroll_to(min(lines) - margin)
+        elif max(lines) + margin >= self.first_line + self.visible_lines:
+            self.scroll_to(max(lines) + margin - self.visible_lines + 1)
+
+    def render_matrix(self) -> list[pygame.Rect]:
+        """This method renders the blocks of the viewport that changed
+        since the previous frame, scrolling it first to follow the active tetromino
 
-        blocks: BlockCollection = self.map.all_blocks
+        Returns:
+            The list of the areas of the surface that were redrawn
+        """
+        self.follow_active_tetromino()
+        rows = self.current_rows()
+        if self.renderer is not None:
+            return self.render_image(rows)
+        if self.drawn_rows is None or len(self.drawn_rows) != len(rows):
+            return self.render_all(rows)
+
+        palette = self.palette
+        dirty_rects: list[pygame.Rect] = []
+        for line, (row, drawn_row) in enumerate(zip(rows, self.drawn_rows)):
+            if row == drawn_row:
+                continue
+            for column, color_index in enumerate(row):
+                if color_index != drawn_row[column]:
+                    block_rect = self.block_rects[line][column]
+                    pygame.draw.rect(
+                        surface=self.surface, color=palette[color_index], rect=block_rect
+                    )
+                    dirty_rects.append(block_rect)
+            self.drawn_rows[line] = bytes(row)
+        if COUNTING.enabled:
+            OPERATION_COUNTS["draw_calls"] += len(dirty_rects)
+        return dirty_rects
+
+    def render_all(self, rows: list[bytes | bytearray]) -> list[pygame.Rect]:
+        """Render every block of the viewport
 
-        for coordinate in self.map.all_possible_coordinates():
+        Returns:
+            A list containing the area of the whole matrix
+        """
+        self.block_rects = [
+            [self.block_rect((column, line)) for column in range(self.map.columns)]
+            for line in range(self.first_line, self.first_line + len(rows))
+        ]
+        palette = self.palette
+        for line, row in enumerate(rows):
+            for column, color_index in enumerate(row):
+                pygame.draw.rect(
+                    surface=self.surface,
+                    color=palette[color_index],
+                    rect=self.block_rects[line][column],
+                )
+        self.drawn_rows = [bytes(row) for row in rows]
+        if COUNTING.enabled:
+            OPERATION_COUNTS["draw_calls"] += self.map.columns * len(rows)
+        left, top = self.origin
+        return [pygame.Rect(left, top, self.width_in_pixels + 1, self.height_in_pixels + 1)]
+
+    def render_image(self, rows: list[bytes | bytearray]) -> list[pygame.Rect]:
+        """Render the whole game matrix with the surfarray backend
+        if any block changed since the previous frame
 
-            block_rect: pygame.Rect = self.block_rect(coordinate)
-            color: tuple[int, int, int]
-            if coordinate in blocks.collection:
-                color = blocks.collection[coordinate].color
-            else:
-                color = self.default_color
+        Returns:
+            The list of the areas of the surface that were redrawn
+        """
+        if self.drawn_rows == rows:
+            return []
+        dirty_rect = self.renderer.render(self.surface, self.origin, rows, self.palette)
+        if COUNTING.enabled:
+            OPERATION_COUNTS["draw_calls"] += 1
+        self.drawn_rows = [bytes(row) for row in rows]
+        return [dirty_rect]
 
-            pygame.draw.rect(surface=self.surface, color=color, rect=block_rect)
+    @property
+    def palette(self) -> list[tuple[int, int, int]]:
+        """The colors of the 256 palette indexes: the empty blocks in the
+        default color, the colors of the bitboard and the ghost"""
+        board_palette = self.map.board.palette
+        padding = [self.default_color] * (GHOST_INDEX - len(board_palette))
+        return [self.default_color, *board_palette[1:], *padding, GHOST_COLOR]
+
+    def current_rows(self) -> list[bytes | bytearray]:
+        """Return the palette indexes of the blocks to draw, line by line from
+        the top of the viewport: the locked blocks with the ghost and the active
+        tetromino on top of them"""
+        board = self.map.board
+        first_line = self.first_line
+        rows = board.colors[first_line : first_line + self.visible_lines]
+        tetromino = self.map.active_tetromino
+        for state, color_index in (
+            (self.map.ghost_state, GHOST_INDEX),
+            (tetromino.state, board.color_index(tetromino.color)),
+        ):
+            for column, line in state.cells:
+                line -= first_line
+                if 0 <= line < len(rows) and 0 <= column < self.map.columns:
+                    if rows[line] is board.colors[first_line + line]:
+                        rows[line] = bytearray(rows[line])
+                    rows[line][column] = color_index
+        return rows
 
     def block_rect(self, coordinates: tuple[int, int]) -> pygame.Rect:
-        """Return the block as a Pygame Rect Object"""
+        """Return the block as a Pygame Rect Object, at its place in the viewport"""
         column = coordinates[0]
-        line = coordinates[1]
+        line = coordinates[1] - self.first_line
 
-        left = self.origin[0] + (self.block_size_in_pixels * column) + 1
-        top = self.origin[1] + (self.block_size_in_pixels * line) + 1
+        left, top = self.origin
+        left += (self.block_size_in_pixels * column) + 1
+        top += (self.block_size_in_pixels * line) + 1
         return pygame.Rect(
             left, top, self.block_size_in_pixels - 1, self.block_size_in_pixels - 1
         )
@@ -1,13 +1,11 @@
 """This module contains the code related to movement"""
 
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from enum import Enum
 
-from tetrominos.block import BlockCollection
-from tetrominos.coordinates import coordinates_addition
 from tetrominos.map import Map
-from tetrominos.tetromino import BaseTetromino
+from tetrominos.counters import COUNTING, OPERATION_COUNTS
+from tetrominos.tetromino import BaseTetromino, PieceState
 
 __all__ = ["TranslationDirection", "BaseMovement", "Translation", "Rotation"]
 
@@ -21,11 +19,22 @@ class TranslationDirection(Enum):
 
 
 class BaseMovement(ABC):
-    """The common base of movement and rotation"""
+    """The common base of movement and rotation
+
+    A movement simulates the state reached by the active tetromino and
+    validates it against the map without copying the tetromino.
+    """
 
     def __init__(self, game_map: Map) -> None:
         self.game_map: Map = game_map
-        self.simulated_tetromino: BaseTetromino = self.simulate_tetromino()
+        self.simulated_state: PieceState = self.simulate_state()
+        if COUNTING.enabled:
+            OPERATION_COUNTS["movements"] += 1
+
+    @property
+    def simulated_tetromino(self) -> BaseTetromino:
+        """Return the tetromino in its simulated state"""
+        return BaseTetromino.from_state(self.simulated_state)
 
     def execute(self) -> None:
         """Execute a movement"""
@@ -40,26 +49,24 @@ class BaseMovement(ABC):
 
     def is_inbound(self) -> bool:
         """Check if all the blocks of a tetromino are inside the game board"""
-        blocks: BlockCollection = self.simulated_tetromino.get_blocks()
-        possible_coordinates = self.game_map.all_possible_coordinates()
+        columns, lines = self.game_map.columns, self.game_map.lines
 
-        for coordinates in blocks.collection:
-            if coordinates not in possible_coordinates:
+        for x, y in self.simulated_state.cells:
+            if not (0 <= x < columns and 0 <= y < lines):
                 return False
         return True
 
     def is_overlapping(self) -> bool:
         """Checks if a tetromino is overlapping the already locked tetrominos"""
-        tetromino_blocks: BlockCollection = self.simulated_tetromino.get_blocks()
-        locked_blocks: BlockCollection = self.game_map.locked_blocks
+        board = self.game_map.board
 
-        for coordinates in tetromino_blocks.collection:
-            if coordinates in locked_blocks.collection:
+        for coordinates in self.simulated_state.cells:
+            if board.is_occupied(coordinates):
                 return True
         return False
 
     @abstractmethod
-    def simulate_tetromino(self):
+    def simulate_state(self) -> PieceState:
         """template for child classes"""
 
 
@@ -74,14 +81,9 @@ class Translation(BaseMovement):
         self.direction = direction.value
         super().__init__(game_map=game_map)
 
-    def simulate_tetromino(self) -> BaseTetromino:
-        """Simulate a movement and return a BaseTetromino"""
-        simulated_tetromino = deepcopy(self.game_map.active_tetromino)
-        simulated_origin = coordinates_addition(
-            simulated_tetromino.rotation_space_origin, self.direction
-        )
-        simulated_tetromino.rotation_space_origin = simulated_origin
-        return simulated_tetromino
+    def simulate_state(self) -> PieceState:
+        """Simulate a movement and return the state reached by the tetromino"""
+        return self.game_map.active_tetromino.state.translated(self.direction)
 
 
 class Rotation(BaseMovement):
@@ -92,16 +94,8 @@ class Rotation(BaseMovement):
 
     def next_rotation_cycle_index(self, tetromino: BaseTetromino):
         """Return the index of the next rotation cycle"""
-        current_cycle = tetromino.rotation_cycle_index
-        rotation_cycle_lenght = len(tetromino.rotation_template)
-        if current_cycle + 1 < rotation_cycle_lenght:
-            return current_cycle + 1
-        return 0
-
-    def simulate_tetromino(self) -> BaseTetromino:
-        """Simulate a movement and return a BaseTetromino"""
-        simulated_tetromino = deepcopy(self.game_map.active_tetromino)
-        simulated_tetromino.rotation_cycle_index = self.next_rotation_cycle_index(
-            simulated_tetromino
-        )
-        return simulated_tetromino
+        return tetromino.state.rotated().rotation_index
+
+    def simulate_state(self) -> PieceState:
+        """Simulate a movement and return the state reached by the tetromino"""
+        return self.game_map.active_tetromino.state.rotated()
@@ -0,0 +1,84 @@
+"""This module contains the PerformanceOverlay class
+The overlay prints the p50, p95 and p99 of the phases and operation counts
+measured by a FrameProfiler on top of the window.
+"""
+
+from __future__ import annotations
+
+import pygame
+
+from tetrominos.profiler import OPERATION_COUNTS, FrameProfiler
+
+__all__ = ["PerformanceOverlay"]
+
+
+class PerformanceOverlay:
+    """The performance overlay is hidden until toggled.
+    The text is only rendered again every refresh_frames frames,
+    as rendering text costs more than the rest of a frame.
+
+    The profiler records the frames while the overlay is visible
+    or while it exports them, and the input latency all the time.
+    """
+
+    def __init__(
+        self,
+        profiler: FrameProfiler,
+        origin: tuple[int, int] = (10, 10),
+        refresh_frames: int = 30,
+    ) -> None:
+        self.profiler: FrameProfiler = profiler
+        self.origin: tuple[int, int] = origin
+        self.refresh_frames: int = refresh_frames
+        self.frames_until_refresh: int = 0
+        self.visible: bool = False
+        self.font: pygame.font.Font = pygame.font.SysFont("monospace", 14)
+        self.drawn_rect: pygame.Rect | None = None
+
+    def toggle(self) -> None:
+        """Show or hide the overlay"""
+        self.visible = not self.visible
+        self.frames_until_refresh = 0
+        self.profiler.enabled = self.visible or self.profiler.export is not None
+
+    def text_lines(self) -> list[str]:
+        """Return the lines of text of the overlay"""
+        lines = [f"{'':14}{'p50':>9}{'p95':>9}{'p99':>9}"]
+        for phase, percentiles in self.profiler.summary().items():
+            if phase in OPERATION_COUNTS:
+                values = "".join(f"{value:9d}" for value in percentiles)
+            else:
+                values = "".join(f"{value / 1e6:7.2f}ms" for value in percentiles)
+            lines.append(f"{phase:14}{values}")
+        return lines
+
+    def render(self, surface: pygame.Surface, background: pygame.Color) -> list[pygame.Rect]:
+        """Draw the overlay on a surface, erasing it with background once hidden
+
+        Returns:
+            The list of the areas of the surface that were redrawn
+        """
+        if not self.visible:
+            if self.drawn_rect is None:
+                return []
+            erased_rect, self.drawn_rect = self.drawn_rect, None
+            surface.fill(background, erased_rect)
+            return [erased_rect]
+        self.frames_until_refresh -= 1
+        if self.frames_until_refresh > 0:
+            return []
+        self.frames_until_refresh = self.refresh_frames
+
+        dirty_rects = []
+        if self.drawn_rect is not None:
+            surface.fill(background, self.drawn_rect)
+            dirty_rects.append(self.drawn_rect)
+        left, top = self.origin
+        line_rects = []
+        for line in self.text_lines():
+            text = self.font.render(line, True, (0, 0, 0))
+            line_rects.append(surface.blit(text, (left, top)))
+            top += self.font.get_linesize()
+        self.drawn_rect = line_rects[0].unionall(line_rects[1:])
+        dirty_rects.append(self.drawn_rect)
+        return dirty_rects
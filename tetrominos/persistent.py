@@ -0,0 +1,323 @@
+"""This module contains the persistent map and the undo history
+A PersistentMap is an immutable version of the state of a map. Its board
+stores the lines in chunks of CHUNK_LINES lines, and a new version only copies
+the chunks of the lines it changes, sharing all the others with the version it
+was made from. Every version stays valid, so a search can branch any number
+of hypothetical futures from a position, and an app can keep all the versions
+of a game to undo and redo moves.
+
+A version is made either from a mutable Map, sharing the unchanged chunks of
+a previous version, or from another version by moving or freezing its
+tetromino. When the map only differs from the previous version by a tetromino
+locked, only the chunks of the lines the lock may have changed are compared.
+A version is turned back into a Map through a snapshot, see Map.snapshot.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any, Generic, NamedTuple, TypeVar
+
+from tetrominos.bitboard import Bitboard, empty_line
+from tetrominos.map import GAME_OVER_FLAG, SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, Map
+from tetrominos.tetromino import TETROMINO_CLASSES, PieceState
+from tetrominos.zobrist import KIND_INDEXES, row_key
+
+__all__ = ["CHUNK_LINES", "PersistentBoard", "PersistentMap", "History"]
+
+CHUNK_BITS = 3
+CHUNK_LINES = 1 << CHUNK_BITS
+# The versions kept by a History, like PersistentMap
+Version = TypeVar("Version")
+
+
+class PersistentBoard(NamedTuple):
+    """The immutable locked blocks of a persistent map
+
+    - rows[chunk][index] is the occupancy bitmask of the line
+    chunk * CHUNK_LINES + index, see Bitboard
+    - colors[chunk][index] are the palette indexes of the blocks of that line
+    The palette is the one of the bitboard of a Map.
+    """
+
+    columns: int
+    lines: int
+    rows: tuple[tuple[int, ...], ...]
+    colors: tuple[tuple[bytes, ...], ...]
+
+    @classmethod
+    def empty(cls, columns: int, lines: int) -> PersistentBoard:
+        """Return an empty board, all its chunks sharing the same empty lines"""
+        return cls.from_bitboard(Bitboard(columns, lines))
+
+    @classmethod
+    def from_bitboard(
+        cls,
+        board: Bitboard,
+        base: PersistentBoard | None = None,
+        lines: Iterable[int] | None = None,
+    ) -> PersistentBoard:
+        """Return the blocks of a bitboard, reusing the chunks of a base board
+        of the same size that did not change. When the lines which may differ
+        from the base are given, only their chunks are compared."""
+        chunk_count = (board.lines + CHUNK_LINES - 1) >> CHUNK_BITS
+        chunks: Iterable[int] = range(chunk_count)
+        if base is None:
+            rows: list[tuple[int, ...]] = [()] * chunk_count
+            colors: list[tuple[bytes, ...]] = [()] * chunk_count
+        else:
+            rows, colors = list(base.rows), list(base.colors)
+            if lines is not None:
+                chunks = sorted({line >> CHUNK_BITS for line in lines})
+        for chunk in chunks:
+            start = chunk << CHUNK_BITS
+            chunk_rows = tuple(board.rows[start : start + CHUNK_LINES])
+            chunk_colors = board.colors[start : start + CHUNK_LINES]
+            if rows[chunk] != chunk_rows or colors[chunk] != tuple(chunk_colors):
+                rows[chunk] = chunk_rows
+                colors[chunk] = tuple(bytes(line_colors) for line_colors in chunk_colors)
+        return cls(board.columns, board.lines, tuple(rows), tuple(colors))
+
+    def row(self, line: int) -> int:
+        """Return the occupancy bitmask of a line"""
+        return self.rows[line >> CHUNK_BITS][line & (CHUNK_LINES - 1)]
+
+    def line_colors(self, line: int) -> bytes:
+        """Return the palette indexes of the blocks of a line"""
+        return self.colors[line >> CHUNK_BITS][line & (CHUNK_LINES - 1)]
+
+    def top(self) -> int:
+        """Return the line of the highest block, lines if the board is empty"""
+        for chunk, masks in enumerate(self.rows):
+            if any(masks):
+                first = next(index for index, mask in enumerate(masks) if mask)
+                return (chunk << CHUNK_BITS) + first
+        return self.lines
+
+    def lines_hash(self, lines: Iterable[int]) -> int:
+        """Return the XOR of the Zobrist keys of the non-empty lines among some lines"""
+        result = 0
+        for line in lines:
+            if mask := self.row(line):
+                result ^= row_key(line, mask)
+        return result
+
+    def row_list(self) -> list[int]:
+        """Return the occupancy bitmasks of all the lines, like Bitboard.rows"""
+        return [mask for chunk in self.rows for mask in chunk]
+
+    def is_occupied(self, coordinate: tuple[int, int]) -> bool:
+        """Return True if a block is locked at a coordinate inside the board"""
+        x, y = coordinate
+        return 0 <= y < self.lines and 0 <= x and bool(self.row(y) >> x & 1)
+
+    def with_lines(self, changes: dict[int, tuple[int, bytes]]) -> PersistentBoard:
+        """Return the board where some lines are replaced by (bitmask, colors),
+        copying only the chunks of these lines"""
+        rows, colors = list(self.rows), list(self.colors)
+        changed_chunks: dict[int, tuple[list[int], list[bytes]]] = {}
+        for line, (mask, line_colors) in changes.items():
+            chunk = line >> CHUNK_BITS
+            if chunk not in changed_chunks:
+                changed_chunks[chunk] = (list(rows[chunk]), list(colors[chunk]))
+            chunk_rows, chunk_colors = changed_chunks[chunk]
+            chunk_rows[line & (CHUNK_LINES - 1)] = mask
+            chunk_colors[line & (CHUNK_LINES - 1)] = line_colors
+        for chunk, (chunk_rows, chunk_colors) in changed_chunks.items():
+            rows[chunk] = tuple(chunk_rows)
+            colors[chunk] = tuple(chunk_colors)
+        return PersistentBoard(self.columns, self.lines, tuple(rows), tuple(colors))
+
+    def with_blocks(self, cells: Iterable[tuple[int, int]], color_index: int) -> PersistentBoard:
+        """Return the board with blocks of a palette index added at cells,
+        the cells outside of the board being ignored"""
+        changes: dict[int, tuple[int, bytearray]] = {}
+        for x, y in cells:
+            if 0 <= x < self.columns and 0 <= y < self.lines:
+                if y not in changes:
+                    changes[y] = (self.row(y), bytearray(self.line_colors(y)))
+                mask, line_colors = changes[y]
+                line_colors[x] = color_index
+                changes[y] = (mask | 1 << x, line_colors)
+        return self.with_lines(
+            {line: (mask, bytes(line_colors)) for line, (mask, line_colors) in changes.items()}
+        )
+
+    def complete_rows(self, lines: Iterable[int]) -> list[int]:
+        """List the complete rows among some lines"""
+        full_row_mask = (1 << self.columns) - 1
+        return sorted(line for line in set(lines) if self.row(line) == full_row_mask)
+
+    def without_rows(self, rows_to_clear: Iterable[int]) -> PersistentBoard:
+        """Return the board where some complete rows are deleted, the rows above
+        falling down. Only the chunks from the top of the stack to the lowest
+        deleted row are copied."""
+        cleared = set(rows_to_clear)
+        if not cleared:
+            return self
+        top, lowest = self.top(), max(cleared)
+        kept = [line for line in range(top, lowest + 1) if line not in cleared]
+        empty = (0, empty_line(self.columns))
+        moved = [empty] * len(cleared) + [(self.row(line), self.line_colors(line)) for line in kept]
+        return self.with_lines(dict(enumerate(moved, start=top)))
+
+    def to_bytes(self) -> bytes:
+        """Return the palette indexes of all the blocks, like Bitboard.to_bytes"""
+        return b"".join(line_colors for chunk in self.colors for line_colors in chunk)
+
+
+class PersistentMap(NamedTuple):
+    """An immutable version of the state of a map
+
+    rng_state is the state of the random number generator of the tetromino
+    generator, set for the versions made from a Map so restoring them draws
+    the same tetrominos again, and kept by the versions moved or frozen from
+    them. lines_cleared counts the rows deleted by the freeze that made the version.
+    """
+
+    board: PersistentBoard
+    state: PieceState
+    preview: tuple[str, ...]
+    game_over: bool = False
+    locked_hash: int = 0
+    lines_cleared: int = 0
+    rng_state: Any = None
+
+    @classmethod
+    def from_map(
+        cls,
+        game_map: Map,
+        base: PersistentMap | None = None,
+        locked: PieceState | None = None,
+    ) -> PersistentMap:
+        """Return the version of the current state of a map, sharing the
+        unchanged chunks of a base version of a map of the same size
+
+        When the map only differs from the base by the tetromino locked in
+        the state locked, only the lines from the top of the stack to its
+        lowest block are compared, as the rows deleted are among its lines.
+        """
+        lines = None
+        if base is not None and locked is not None:
+            locked_lines = [line for _, line in locked.cells]
+            top = max(0, min(base.board.top(), *locked_lines))
+            lines = range(top, min(game_map.lines, max(locked_lines) + 1))
+        return cls(
+            board=PersistentBoard.from_bitboard(
+                game_map.board, None if base is None else base.board, lines
+            ),
+            state=game_map.active_tetromino.state,
+            preview=game_map.generator.preview,
+            game_over=game_map.game_over,
+            locked_hash=game_map.locked_hash,
+            rng_state=game_map.generator.rng.getstate(),
+        )
+
+    def snapshot(self) -> bytes:
+        """Return the snapshot of the version, see Map.snapshot"""
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            self.board.columns,
+            self.board.lines,
+            KIND_INDEXES[self.state.kind],
+            self.state.rotation_index,
+            *self.state.origin,
+            self.locked_hash,
+            GAME_OVER_FLAG * self.game_over,
+            len(self.preview),
+        )
+        preview = bytes(KIND_INDEXES[kind] for kind in self.preview)
+        return header + preview + self.board.to_bytes()
+
+    def restore_into(self, game_map: Map) -> None:
+        """Restore the state of a map of the same size to this version"""
+        game_map.restore(self.snapshot())
+        if self.rng_state is not None:
+            game_map.generator.rng.setstate(self.rng_state)
+
+    def moved(self, state: PieceState) -> PersistentMap:
+        """Return the version where the active tetromino is in another state"""
+        return PersistentMap(
+            self.board, state, self.preview, self.game_over, self.locked_hash, 0, self.rng_state
+        )
+
+    def freeze(self, next_kind: str | None = None) -> PersistentMap:
+        """Return the version where the active tetromino is locked, the
+        complete rows deleted and the next tetromino of the preview active,
+        next_kind being added to the preview if given
+
+        The game is over when a block is locked above the board or when
+        the new tetromino overlaps the locked blocks left once the rows are
+        deleted, like with Map.freeze_tetromino.
+
+        Raises:
+            ValueError: if the preview is empty and next_kind is not given
+        """
+        queue = self.preview + ((next_kind,) if next_kind is not None else ())
+        if not queue:
+            raise ValueError("No next tetromino: the preview is empty and no next kind was given")
+        board = self.board
+        cells = self.state.cells
+        touched_lines = {line for _, line in cells if 0 <= line < board.lines}
+        game_over = self.game_over or any(line < 0 for _, line in cells)
+        locked_hash = self.locked_hash ^ board.lines_hash(touched_lines)
+        board = board.with_blocks(cells, KIND_INDEXES[self.state.kind] + 1)
+        locked_hash ^= board.lines_hash(touched_lines)
+        cleared = board.complete_rows(touched_lines)
+        if cleared:
+            # only the non-empty lines above the deleted rows move
+            moved_lines = range(board.top(), max(cleared) + 1)
+            locked_hash ^= board.lines_hash(moved_lines)
+            board = board.without_rows(cleared)
+            locked_hash ^= board.lines_hash(moved_lines)
+        state = TETROMINO_CLASSES[queue[0]]().state
+        game_over = game_over or any(board.is_occupied(cell) for cell in state.cells)
+        return PersistentMap(
+            board=board,
+            state=state,
+            preview=queue[1:],
+            game_over=game_over,
+            locked_hash=locked_hash,
+            lines_cleared=len(cleared),
+            rng_state=self.rng_state,
+        )
+
+
+class History(Generic[Version]):
+    """The history keeps versions of a map to undo and redo moves
+
+    The versions are usually PersistentMap, or tuples holding one with the
+    state of the game around the map, like its statistics.
+    Pushing a version after undoing some drops the undone versions,
+    the game branching from the current version.
+    """
+
+    def __init__(self, version: Version) -> None:
+        self.versions: list[Version] = [version]
+        self.position: int = 0
+
+    @property
+    def current(self) -> Version:
+        """The current version"""
+        return self.versions[self.position]
+
+    def push(self, version: Version) -> None:
+        """Make a version the current one, after the current version"""
+        del self.versions[self.position + 1 :]
+        self.versions.append(version)
+        self.position += 1
+
+    def undo(self) -> Version | None:
+        """Go back to the previous version and return it, None at the first version"""
+        if self.position == 0:
+            return None
+        self.position -= 1
+        return self.current
+
+    def redo(self) -> Version | None:
+        """Go forward to the next version and return it, None at the last version"""
+        if self.position + 1 == len(self.versions):
+            return None
+        self.position += 1
+        return self.current
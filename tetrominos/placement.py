@@ -0,0 +1,210 @@
+"""This module contains the code related to placements
+A placement is a final resting state of a tetromino: a state inside the board,
+free of locked blocks, from which the tetromino can not move down.
+
+The reachable placements of a tetromino are enumerated by a breadth first search
+over the graph of its states, the edges being the movements of the tetromino.
+The search is bit-parallel: the states sharing a rotation and a column are
+stored as one integer whose bit y + Y_OFFSET is set for every line y.
+The collision checks of all these states are computed once per search as an
+integer mask, and the downward moves are applied to a whole mask at once.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import NamedTuple
+
+from tetrominos.action import Action
+from tetrominos.tetromino import NEXT_ROTATION_INDEX, SHAPES, PieceState
+
+__all__ = ["Placement", "PlacementSearch", "reachable_placements"]
+
+# The bit of the line y in a mask of states, leaving room for the lines above the board
+Y_OFFSET = 4
+# The room left on both sides of the board for the origins of the rotation spaces
+X_MARGIN = 4
+
+
+# A node of the search groups the states of a rotation index and an origin x,
+# it is numbered rotation_index * width + x + X_MARGIN
+Node = int
+
+
+class Visit(NamedTuple):
+    """The states added to a node while visiting it from a parent node
+
+    The added states were reached from the candidate states by moving down.
+    The candidate states were reached by applying the action to the parent node,
+    or to the starting state when parent is None.
+    """
+
+    added: int
+    candidates: int
+    parent: Node | None
+    action: Action
+
+
+def columns_occupancy(rows: list[int], columns: int) -> list[int]:
+    """Transpose the occupancy bitmasks of the lines into bitmasks of the columns"""
+    occupancy = [0] * columns
+    for y, row in enumerate(rows):
+        while row:
+            lowest_bit = row & -row
+            occupancy[lowest_bit.bit_length() - 1] |= 1 << y
+            row ^= lowest_bit
+    return occupancy
+
+
+def find_path(visits: dict[Node, list[Visit]], node: Node, bit: int) -> tuple[Action, ...]:
+    """Return the path of actions leading to the state of a node at a bit"""
+    reversed_path: list[Action] = []
+    while True:
+        visit = next(visit for visit in visits[node] if visit.added >> bit & 1)
+        # the highest candidate below the state is the one it moved down from
+        candidate_bit = (visit.candidates & ((2 << bit) - 1)).bit_length() - 1
+        reversed_path.extend([Action.DOWN] * (bit - candidate_bit))
+        reversed_path.append(visit.action)
+        if visit.parent is None:
+            break
+        node, bit = visit.parent, candidate_bit
+    if reversed_path[-1] is Action.NONE:
+        reversed_path.pop()
+    return tuple(reversed(reversed_path))
+
+
+class Placement:
+    """A final resting state of a tetromino and a path of actions leading to it
+    from the starting state
+    The path is only built when it is read, as a search usually follows
+    a single placement out of all the reachable ones.
+    """
+
+    __slots__ = ("state", "_visits", "_node", "_bit", "_path")
+
+    def __init__(
+        self, state: PieceState, visits: dict[Node, list[Visit]], node: Node, bit: int
+    ) -> None:
+        self.state: PieceState = state
+        self._visits = visits
+        self._node = node
+        self._bit = bit
+        self._path: tuple[Action, ...] | None = None
+
+    @property
+    def path(self) -> tuple[Action, ...]:
+        """The actions leading to the placement from the starting state"""
+        if self._path is None:
+            self._path = find_path(self._visits, self._node, self._bit)
+        return self._path
+
+    @property
+    def cells(self) -> tuple[tuple[int, int], ...]:
+        """The map coordinates of the blocks of the placed tetromino"""
+        return self.state.cells
+
+    def __repr__(self) -> str:
+        return f"Placement(state={self.state!r}, path={self.path!r})"
+
+
+class PlacementSearch:
+    """The search of the placements of a kind of tetromino on a board
+
+    The masks of the states free of collision are computed once for every node,
+    then the search propagates the reached states from node to node.
+    A fresh search is needed for every board.
+    """
+
+    def __init__(self, rows: list[int], columns: int, kind: str) -> None:
+        self.kind: str = kind
+        self.width: int = columns + 2 * X_MARGIN
+        self.free: list[int] = self.free_states(columns_occupancy(rows, columns), len(rows))
+        self.reached: list[int] = [0] * len(self.free)
+        self.visits: dict[Node, list[Visit]] = {}
+        self.queue: deque[Node] = deque()
+
+    def free_states(self, occupancy: list[int], lines: int) -> list[int]:
+        """Return the mask of the states free of collision of every node"""
+        free = []
+        columns = len(occupancy)
+        column_free = [~column_occupancy & ((1 << lines) - 1) for column_occupancy in occupancy]
+        for offsets in SHAPES[self.kind]:
+            for x in range(-X_MARGIN, columns + X_MARGIN):
+                mask = -1
+                for offset_x, offset_y in offsets:
+                    if not 0 <= x + offset_x < columns:
+                        mask = 0
+                        break
+                    mask &= column_free[x + offset_x] << (Y_OFFSET - offset_y)
+                free.append(mask)
+        return free
+
+    def visit(self, node: Node, candidates: int, parent: Node | None, action: Action) -> None:
+        """Add to a node the states reached by moving down from candidate states"""
+        free = self.free[node]
+        candidates &= free
+        if not candidates:
+            return
+        # adding the candidates to the free states carries them down the runs of free states
+        added = (free & ~(free + candidates) | candidates) & ~self.reached[node]
+        if added:
+            self.reached[node] |= added
+            self.visits.setdefault(node, []).append(Visit(added, candidates, parent, action))
+            self.queue.append(node)
+
+    def run(self, start: PieceState) -> list[Placement]:
+        """Search the placements reachable from a starting state"""
+        width = self.width
+        next_rotation = NEXT_ROTATION_INDEX[self.kind]
+        rotated = [
+            next_rotation[node // width] * width + node % width for node in range(len(self.free))
+        ]
+        # the starting state may be outside the board, like a new I tetromino
+        start_node = start.rotation_index * width + start.origin[0] + X_MARGIN
+        start_bit = 1 << (start.origin[1] + Y_OFFSET)
+        self.visit(start_node, start_bit, None, Action.NONE)
+        self.visit(start_node, start_bit << 1, None, Action.DOWN)
+        self.visit(start_node - 1, start_bit, None, Action.LEFT)
+        self.visit(start_node + 1, start_bit, None, Action.RIGHT)
+        self.visit(rotated[start_node], start_bit, None, Action.ROTATE)
+
+        # the nodes on the margins are never free, so moving left or right
+        # from a reached node never leaves its rotation
+        queue = self.queue
+        while queue:
+            node = queue.popleft()
+            states = self.reached[node]
+            self.visit(node - 1, states, node, Action.LEFT)
+            self.visit(node + 1, states, node, Action.RIGHT)
+            self.visit(rotated[node], states, node, Action.ROTATE)
+        return self.placements()
+
+    def placements(self) -> list[Placement]:
+        """Return the resting states among the reached states"""
+        placements = []
+        for node, states in enumerate(self.reached):
+            resting = states & ~(self.free[node] >> 1)
+            while resting:
+                bit = resting.bit_length() - 1
+                resting ^= 1 << bit
+                state = PieceState(
+                    self.kind,
+                    node // self.width,
+                    (node % self.width - X_MARGIN, bit - Y_OFFSET),
+                )
+                placements.append(Placement(state, self.visits, node, bit))
+        return placements
+
+
+def reachable_placements(rows: list[int], columns: int, start: PieceState) -> list[Placement]:
+    """Return every placement a tetromino can reach from its starting state
+
+    Args:
+        rows: the occupancy bitmasks of the lines of the board, see Bitboard
+        columns: the number of columns of the board
+        start: the starting state of the tetromino
+
+    Returns:
+        The list of the distinct placements, each with a path leading to it
+    """
+    return PlacementSearch(rows, columns, start.kind).run(start)
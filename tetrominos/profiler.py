@@ -0,0 +1,254 @@
+"""This module contains the frame profiler
+The profiler times the phases of every frame of the game loop and counts the
+hot operations run during the frame, without depending on pygame.
+
+The durations are kept in rolling histograms: every duration falls in one of
+a fixed set of logarithmic buckets, and only the bucket indexes of the last
+frames are remembered, so recording a duration and reading a percentile
+never sort anything.
+
+The hot operations are counted in OPERATION_COUNTS by the code running them,
+see tetrominos.counters, the profiler moves the counts of a frame to its own
+statistics when the frame ends. They are only counted while the profiler is enabled
+and until it is closed.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+import time
+from array import array
+from bisect import bisect_left
+from typing import TextIO
+
+from tetrominos.counters import COUNTING, OPERATION_COUNTS
+
+__all__ = [
+    "OPERATION_COUNTS",
+    "EXPORT_COLUMNS",
+    "RollingHistogram",
+    "FrameProfiler",
+    "FrameExport",
+]
+
+# The buckets are 10% apart, so a percentile is read with a 10% precision
+BUCKETS_PER_DECADE = 24
+
+
+def bucket_bounds(first_decade: int, last_decade: int) -> tuple[int, ...]:
+    """Return the upper bounds of the buckets of the integers from 10**first_decade
+    to 10**last_decade, with a first bucket for the smaller integers"""
+    return tuple(
+        sorted(
+            {0}
+            | {
+                math.ceil(10 ** (index / BUCKETS_PER_DECADE))
+                for index in range(
+                    first_decade * BUCKETS_PER_DECADE, last_decade * BUCKETS_PER_DECADE + 1
+                )
+            }
+        )
+    )
+
+
+# The durations in nanoseconds from 1us to 10s
+DURATION_BOUNDS = bucket_bounds(3, 10)
+# The operation counts up to 10**8
+COUNT_BOUNDS = bucket_bounds(0, 8)
+# The columns of a CSV export: the phases of the game loop, the whole frame,
+# the operation counts and the sampled measures
+EXPORT_COLUMNS: tuple[str, ...] = (
+    "events",
+    "logic",
+    "render",
+    "idle",
+    "frame",
+    *OPERATION_COUNTS,
+    "input_latency",
+)
+
+
+class RollingHistogram:
+    """The histogram of the last window_size values recorded
+    The values are integers sorted in buckets of upper bounds bounds."""
+
+    def __init__(self, bounds: tuple[int, ...] = DURATION_BOUNDS, window_size: int = 600) -> None:
+        self.bounds: tuple[int, ...] = bounds
+        self.counts: array = array("l", [0] * (len(bounds) + 1))
+        self.window: array = array("H")
+        self.window_size: int = window_size
+        self.position: int = 0
+
+    def add(self, value: int) -> None:
+        """Record a value, forgetting the oldest one once the window is full"""
+        bucket = bisect_left(self.bounds, value)
+        self.counts[bucket] += 1
+        if len(self.window) < self.window_size:
+            self.window.append(bucket)
+            return
+        self.counts[self.window[self.position]] -= 1
+        self.window[self.position] = bucket
+        self.position = (self.position + 1) % self.window_size
+
+    def percentile(self, percent: float) -> int:
+        """Return the upper bound of the bucket holding a percentile of the values,
+        0 if no value was recorded"""
+        rank = math.ceil(len(self.window) * percent / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.bounds[min(bucket, len(self.bounds) - 1)]
+        return 0
+
+    def __len__(self) -> int:
+        return len(self.window)
+
+
+class FrameProfiler:
+    """The frame profiler records the duration of the phases of every frame
+
+    Usage:
+        profiler.begin_frame()
+        ... handle the events
+        profiler.lap("events")
+        ... run the game logic
+        profiler.lap("logic")
+        ... render
+        profiler.end_frame()
+
+    The time between the last lap and end_frame is recorded as the "idle" phase,
+    and the whole frame as the "frame" phase.
+    Nothing is recorded while the profiler is disabled, but for the samples of
+    the measures, like the input latency, see record.
+    """
+
+    def __init__(self, window_size: int = 600, enabled: bool = True) -> None:
+        COUNTING.switch(self, enabled)
+        self.histograms: dict[str, RollingHistogram] = {}
+        self.window_size: int = window_size
+        self.frame: dict[str, int] = {}
+        # the highest sample of every measure recorded during the frame, for the export
+        self.samples: dict[str, int] = {}
+        self.frame_start: int = 0
+        self.last_lap: int = 0
+        self.export: FrameExport | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """True while the profiler records the frames, the hot operations
+        being counted only then, see tetrominos.counters"""
+        return COUNTING.is_enabled_by(self)
+
+    @enabled.setter
+    def enabled(self, enabled: bool) -> None:
+        COUNTING.switch(self, enabled)
+
+    def histogram(self, phase: str) -> RollingHistogram:
+        """Return the histogram of a phase or operation count, created on first use"""
+        if phase not in self.histograms:
+            bounds = COUNT_BOUNDS if phase in OPERATION_COUNTS else DURATION_BOUNDS
+            self.histograms[phase] = RollingHistogram(bounds, self.window_size)
+        return self.histograms[phase]
+
+    def begin_frame(self) -> None:
+        """Start timing a frame"""
+        self.frame_start = self.last_lap = time.perf_counter_ns()
+
+    def lap(self, phase: str) -> None:
+        """Record the time since the previous lap as the duration of a phase"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self.frame[phase] = self.frame.get(phase, 0) + now - self.last_lap
+        self.last_lap = now
+
+    def record(self, measure: str, value: int) -> None:
+        """Record a sample of a measure, like the latency of an input in nanoseconds
+
+        Every sample is added to the histogram of the measure, even while the
+        profiler is disabled, so the percentiles count every input whatever
+        the frames recorded. The export keeps the highest sample of a frame.
+        """
+        self.histogram(measure).add(value)
+        self.samples[measure] = max(self.samples.get(measure, 0), value)
+
+    def end_frame(self) -> None:
+        """Record the durations and the operation counts of the frame"""
+        samples, self.samples = self.samples, {}
+        if not self.enabled:
+            for operation in OPERATION_COUNTS:
+                OPERATION_COUNTS[operation] = 0
+            return
+        self.lap("idle")
+        self.frame["frame"] = self.last_lap - self.frame_start
+        for operation, count in OPERATION_COUNTS.items():
+            self.frame[operation] = count
+            OPERATION_COUNTS[operation] = 0
+        for phase, value in self.frame.items():
+            self.histogram(phase).add(value)
+        if self.export is not None:
+            self.export.write(self.frame | samples)
+        self.frame = {}
+
+    def summary(self) -> dict[str, tuple[int, int, int]]:
+        """Return the p50, p95 and p99 of every phase and counter"""
+        return {
+            phase: (
+                histogram.percentile(50),
+                histogram.percentile(95),
+                histogram.percentile(99),
+            )
+            for phase, histogram in self.histograms.items()
+        }
+
+    def export_to(self, path: str, columns: tuple[str, ...] = EXPORT_COLUMNS) -> None:
+        """Export the measures of every frame to a file, as CSV when its name
+        ends with .csv and as JSON lines otherwise, see FrameExport"""
+        if self.export is not None:
+            self.export.close()
+        self.export = FrameExport(path, columns)
+
+    def close(self) -> None:
+        """Stop recording, counting the hot operations and exporting,
+        closing the export file"""
+        COUNTING.switch(self, False)
+        if self.export is not None:
+            self.export.close()
+            self.export = None
+
+
+class FrameExport:
+    """Write the measures of every frame to a file, durations in nanoseconds:
+    - as CSV rows when the name of the file ends with .csv, with the given
+    columns, a measure missing from a frame, like a sample, being left empty
+    and a measure without a column being left out
+    - as JSON lines otherwise, holding every measure of the frame
+    The header is written upfront, as the first frames miss the measures only
+    sampled later, like the input latency.
+    """
+
+    def __init__(self, path: str, columns: tuple[str, ...] = EXPORT_COLUMNS) -> None:
+        self.stream: TextIO = io.TextIOWrapper(
+            io.BufferedWriter(io.FileIO(path, "w")), encoding="utf-8", newline=""
+        )
+        self.csv_writer: csv.DictWriter | None = None
+        if path.endswith(".csv"):
+            self.csv_writer = csv.DictWriter(
+                self.stream, fieldnames=columns, restval="", extrasaction="ignore"
+            )
+            self.csv_writer.writeheader()
+
+    def write(self, frame: dict[str, int]) -> None:
+        """Write the measures of a frame"""
+        if self.csv_writer is None:
+            self.stream.write(json.dumps(frame) + "\n")
+            return
+        self.csv_writer.writerow(frame)
+
+    def close(self) -> None:
+        """Close the file"""
+        self.stream.close()
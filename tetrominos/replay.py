@@ -0,0 +1,246 @@
+"""This module contains the code related to replays
+A replay records a game as its seed and rules plus the stream of the inputs
+that moved the active tetromino, each stamped with the tick it was applied at.
+Replaying the inputs on an engine reset with the same seed reproduces the game.
+
+The binary format is made of unsigned LEB128 varints:
+- a header: the MAGIC bytes, the format version, the columns and lines of the
+  map, the gravity and lock delay ticks and the seed
+- one varint per input: (ticks since the previous input << 3) | action value
+- a final Action.NONE input stamped with the tick the game ended at
+A typical game takes a couple of bytes per input.
+
+Usage:
+    python -m tetrominos.replay game.trep
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import sys
+from collections.abc import Iterator
+from dataclasses import asdict
+from typing import BinaryIO, NamedTuple
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine, EngineRules, discard_input
+
+__all__ = [
+    "ReplayHeader",
+    "ReplayWriter",
+    "ReplayReader",
+    "ReplayPlayer",
+    "encode_varint",
+    "read_varint",
+    "replay_headless",
+]
+
+MAGIC = b"TTRP"
+VERSION = 1
+ACTION_BITS = 3
+BUFFER_SIZE = 1 << 16
+
+
+def encode_varint(value: int) -> bytes:
+    """Encode an unsigned integer as a LEB128 varint"""
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def read_varint(stream: BinaryIO) -> int | None:
+    """Read a LEB128 varint from a stream, None at the end of the stream"""
+    value = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            if shift:
+                raise ValueError("Truncated varint at the end of the replay")
+            return None
+        value |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+class ReplayHeader(NamedTuple):
+    """The settings needed to reproduce a game"""
+
+    columns: int
+    lines: int
+    rules: EngineRules
+    seed: int
+
+    def create_engine(self) -> Engine:
+        """Return an engine reset in the starting state of the game"""
+        engine = Engine(self.columns, self.lines, self.rules)
+        engine.reset(self.seed)
+        return engine
+
+    def encode(self) -> bytes:
+        """Return the binary header"""
+        return MAGIC + b"".join(
+            encode_varint(value)
+            for value in (
+                VERSION,
+                self.columns,
+                self.lines,
+                self.rules.gravity_ticks,
+                self.rules.lock_delay_ticks,
+                self.seed,
+            )
+        )
+
+
+class ReplayWriter:
+    """The replay writer streams the inputs of a game to a file
+
+    Usage:
+        with ReplayWriter(path, engine):
+            ... play the game, the inputs are recorded as they are applied
+    """
+
+    def __init__(self, path: str, engine: Engine) -> None:
+        self.stream: BinaryIO = io.BufferedWriter(io.FileIO(path, "wb"), BUFFER_SIZE)
+        self.engine: Engine = engine
+        self.last_tick: int = 0
+        self.stream.write(
+            ReplayHeader(engine.map.columns, engine.map.lines, engine.rules, engine.seed).encode()
+        )
+        engine.recorder = self.record
+
+    def record(self, tick: int, action: Action) -> None:
+        """Write an input applied at a tick"""
+        self.stream.write(encode_varint((tick - self.last_tick) << ACTION_BITS | action.value))
+        self.last_tick = tick
+
+    def close(self) -> None:
+        """Write the end of the game and close the file"""
+        if self.stream.closed:
+            return
+        self.engine.recorder = discard_input
+        self.record(self.engine.stats.ticks, Action.NONE)
+        self.stream.close()
+
+    def __enter__(self) -> ReplayWriter:
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+class ReplayReader:
+    """The replay reader streams the inputs of a replay file
+
+    Iterating over the reader yields (tick, action) pairs, the last one being
+    Action.NONE at the tick the game ended.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        with open(path, "rb") as stream:
+            self.header: ReplayHeader = self.read_header(stream)
+
+    @staticmethod
+    def read_header(stream: BinaryIO) -> ReplayHeader:
+        """Read and check the header of a replay"""
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a replay file")
+        values = [read_varint(stream) for _ in range(6)]
+        if None in values:
+            raise ValueError("Truncated replay header")
+        version, columns, lines, gravity_ticks, lock_delay_ticks, seed = values
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay version {version}")
+        return ReplayHeader(columns, lines, EngineRules(gravity_ticks, lock_delay_ticks), seed)
+
+    def __iter__(self) -> Iterator[tuple[int, Action]]:
+        with open(self.path, "rb", buffering=BUFFER_SIZE) as stream:
+            self.read_header(stream)
+            tick = 0
+            while (value := read_varint(stream)) is not None:
+                tick += value >> ACTION_BITS
+                yield tick, Action(value & ((1 << ACTION_BITS) - 1))
+
+
+class ReplayPlayer:
+    """The replay player re-simulates a replay on an engine, at any speed:
+    advance(ticks) plays a given number of ticks, play_frame(ticks) plays
+    speed times the ticks of a frame of a pygame window, and run() plays
+    the whole game at full CPU speed.
+    """
+
+    def __init__(self, reader: ReplayReader, speed: float = 1.0) -> None:
+        self.engine: Engine = reader.header.create_engine()
+        self.inputs: Iterator[tuple[int, Action]] = iter(reader)
+        self.next_input: tuple[int, Action] | None = next(self.inputs, None)
+        self.speed: float = speed
+        self.pending_ticks: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        """Return True once the whole replay was played"""
+        return self.next_input is None
+
+    def advance(self, ticks: int) -> bool:
+        """Play the inputs and the ticks of the replay for a number of ticks
+
+        Returns:
+            False once the whole replay was played
+        """
+        engine = self.engine
+        for _ in range(ticks):
+            while self.next_input is not None and self.next_input[0] <= engine.stats.ticks:
+                if self.next_input[1] is not Action.NONE:
+                    engine.apply(self.next_input[1])
+                self.next_input = next(self.inputs, None)
+            if self.next_input is None:
+                return False
+            engine.tick()
+        return not self.finished
+
+    def play_frame(self, ticks: int = 1) -> bool:
+        """Play the ticks of a frame, speed times ticks on average
+
+        Returns:
+            False once the whole replay was played
+        """
+        self.pending_ticks += self.speed * ticks
+        ticks = int(self.pending_ticks)
+        self.pending_ticks -= ticks
+        return self.advance(ticks)
+
+    def run(self) -> Engine:
+        """Play the whole replay and return the engine at the end of the game"""
+        while self.advance(1 << 16):
+            pass
+        return self.engine
+
+
+def replay_headless(path: str) -> Engine:
+    """Re-simulate a replay file at full speed and return the engine
+    at the end of the game, whose statistics can be checked"""
+    return ReplayPlayer(ReplayReader(path)).run()
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the arguments of the headless replay to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Re-simulate a replay headless")
+    parser.add_argument("path", help="replay file to re-simulate")
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> None:
+    """Re-simulate a replay and print the statistics of its game as JSON"""
+    engine = replay_headless(arguments.path)
+    print(json.dumps(asdict(engine.stats)), file=sys.stdout)
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,249 @@
+"""This module contains the game runner
+The runner plays many headless games, sharded across a pool of worker processes.
+Every game is played by a policy and gets its own seed, derived from the seed
+of the run and the index of the game, so any game of a run can be replayed
+exactly with play_game(policy, seed).
+The transitions of the games can be exported as training data, every worker
+writing its own shards, see tetrominos.dataset.
+
+Usage:
+    python -m tetrominos.runner --games 1000 --workers 8 --policy random
+    python -m tetrominos.runner --games 1000 --export transitions/
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from importlib import import_module
+from multiprocessing import Pool
+from os import cpu_count
+from random import Random
+from typing import TextIO
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine
+
+__all__ = [
+    "Policy",
+    "GameSettings",
+    "GameResult",
+    "RunSummary",
+    "random_policy",
+    "load_policy",
+    "game_seed",
+    "play_game",
+    "run_games",
+    "summarize",
+]
+
+# A policy picks the action to apply at every tick of a game.
+# It receives the engine and a random number generator seeded for the game.
+Policy = Callable[[Engine, Random], Action]
+
+ACTIONS: tuple[Action, ...] = tuple(Action)
+
+
+def random_policy(_engine: Engine, rng: Random) -> Action:
+    """A policy playing random actions"""
+    return rng.choice(ACTIONS)
+
+
+POLICIES: dict[str, Policy] = {"random": random_policy}
+
+
+def load_policy(name: str) -> Policy:
+    """Return a policy from its name, either a built-in policy
+    or the import path of a callable written as "module:attribute"
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(
+            f"Unknown policy {name!r}, expected one of {list(POLICIES)} "
+            "or an import path written as 'module:attribute'"
+        )
+    return getattr(import_module(module_name), attribute)
+
+
+def game_seed(run_seed: int, game_index: int) -> int:
+    """Return the seed of a game of a run
+    String seeding is stable across processes and Python runs."""
+    return Random(f"{run_seed}:{game_index}").randrange(1 << 32)
+
+
+@dataclass(frozen=True)
+class GameSettings:
+    """The settings of the games of a run, see play_game"""
+
+    max_ticks: int = 100_000
+    export: str | None = None
+
+
+@dataclass(frozen=True)
+class GameResult:
+    """The result of a game"""
+
+    seed: int
+    lines_cleared: int
+    pieces_placed: int
+    ticks: int
+    duration: float
+
+
+def play_game(
+    policy: str, seed: int, max_ticks: int = 100_000, export: str | None = None
+) -> GameResult:
+    """Play a game until it is over or lasted max_ticks
+    The game and the policy are seeded with seed, so a game is reproducible.
+    The transitions are exported to the directory export, if given."""
+    start = time.perf_counter()
+    decide = load_policy(policy)
+    rng = Random(f"policy:{seed}")
+    engine = Engine()
+    engine.reset(seed)
+    if export is None:
+        while not engine.done and engine.stats.ticks < max_ticks:
+            engine.step(decide(engine, rng))
+    else:
+        # numpy is only imported by the runs exporting their transitions
+        dataset = import_module("tetrominos.dataset")
+        game_map = engine.map
+        layout = dataset.ShardLayout(
+            game_map.columns, game_map.lines, len(game_map.generator.preview)
+        )
+        writer = dataset.shard_writer(export, layout)
+        recorder = dataset.TransitionRecorder(engine, writer)
+        while not engine.done and engine.stats.ticks < max_ticks:
+            recorder.step(decide(engine, rng))
+        writer.flush()
+    return GameResult(
+        seed=seed,
+        lines_cleared=engine.stats.lines_cleared,
+        pieces_placed=engine.stats.pieces_placed,
+        ticks=engine.stats.ticks,
+        duration=time.perf_counter() - start,
+    )
+
+
+def _play_game(arguments: tuple[str, int, int, str | None]) -> GameResult:
+    """Worker entry point, unpacking the arguments of play_game"""
+    return play_game(*arguments)
+
+
+def run_games(
+    num_games: int,
+    policy: str = "random",
+    seed: int = 0,
+    workers: int | None = None,
+    settings: GameSettings = GameSettings(),
+) -> Iterator[GameResult]:
+    """Play num_games games across a pool of worker processes
+    The results are streamed back as soon as the games are over,
+    in no particular order.
+
+    Args:
+        num_games: the number of games to play
+        policy: the name of the policy, see load_policy
+        seed: the seed of the run, every game seed is derived from it
+        workers: the number of worker processes, all the cores by default
+        settings: the maximum duration of a game and the directory
+            of the exported transitions, none being exported if it is None
+    """
+    tasks = [
+        (policy, game_seed(seed, index), settings.max_ticks, settings.export)
+        for index in range(num_games)
+    ]
+    workers = workers or cpu_count() or 1
+    if workers == 1:
+        yield from map(_play_game, tasks)
+        return
+    # large chunks keep the inter-process overhead low,
+    # while enough chunks per worker balance the load
+    chunksize = max(1, num_games // (workers * 8))
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(_play_game, tasks, chunksize=chunksize)
+        # the workers exit on their own instead of being terminated,
+        # so they close their transition writers
+        pool.close()
+        pool.join()
+
+
+@dataclass(frozen=True)
+class RunSummary:
+    """The aggregated statistics of a run"""
+
+    games: int
+    lines_cleared: int
+    pieces_placed: int
+    mean_lines_cleared: float
+    max_lines_cleared: int
+    mean_pieces_placed: float
+    mean_duration: float
+
+
+def summarize(results: list[GameResult]) -> RunSummary:
+    """Aggregate the results of a run"""
+    games = len(results) or 1
+    lines_cleared = sum(result.lines_cleared for result in results)
+    pieces_placed = sum(result.pieces_placed for result in results)
+    return RunSummary(
+        games=len(results),
+        lines_cleared=lines_cleared,
+        pieces_placed=pieces_placed,
+        mean_lines_cleared=lines_cleared / games,
+        max_lines_cleared=max((result.lines_cleared for result in results), default=0),
+        mean_pieces_placed=pieces_placed / games,
+        mean_duration=sum(result.duration for result in results) / games,
+    )
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the arguments of the runner to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Play headless games in parallel")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--policy", default="random", help="built-in policy or module:attribute")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the run")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--max-ticks", type=int, default=100_000, help="maximum game duration")
+    parser.add_argument("--output", default=None, help="JSON lines file of the game results")
+    parser.add_argument("--export", default=None, help="directory of the exported transitions")
+    return parser
+
+
+def write_results(results: Iterator[GameResult], output: TextIO) -> list[GameResult]:
+    """Stream results as JSON lines and return them"""
+    written = []
+    for result in results:
+        written.append(result)
+        output.write(json.dumps(asdict(result)) + "\n")
+    return written
+
+
+def main(arguments: argparse.Namespace) -> None:
+    """Run games, stream the results as JSON lines and print a summary"""
+    start = time.perf_counter()
+    games = run_games(
+        arguments.games,
+        arguments.policy,
+        arguments.seed,
+        arguments.workers,
+        GameSettings(arguments.max_ticks, arguments.export),
+    )
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output:
+            results = write_results(games, output)
+    else:
+        results = write_results(games, sys.stdout)
+    summary = asdict(summarize(results))
+    summary["wall_time"] = time.perf_counter() - start
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,373 @@
+"""This module contains the game server
+The server hosts many independent headless games, called sessions, in a single
+asyncio event loop. Every session runs an Engine on its own tick schedule.
+
+A client creates a session and plays it by sending inputs, spectators subscribe
+to any session, and both receive the state of the session as deltas.
+
+A message is framed as an unsigned LEB128 varint length, followed by a
+MessageType byte and a payload. The payloads are:
+- CREATE: seed, tick rate (0 for the default of the server, at most MAX_TICK_RATE)
+- INPUT: an Action value byte
+- SPECTATE: session id
+- WELCOME: session id, then a snapshot of the map, see Map.snapshot
+- DELTA: tick, kind index, rotation index and zigzag origin of the active
+  tetromino, the number of changed lines, then every changed line as its
+  number followed by the palette index of each of its blocks
+- GAME_OVER: lines cleared, pieces placed, ticks
+- ERROR: a UTF-8 message
+The numbers are varints, so a delta of a moving tetromino takes about 8 bytes.
+A message longer than MAX_MESSAGE_SIZE, or whose length takes more than
+MAX_LENGTH_BYTES bytes, is rejected before it is read, and a connection
+sending a malformed message receives an ERROR and is closed.
+
+Usage:
+    python -m tetrominos.server --port 7777
+    python -m tetrominos.server --unix /tmp/tetrominos.sock
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+from enum import IntEnum
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine, EngineRules
+from tetrominos.map import Map
+from tetrominos.replay import encode_varint, read_varint
+from tetrominos.tetromino import TETROMINO_CLASSES, PieceState
+
+__all__ = [
+    "MessageType",
+    "encode_message",
+    "read_message",
+    "Session",
+    "SessionView",
+    "GameServer",
+]
+
+KINDS: tuple[str, ...] = tuple(TETROMINO_CLASSES)
+KIND_INDEXES: dict[str, int] = {kind: index for index, kind in enumerate(KINDS)}
+# Subscribers buffering more than this are too slow to follow a session and are dropped
+MAX_WRITE_BUFFER = 1 << 20
+# The length of the longest message read, type included, a welcome holding a whole map
+MAX_MESSAGE_SIZE = 1 << 20
+# The longest varint read as the length of a message, the length of any 32-bit size
+MAX_LENGTH_BYTES = 5
+# The highest tick rate of a session, a higher rate asked by a client being lowered to it
+MAX_TICK_RATE = 1000
+
+
+class MessageType(IntEnum):
+    """The types of the messages, see the module documentation for their payloads"""
+
+    CREATE = 1
+    INPUT = 2
+    SPECTATE = 3
+    WELCOME = 16
+    DELTA = 17
+    GAME_OVER = 18
+    ERROR = 19
+
+
+def encode_message(message_type: MessageType, payload: bytes = b"") -> bytes:
+    """Return a framed message"""
+    return encode_varint(len(payload) + 1) + bytes((message_type,)) + payload
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[MessageType, bytes] | None:
+    """Read a framed message from a stream, None at the end of the stream"""
+    length = shift = 0
+    for _ in range(MAX_LENGTH_BYTES):
+        byte = await reader.read(1)
+        if not byte:
+            if shift:
+                raise ValueError("Truncated message length")
+            return None
+        length |= (byte[0] & 0x7F) << shift
+        if length > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Message longer than {MAX_MESSAGE_SIZE} bytes")
+        if byte[0] < 0x80:
+            break
+        shift += 7
+    else:
+        raise ValueError(f"Message length longer than {MAX_LENGTH_BYTES} bytes")
+    if length == 0:
+        raise ValueError("Empty message")
+    message = await reader.readexactly(length)
+    return MessageType(message[0]), message[1:]
+
+
+def encode_signed(value: int) -> bytes:
+    """Encode a signed integer as a zigzag varint"""
+    return encode_varint(value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def decode_signed(value: int) -> int:
+    """Decode a zigzag encoded integer"""
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def read_values(stream: io.BytesIO, count: int) -> list[int]:
+    """Read a number of varints from a payload"""
+    values = [read_varint(stream) for _ in range(count)]
+    if None in values:
+        raise ValueError("Truncated payload")
+    return values
+
+
+def read_action(payload: bytes) -> Action:
+    """Read the action of an INPUT payload"""
+    if len(payload) != 1:
+        raise ValueError(f"An input holds a single action, not {len(payload)} bytes")
+    try:
+        return Action(payload[0])
+    except ValueError:
+        raise ValueError(f"Unknown action {payload[0]}") from None
+
+
+class Session:
+    """A session runs a game on its own tick schedule and publishes its state
+    to its subscribers, as a delta after every tick that changed it.
+    The blocks are only compared when a tetromino was locked.
+    """
+
+    def __init__(self, session_id: int, engine: Engine, tick_rate: int) -> None:
+        self.session_id: int = session_id
+        self.engine: Engine = engine
+        self.tick_interval: float = 1 / tick_rate
+        self.subscribers: set[asyncio.StreamWriter] = set()
+        # the state of the active tetromino and the pieces placed at the previous delta
+        self.last_sent: tuple[PieceState, int] = (engine.map.active_tetromino.state, 0)
+        self.last_rows: list[bytes] = [bytes(colors) for colors in engine.map.board.colors]
+
+    def welcome(self) -> bytes:
+        """Return the message giving the whole state of the session"""
+        return encode_message(
+            MessageType.WELCOME, encode_varint(self.session_id) + self.engine.map.snapshot()
+        )
+
+    def delta(self) -> bytes | None:
+        """Return the message of the changes since the previous delta, None if unchanged"""
+        game_map = self.engine.map
+        last_sent, self.last_sent = self.last_sent, (
+            game_map.active_tetromino.state,
+            self.engine.stats.pieces_placed,
+        )
+        if self.last_sent == last_sent:
+            return None
+        state = self.last_sent[0]
+        changed_lines = []
+        if self.last_sent[1] != last_sent[1]:
+            for line, colors in enumerate(game_map.board.colors):
+                if colors != self.last_rows[line]:
+                    self.last_rows[line] = bytes(colors)
+                    changed_lines.append(line)
+        payload = bytearray(encode_varint(self.engine.stats.ticks))
+        payload += bytes((KIND_INDEXES[state.kind], state.rotation_index))
+        payload += encode_signed(state.origin[0]) + encode_signed(state.origin[1])
+        payload += encode_varint(len(changed_lines))
+        for line in changed_lines:
+            payload += encode_varint(line) + self.last_rows[line]
+        return encode_message(MessageType.DELTA, bytes(payload))
+
+    def subscribe(self, writer: asyncio.StreamWriter) -> None:
+        """Add a subscriber, which first receives the whole state"""
+        self.subscribers.add(writer)
+        writer.write(self.welcome())
+
+    def broadcast(self, message: bytes) -> None:
+        """Send a message to every subscriber, dropping the ones too slow to follow"""
+        for writer in list(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                self.subscribers.discard(writer)
+                writer.close()
+            else:
+                writer.write(message)
+
+    async def run(self) -> None:
+        """Tick the game on schedule until it is over, catching up when late"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while not self.engine.done:
+            next_tick += self.tick_interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self.engine.tick()
+            delta = self.delta()
+            if delta is not None:
+                self.broadcast(delta)
+        stats = self.engine.stats
+        self.broadcast(
+            encode_message(
+                MessageType.GAME_OVER,
+                encode_varint(stats.lines_cleared)
+                + encode_varint(stats.pieces_placed)
+                + encode_varint(stats.ticks),
+            )
+        )
+
+
+class SessionView:
+    """The state of a session on the client side, built from its messages
+    The map of a view only tracks the blocks and the active tetromino."""
+
+    def __init__(self, welcome_payload: bytes) -> None:
+        stream = io.BytesIO(welcome_payload)
+        self.session_id: int = read_values(stream, 1)[0]
+        self.map: Map = Map.from_snapshot(memoryview(welcome_payload)[stream.tell() :])
+        self.tick: int = 0
+
+    def apply_message(self, message: tuple[MessageType, bytes]) -> bool:
+        """Apply a message received from the session
+
+        Returns:
+            False once the game is over
+        """
+        message_type, payload = message
+        if message_type is MessageType.DELTA:
+            self.apply_delta(payload)
+        elif message_type is MessageType.GAME_OVER:
+            self.map.game_over = True
+        elif message_type is MessageType.ERROR:
+            raise ValueError(payload.decode())
+        return not self.map.game_over
+
+    def apply_delta(self, payload: bytes) -> None:
+        """Apply the changes of a DELTA message"""
+        stream = io.BytesIO(payload)
+        self.tick = read_values(stream, 1)[0]
+        kind, rotation_index = stream.read(2)
+        origin_x, origin_y, line_count = read_values(stream, 3)
+        self.map.active_tetromino = TETROMINO_CLASSES[KINDS[kind]](
+            rotation_index, (decode_signed(origin_x), decode_signed(origin_y))
+        )
+        board = self.map.board
+        for _ in range(line_count):
+            board.load_line(read_values(stream, 1)[0], stream.read(board.columns))
+        if line_count:
+            board.update_skyline()
+
+
+class GameServer:
+    """The game server accepts connections over TCP or a Unix socket
+
+    A connection may create one session, which it plays and which ends when
+    the game is over or the connection is closed, and spectate any session.
+    """
+
+    def __init__(self, columns: int = 10, lines: int = 20, tick_rate: int = 60) -> None:
+        if not 0 < tick_rate <= MAX_TICK_RATE:
+            raise ValueError(f"The tick rate must be between 1 and {MAX_TICK_RATE}")
+        self.columns: int = columns
+        self.lines: int = lines
+        self.tick_rate: int = tick_rate
+        self.sessions: dict[int, Session] = {}
+        self.next_session_id: int = 1
+        self.tasks: set[asyncio.Task] = set()
+
+    def create_session(self, seed: int, tick_rate: int = 0) -> Session:
+        """Create a session and start ticking it, at tick_rate ticks per second
+        up to MAX_TICK_RATE, or at the tick rate of the server for 0.
+        The timing rules of the game are scaled to the tick rate."""
+        tick_rate = min(tick_rate or self.tick_rate, MAX_TICK_RATE)
+        engine = Engine(self.columns, self.lines, EngineRules.for_tick_rate(tick_rate))
+        engine.reset(seed)
+        session = Session(self.next_session_id, engine, tick_rate)
+        self.next_session_id += 1
+        self.sessions[session.session_id] = session
+        task = asyncio.create_task(session.run())
+        self.tasks.add(task)
+        task.add_done_callback(lambda _: self.close_session(session, task))
+        return session
+
+    def close_session(self, session: Session, task: asyncio.Task) -> None:
+        """Forget a session once its task is over"""
+        self.sessions.pop(session.session_id, None)
+        self.tasks.discard(task)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve the messages of a connection until it is closed"""
+        played: Session | None = None
+        try:
+            while (message := await read_message(reader)) is not None:
+                played = self.handle_message(message, writer, played)
+                await writer.drain()
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError) as error:
+            writer.write(encode_message(MessageType.ERROR, str(error).encode()))
+        finally:
+            if played is not None and not played.engine.done:
+                played.engine.map.game_over = True
+            for session in self.sessions.values():
+                session.subscribers.discard(writer)
+            writer.close()
+
+    def handle_message(
+        self,
+        message: tuple[MessageType, bytes],
+        writer: asyncio.StreamWriter,
+        played: Session | None,
+    ) -> Session | None:
+        """Handle a message of a connection and return the session it plays"""
+        message_type, payload = message
+        if message_type is MessageType.INPUT:
+            if played is None:
+                raise ValueError("No session to play")
+            played.engine.apply(read_action(payload))
+        elif message_type is MessageType.CREATE:
+            if played is not None:
+                raise ValueError("A connection plays a single session")
+            seed, tick_rate = read_values(io.BytesIO(payload), 2)
+            played = self.create_session(seed, tick_rate)
+            played.subscribe(writer)
+        elif message_type is MessageType.SPECTATE:
+            session_id = read_values(io.BytesIO(payload), 1)[0]
+            if session_id not in self.sessions:
+                raise ValueError(f"Unknown session {session_id}")
+            self.sessions[session_id].subscribe(writer)
+        else:
+            raise ValueError(f"Unexpected message {message_type.name}")
+        return played
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+        """Start serving over TCP, on a free port by default"""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve_unix(self, path: str) -> asyncio.Server:
+        """Start serving over a Unix socket"""
+        return await asyncio.start_unix_server(self.handle_connection, path)
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the arguments of the server to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Serve headless game sessions")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP address to listen on")
+    parser.add_argument("--port", type=int, default=7777, help="TCP port to listen on")
+    parser.add_argument("--unix", default=None, help="Unix socket path, instead of TCP")
+    parser.add_argument("--tick-rate", type=int, default=60, help="default ticks per second")
+    return parser
+
+
+async def serve(arguments: argparse.Namespace) -> None:
+    """Serve sessions until interrupted"""
+    game_server = GameServer(tick_rate=arguments.tick_rate)
+    if arguments.unix:
+        server = await game_server.serve_unix(arguments.unix)
+    else:
+        server = await game_server.serve_tcp(arguments.host, arguments.port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(arguments: argparse.Namespace) -> None:
+    """Run the server"""
+    asyncio.run(serve(arguments))
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
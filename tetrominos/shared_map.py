@@ -0,0 +1,178 @@
+"""This module contains the shared map buffer and the simulation process
+The simulation runs the game logic in its own process and publishes the map
+after every tick that changed it into a shared memory block, which any number
+of viewer processes read to render the game, see tetrominos.viewer.
+The viewers send the actions of the player back over a multiprocessing queue.
+
+The block is a sequence lock: a SEQUENCE counter and the SNAPSHOT_SIZE followed
+by a snapshot of the map, see Map.snapshot. The size is stored in the block, as
+some systems round the size of a shared memory block up to a whole page.
+The single writer makes the counter odd, writes the
+snapshot and makes it even again, and a reader copies the snapshot then checks
+that the counter is still the even value it read first, retrying otherwise.
+Neither side ever waits for the other, so a slow viewer never delays a tick.
+"""
+
+from __future__ import annotations
+
+import queue
+import struct
+from multiprocessing.shared_memory import SharedMemory
+
+from tetrominos.action import Action
+from tetrominos.engine import Engine, EngineRules
+from tetrominos.map import Map, read_snapshot_header
+from tetrominos.timestep import FixedTimestep, LoopSettings
+
+__all__ = ["SharedMapBuffer", "Simulation", "run_simulation"]
+
+SEQUENCE = struct.Struct("<Q")
+SNAPSHOT_SIZE = struct.Struct("<Q")
+# The offset of the snapshot in the shared memory block
+SNAPSHOT_OFFSET = SEQUENCE.size + SNAPSHOT_SIZE.size
+# The copies a reader attempts while the writer keeps publishing, before giving up until next frame
+MAX_READ_ATTEMPTS = 16
+
+
+class SharedMapBuffer:
+    """The shared map buffer holds the latest snapshot of a map in shared memory
+
+    Usage:
+        buffer = SharedMapBuffer.create(game_map.snapshot_size)
+        buffer.publish(game_map)  # in the simulation process
+        viewer_buffer = SharedMapBuffer.attach(buffer.name)
+        frame = viewer_buffer.read()  # in a viewer process, None until a new frame
+    """
+
+    def __init__(self, memory: SharedMemory, snapshot_size: int) -> None:
+        self.memory: SharedMemory = memory
+        self.snapshot_size: int = snapshot_size
+        self.sequence: int = 0
+
+    @classmethod
+    def create(cls, snapshot_size: int) -> SharedMapBuffer:
+        """Allocate a shared memory block for the snapshots of a map"""
+        memory = SharedMemory(create=True, size=SNAPSHOT_OFFSET + snapshot_size)
+        SEQUENCE.pack_into(memory.buf, 0, 0)
+        SNAPSHOT_SIZE.pack_into(memory.buf, SEQUENCE.size, snapshot_size)
+        return cls(memory, snapshot_size)
+
+    @classmethod
+    def attach(cls, name: str) -> SharedMapBuffer:
+        """Open the shared memory block of a buffer created by another process"""
+        memory = SharedMemory(name=name)
+        (snapshot_size,) = SNAPSHOT_SIZE.unpack_from(memory.buf, SEQUENCE.size)
+        return cls(memory, snapshot_size)
+
+    @property
+    def name(self) -> str:
+        """The name of the shared memory block, to attach it from another process"""
+        return self.memory.name
+
+    def publish(self, game_map: Map) -> None:
+        """Write a snapshot of a map, the buffer having a single writer"""
+        buffer = self.memory.buf
+        self.sequence += 1
+        SEQUENCE.pack_into(buffer, 0, self.sequence)
+        game_map.snapshot_into(buffer, SNAPSHOT_OFFSET)
+        self.sequence += 1
+        SEQUENCE.pack_into(buffer, 0, self.sequence)
+
+    def read(self) -> bytes | None:
+        """Return the latest snapshot published since the previous read,
+        None if there is none or if it was being written on every attempt"""
+        buffer = self.memory.buf
+        for _ in range(MAX_READ_ATTEMPTS):
+            (sequence,) = SEQUENCE.unpack_from(buffer, 0)
+            if sequence == self.sequence:
+                return None
+            if sequence % 2:
+                continue
+            snapshot = bytes(buffer[SNAPSHOT_OFFSET : SNAPSHOT_OFFSET + self.snapshot_size])
+            if SEQUENCE.unpack_from(buffer, 0)[0] == sequence:
+                self.sequence = sequence
+                read_snapshot_header(snapshot)
+                return snapshot
+        return None
+
+    def close(self) -> None:
+        """Detach the shared memory block from this process"""
+        self.memory.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory block, once every process closed it"""
+        self.memory.unlink()
+
+
+class Simulation:
+    """The simulation plays a game on a fixed timestep, applying the actions
+    received on its input queue and publishing the map to a shared buffer.
+    A None input stops the simulation. Like the App, the simulation starts
+    a new game when the current one is over.
+    """
+
+    def __init__(
+        self,
+        buffer: SharedMapBuffer,
+        inputs: queue.Queue,
+        engine: Engine,
+        settings: LoopSettings = LoopSettings(),
+    ) -> None:
+        self.buffer: SharedMapBuffer = buffer
+        self.inputs: queue.Queue = inputs
+        self.engine: Engine = engine
+        # the simulation sleeps until the next tick is due
+        self.timestep: FixedTimestep = FixedTimestep(
+            LoopSettings(
+                tick_rate=settings.tick_rate,
+                max_ticks_per_frame=settings.max_ticks_per_frame,
+                max_lag=settings.max_lag,
+                frame_rate_limit=settings.tick_rate,
+            )
+        )
+        self.running: bool = True
+
+    def apply_inputs(self) -> None:
+        """Apply the actions waiting on the input queue"""
+        while True:
+            try:
+                action = self.inputs.get_nowait()
+            except queue.Empty:
+                return
+            if action is None:
+                self.running = False
+                return
+            self.engine.apply(Action(action))
+
+    def run(self) -> None:
+        """Run the game until a None input, publishing the map whenever it changed"""
+        published = None
+        while self.running:
+            self.apply_inputs()
+            for _ in range(self.timestep.pending_ticks()):
+                self.engine.tick()
+                if self.engine.done:
+                    self.engine.reset()
+            game_map = self.engine.map
+            state = (game_map.zobrist_hash, game_map.game_over, game_map.locking_grace_period)
+            if state != published and not self.timestep.lagging:
+                self.buffer.publish(game_map)
+                published = state
+            self.timestep.wait_for_next_frame()
+
+
+def run_simulation(
+    buffer_name: str,
+    inputs: queue.Queue,
+    columns: int,
+    lines: int,
+    settings: LoopSettings = LoopSettings(),
+) -> None:
+    """Entry point of the simulation process"""
+    buffer = SharedMapBuffer.attach(buffer_name)
+    engine = Engine(columns, lines, rules=EngineRules.for_tick_rate(settings.tick_rate))
+    engine.reset()
+    try:
+        Simulation(buffer, inputs, engine, settings).run()
+    finally:
+        buffer.close()
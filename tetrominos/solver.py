@@ -0,0 +1,455 @@
+"""This module contains the puzzle solver
+A puzzle is a starting map and a known sequence of tetrominos. Its goal is
+either a perfect clear, every locked block being cleared, or clearing a number
+of lines, both within a number of tetrominos. The solver searches the reachable
+placements of the tetrominos depth first, see reachable_placements, over
+persistent versions of the map, see PersistentMap, so a branch costs the chunks
+touched by a freeze instead of a copy of the map.
+
+The branches that can not reach the goal are pruned:
+- a perfect clear of h lines keeps every block in the bottom h lines, and the
+  empty blocks of these lines are filled by tetrominos of 4 blocks: the parity
+  check needs them to be a multiple of 4, within the tetrominos left
+- the columns full up to the top of a perfect clear never empty, no tetromino
+  crossing them, so the holes between two such walls are unreachable from the
+  rest of the board: their empty blocks must be a multiple of 4 on their own
+- every cleared line needs columns blocks, locked or placed
+- the memo keeps the boards already searched with the same tetrominos left,
+  see TranspositionTable
+
+A big search is split across worker processes: the placements of the first
+tetrominos are expanded in process, then the subtree of every resulting version
+is searched by a worker, the first solution found stopping the others.
+A puzzle pack is verified by solving its puzzles in parallel, one per worker.
+
+Usage:
+    python -m tetrominos.solver puzzles.jsonl --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from multiprocessing import Pool
+from os import cpu_count
+from typing import Any, NamedTuple
+
+from tetrominos.action import Action
+from tetrominos.block import Block, BlockCollection
+from tetrominos.map import Map
+from tetrominos.persistent import PersistentMap
+from tetrominos.placement import Placement, reachable_placements
+from tetrominos.tetromino import TETROMINO_CLASSES, PieceState
+from tetrominos.zobrist import KIND_INDEXES, TranspositionTable, queue_key, splitmix64
+
+__all__ = [
+    "Goal",
+    "Step",
+    "SolveResult",
+    "Puzzle",
+    "PuzzleSearch",
+    "perfect_clear_feasible",
+    "solve",
+    "solve_pack",
+    "load_puzzles",
+]
+
+# The color of the locked blocks of a puzzle
+PUZZLE_COLOR = (128, 128, 128)
+# The subtrees handed to every worker, enough to balance the load
+TASKS_PER_WORKER = 8
+
+
+@dataclass(frozen=True)
+class Goal:
+    """The goal of a puzzle
+
+    lines is the number of lines to clear, None for a perfect clear.
+    height is the number of lines of a perfect clear, the smallest
+    possible heights being tried in turn when it is None.
+    max_pieces is the number of tetrominos that can be placed, all the
+    known tetrominos when it is None.
+    """
+
+    lines: int | None = None
+    height: int | None = None
+    max_pieces: int | None = None
+
+
+class Step(NamedTuple):
+    """A placement of a solution, and the path of actions leading to it"""
+
+    state: PieceState
+    path: tuple[Action, ...]
+
+
+@dataclass(frozen=True)
+class SolveResult:
+    """The result of a search, steps being None when the puzzle has no solution"""
+
+    steps: tuple[Step, ...] | None
+    nodes: int
+    duration: float
+
+    @property
+    def solved(self) -> bool:
+        """True if a solution was found"""
+        return self.steps is not None
+
+
+def perfect_clear_feasible(rows: list[int], columns: int, height: int, pieces: int) -> bool:
+    """Return False if no pieces tetrominos can clear the bottom height lines
+    of a board and leave it empty, the parity and wall checks failing"""
+    lines = len(rows)
+    if height > lines or any(rows[: lines - height]):
+        return False
+    box = rows[lines - height :]
+    empty = height * columns - sum(mask.bit_count() for mask in box)
+    if empty % 4 or empty > 4 * pieces:
+        return False
+    walls = (1 << columns) - 1
+    for mask in box:
+        walls &= mask
+    region = 0
+    for x in range(columns + 1):
+        if x < columns and not walls >> x & 1:
+            region |= 1 << x
+        elif region:
+            region_empty = height * region.bit_count()
+            region_empty -= sum((mask & region).bit_count() for mask in box)
+            if region_empty % 4:
+                return False
+            region = 0
+    return True
+
+
+class PuzzleSearch:
+    """The depth first search of the placements of a puzzle in a single process
+
+    lines_left counts the lines still to clear, and for a perfect clear the
+    lines of the board above the bottom lines_left ones must stay empty.
+    The memo of the failed boards is kept across searches with the same goal.
+    """
+
+    def __init__(self, goal: Goal, memo_size: int = 1 << 18) -> None:
+        self.goal: Goal = goal
+        self.memo: TranspositionTable = TranspositionTable(memo_size)
+        self.nodes: int = 0
+
+    def feasible(self, version: PersistentMap, pieces_left: int, lines_left: int) -> bool:
+        """Return False if the goal can not be reached from a version"""
+        board = version.board
+        rows = board.row_list()
+        if self.goal.lines is None:
+            return perfect_clear_feasible(rows, board.columns, lines_left, pieces_left)
+        filled = sum(mask.bit_count() for mask in rows)
+        return lines_left * board.columns <= filled + 4 * pieces_left
+
+    def memo_key(self, version: PersistentMap, pieces_left: int, lines_left: int) -> int:
+        """Return the key of a version with the tetrominos and lines left"""
+        kinds = (version.state.kind,) + version.preview[: pieces_left - 1]
+        return version.locked_hash ^ queue_key(kinds) ^ splitmix64(lines_left)
+
+    def placements(self, version: PersistentMap, lines_left: int) -> list[Placement]:
+        """Return the placements of the active tetromino, those leaving blocks
+        above a perfect clear being dropped"""
+        board = version.board
+        placements = reachable_placements(board.row_list(), board.columns, version.state)
+        if self.goal.lines is None:
+            box_top = board.lines - lines_left
+            placements = [
+                placement
+                for placement in placements
+                if all(y >= box_top for _, y in placement.cells)
+            ]
+        return placements
+
+    def children(
+        self, version: PersistentMap, lines_left: int
+    ) -> Iterator[tuple[Placement, PersistentMap]]:
+        """Yield the placements of the active tetromino with the versions they
+        lead to, clearing lines first, the placements leading to the same
+        board or ending the game being skipped"""
+        seen = set()
+        children = []
+        for placement in self.placements(version, lines_left):
+            child = version.moved(placement.state).freeze()
+            if child.game_over or child.locked_hash in seen:
+                continue
+            seen.add(child.locked_hash)
+            lowest = max(y for _, y in placement.cells)
+            children.append((-child.lines_cleared, -lowest, len(children), placement, child))
+        children.sort()
+        for *_, placement, child in children:
+            yield placement, child
+
+    def last_step(self, version: PersistentMap, lines_left: int) -> list[Step] | None:
+        """Return the placement of the last tetromino reaching the goal, if any
+        The board is not frozen, only its cleared lines are counted."""
+        board = version.board
+        color_index = KIND_INDEXES[version.state.kind] + 1
+        for placement in self.placements(version, lines_left):
+            touched_lines = [y for _, y in placement.cells]
+            if min(touched_lines) < 0:
+                continue
+            cleared = board.with_blocks(placement.cells, color_index).complete_rows(touched_lines)
+            if len(cleared) >= lines_left:
+                return [Step(placement.state, placement.path)]
+        return None
+
+    def search(
+        self, version: PersistentMap, pieces_left: int, lines_left: int
+    ) -> list[Step] | None:
+        """Return the steps reaching the goal from a version, None if there are none"""
+        self.nodes += 1
+        if lines_left <= 0:
+            return []
+        if pieces_left <= 0 or not self.feasible(version, pieces_left, lines_left):
+            return None
+        key = self.memo_key(version, pieces_left, lines_left)
+        if key in self.memo:
+            return None
+        if pieces_left == 1 or not version.preview:
+            steps = self.last_step(version, lines_left)
+        else:
+            steps = None
+            for placement, child in self.children(version, lines_left):
+                steps = self.search(child, pieces_left - 1, lines_left - child.lines_cleared)
+                if steps is not None:
+                    steps.insert(0, Step(placement.state, placement.path))
+                    break
+        if steps is None:
+            self.memo.put(key, False)
+        return steps
+
+
+# A subtree of a split search: the goal, the version at its root, the tetrominos
+# and lines left, and the steps leading to the root
+Subtree = tuple[Goal, PersistentMap, int, int, tuple[Step, ...]]
+
+
+def _search_subtree(subtree: Subtree) -> tuple[tuple[Step, ...] | None, int]:
+    """Worker entry point, searching a subtree and returning its steps from the
+    root of the puzzle, with the number of nodes searched"""
+    goal, version, pieces_left, lines_left, prefix = subtree
+    search = PuzzleSearch(goal)
+    steps = search.search(version, pieces_left, lines_left)
+    return (None if steps is None else prefix + tuple(steps)), search.nodes
+
+
+def split_search(
+    search: PuzzleSearch, root: Subtree, subtrees: int
+) -> tuple[tuple[Step, ...] | None, list[Subtree]]:
+    """Expand the placements of the first tetrominos until there are enough
+    subtrees, returning the steps of a solution found while expanding, if any"""
+    frontier = [root]
+    while 0 < len(frontier) < subtrees and frontier[0][2] > 2:
+        expanded = []
+        for goal, version, pieces_left, lines_left, prefix in frontier:
+            search.nodes += 1
+            if not search.feasible(version, pieces_left, lines_left):
+                continue
+            for placement, child in search.children(version, lines_left):
+                steps = prefix + (Step(placement.state, placement.path),)
+                if child.lines_cleared >= lines_left:
+                    return steps, []
+                expanded.append(
+                    (goal, child, pieces_left - 1, lines_left - child.lines_cleared, steps)
+                )
+        frontier = expanded
+    return None, frontier
+
+
+def search_in_parallel(root: Subtree, workers: int) -> tuple[tuple[Step, ...] | None, int]:
+    """Search the subtrees of a root across a pool of worker processes"""
+    search = PuzzleSearch(root[0])
+    steps, frontier = split_search(search, root, workers * TASKS_PER_WORKER)
+    nodes = search.nodes
+    if steps is not None or not frontier:
+        return steps, nodes
+    # leaving the pool terminates the workers still searching other subtrees
+    with Pool(workers) as pool:
+        for steps, subtree_nodes in pool.imap_unordered(_search_subtree, frontier):
+            nodes += subtree_nodes
+            if steps is not None:
+                return steps, nodes
+    return None, nodes
+
+
+def perfect_clear_heights(game_map: Map, pieces: int) -> list[int]:
+    """Return the heights of the perfect clears passing the parity check,
+    from the lowest"""
+    rows = game_map.board.rows
+    filled = sum(mask.bit_count() for mask in rows)
+    columns = game_map.columns
+    return [
+        height
+        for height in range(max(1, game_map.lines - game_map.board.top), game_map.lines + 1)
+        if (height * columns - filled) % 4 == 0 and height * columns <= filled + 4 * pieces
+    ]
+
+
+def solve(game_map: Map, pieces: str, goal: Goal = Goal(), workers: int = 1) -> SolveResult:
+    """Search the placements of a sequence of tetrominos reaching a goal from a map
+
+    Args:
+        game_map: the starting map, its active tetromino and generator being ignored
+        pieces: the kinds of the tetrominos to place, in order, like "IOTSZJL"
+        goal: the goal of the puzzle
+        workers: the number of worker processes, the search is split across
+            them when there is more than one
+
+    Returns:
+        The steps of a solution, if any, with the nodes searched and the duration
+    """
+    start = time.perf_counter()
+    if not pieces or any(kind not in TETROMINO_CLASSES for kind in pieces):
+        raise ValueError(f"Expected a sequence of tetromino kinds, got {pieces!r}")
+    base = PersistentMap.from_map(game_map)
+    root = PersistentMap(
+        base.board, TETROMINO_CLASSES[pieces[0]]().state, tuple(pieces[1:]), False, base.locked_hash
+    )
+    pieces_left = len(pieces) if goal.max_pieces is None else min(goal.max_pieces, len(pieces))
+    if goal.lines is not None:
+        heights = [goal.lines]
+    elif goal.height is not None:
+        heights = [goal.height]
+    else:
+        heights = perfect_clear_heights(game_map, pieces_left)
+    search = PuzzleSearch(goal)
+    nodes = 0
+    # no height passing the parity check means no perfect clear
+    steps = None
+    for lines_left in heights:
+        if workers > 1:
+            steps, subtree_nodes = search_in_parallel(
+                (goal, root, pieces_left, lines_left, ()), workers
+            )
+            nodes += subtree_nodes
+        else:
+            found = search.search(root, pieces_left, lines_left)
+            steps = None if found is None else tuple(found)
+        if steps is not None:
+            break
+    return SolveResult(steps, nodes + search.nodes, time.perf_counter() - start)
+
+
+@dataclass(frozen=True)
+class Puzzle:
+    """A puzzle of a pack
+
+    board lists the bottom lines of the starting board, from top to bottom,
+    "#" being a locked block and any other character an empty one.
+    """
+
+    board: tuple[str, ...]
+    pieces: str
+    goal: Goal = Goal()
+    lines: int = 20
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> Puzzle:
+        """Return the puzzle of a JSON object with the board and pieces keys,
+        and optionally the lines, height, max_pieces and board_lines keys"""
+        return cls(
+            board=tuple(data["board"]),
+            pieces=data["pieces"],
+            goal=Goal(data.get("lines"), data.get("height"), data.get("max_pieces")),
+            lines=data.get("board_lines", 20),
+        )
+
+    def to_map(self) -> Map:
+        """Return the starting map of the puzzle"""
+        columns = len(self.board[0]) if self.board else 10
+        if len(self.board) > self.lines or any(len(line) != columns for line in self.board):
+            raise ValueError("The lines of a puzzle board must fit the board and have one size")
+        game_map = Map(columns, self.lines)
+        blocks = BlockCollection()
+        first_line = self.lines - len(self.board)
+        for y, line in enumerate(self.board, start=first_line):
+            for x, character in enumerate(line):
+                if character == "#":
+                    blocks.add((x, y), Block(PUZZLE_COLOR))
+        game_map.locked_blocks = blocks
+        return game_map
+
+
+def load_puzzles(path: str) -> list[Puzzle]:
+    """Load a puzzle pack, a JSON lines file of puzzles, see Puzzle.from_json"""
+    with open(path, encoding="utf-8") as stream:
+        return [Puzzle.from_json(json.loads(line)) for line in stream if line.strip()]
+
+
+def _solve_puzzle(indexed_puzzle: tuple[int, Puzzle]) -> tuple[int, SolveResult]:
+    """Worker entry point, solving a puzzle of a pack in a single process"""
+    index, puzzle = indexed_puzzle
+    return index, solve(puzzle.to_map(), puzzle.pieces, puzzle.goal)
+
+
+def solve_pack(
+    puzzles: list[Puzzle], workers: int | None = None
+) -> Iterator[tuple[int, SolveResult]]:
+    """Solve the puzzles of a pack across a pool of worker processes
+    The results are streamed back with the index of their puzzle, in no particular order.
+    """
+    tasks = list(enumerate(puzzles))
+    workers = workers or cpu_count() or 1
+    if workers == 1:
+        yield from map(_solve_puzzle, tasks)
+        return
+    chunksize = max(1, len(tasks) // (workers * TASKS_PER_WORKER))
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(_solve_puzzle, tasks, chunksize=chunksize)
+
+
+def describe(index: int, result: SolveResult) -> dict[str, Any]:
+    """Return the JSON object of the result of a puzzle"""
+    return {
+        "puzzle": index,
+        "solved": result.solved,
+        "steps": [
+            {
+                "kind": step.state.kind,
+                "rotation": step.state.rotation_index,
+                "origin": step.state.origin,
+                "path": [action.name for action in step.path],
+            }
+            for step in result.steps or ()
+        ],
+        "nodes": result.nodes,
+        "duration": result.duration,
+    }
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the arguments of the solver to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Verify a puzzle pack")
+    parser.add_argument("path", help="JSON lines file of puzzles")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> int:
+    """Solve a puzzle pack, print the results as JSON lines and a summary,
+    and return 1 if a puzzle has no solution"""
+    start = time.perf_counter()
+    results = []
+    for index, result in solve_pack(load_puzzles(arguments.path), arguments.workers):
+        results.append(result)
+        print(json.dumps(describe(index, result)), file=sys.stdout)
+    summary = {
+        "puzzles": len(results),
+        "solved": sum(result.solved for result in results),
+        "nodes": sum(result.nodes for result in results),
+        "wall_time": time.perf_counter() - start,
+    }
+    print(json.dumps(summary), file=sys.stderr)
+    return int(summary["solved"] < len(results))
+
+
+if __name__ == "__main__":
+    sys.exit(main(build_parser().parse_args()))
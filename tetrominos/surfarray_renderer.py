@@ -0,0 +1,81 @@
+"""This module contains the SurfarrayRenderer class
+The surfarray renderer draws the whole game matrix in a few surface operations:
+the colors of the blocks are written in a small pixel array of one pixel
+per block, which is upscaled to the size of the blocks, covered by the grid
+lines and blitted at once on the target surface.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import numpy as np
+import pygame
+
+__all__ = ["SurfarrayRenderer"]
+
+GRID_COLORKEY = (255, 0, 255)
+
+
+class SurfarrayRenderer:
+    """The surfarray renderer draws a matrix of blocks with a single blit,
+    whatever the number of blocks
+    """
+
+    def __init__(
+        self,
+        columns: int,
+        lines: int,
+        block_size_in_pixels: int,
+        grid_color: tuple[int, int, int],
+    ) -> None:
+        width = columns * block_size_in_pixels
+        height = lines * block_size_in_pixels
+        self.cells: pygame.Surface = pygame.Surface((columns, lines))
+        self.image: pygame.Surface = pygame.Surface((width + 1, height + 1))
+        self.scaled_cells: pygame.Surface = self.image.subsurface((1, 1, width, height))
+        self.grid: pygame.Surface = self.build_grid(block_size_in_pixels, grid_color)
+        self.palette: np.ndarray = np.zeros((0, 3), dtype=np.uint8)
+        self.palette_colors: list[tuple[int, int, int]] = []
+
+    def build_grid(
+        self, block_size_in_pixels: int, grid_color: tuple[int, int, int]
+    ) -> pygame.Surface:
+        """Return a transparent surface with the grid lines between the blocks"""
+        grid = pygame.Surface(self.image.get_size())
+        grid.fill(GRID_COLORKEY)
+        grid.set_colorkey(GRID_COLORKEY)
+        width, height = grid.get_size()
+        for left in range(0, width, block_size_in_pixels):
+            pygame.draw.line(grid, grid_color, (left, 0), (left, height - 1))
+        for top in range(0, height, block_size_in_pixels):
+            pygame.draw.line(grid, grid_color, (0, top), (width - 1, top))
+        return grid
+
+    def render(
+        self,
+        surface: pygame.Surface,
+        origin: tuple[int, int],
+        rows: Sequence[bytes | bytearray],
+        palette: Sequence[tuple[int, int, int]],
+    ) -> pygame.Rect:
+        """Render the blocks on the surface
+
+        Args:
+            surface: the target surface
+            origin: the coordinates of the left top pixel of the matrix
+            rows: the palette indexes of the blocks, line by line
+            palette: the colors of the palette indexes
+
+        Returns:
+            The area of the surface that was redrawn
+        """
+        if self.palette_colors != palette:
+            self.palette = np.array(palette, dtype=np.uint8)
+            self.palette_colors = list(palette)
+        indexes = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), -1)
+        # surfarray arrays are indexed by (x, y)
+        pygame.surfarray.blit_array(self.cells, self.palette[indexes.T])
+        pygame.transform.scale(self.cells, self.scaled_cells.get_size(), self.scaled_cells)
+        self.image.blit(self.grid, (0, 0))
+        return surface.blit(self.image, origin)
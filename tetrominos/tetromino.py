@@ -1,15 +1,25 @@
 """This module contains the code related to tetrominos
 Tetrominos are shapes composed of four adjacent blocks
-They move and rotate"""
+They move and rotate
+
+The state of a tetromino is an immutable and hashable PieceState value.
+The shape offsets of every state and the results of the rotations come from
+tables computed once at import, so simulating a movement only builds tuples.
+The blocks of a state are cached too, and shared by the collections returned
+by get_blocks."""
 
 from __future__ import annotations
-from dataclasses import dataclass
-from random import choice
+from collections import deque
+from collections.abc import Mapping
+from functools import lru_cache
+from random import Random, choice
+from types import MappingProxyType
+from typing import ClassVar, NamedTuple
 
 from tetrominos.block import Block, BlockCollection
-from tetrominos.coordinates import coordinates_addition
 
 __all__ = [
+    "PieceState",
     "BaseTetromino",
     "TetrominoI",
     "TetrominoO",
@@ -18,8 +28,60 @@ __all__ = [
     "TetrominoS",
     "TetrominoZ",
     "TetrominoT",
+    "TetrominoGenerator",
+    "TETROMINO_CLASSES",
 ]
 
+RotationTemplate = tuple[tuple[tuple[int, int], ...], ...]
+
+
+class PieceState(NamedTuple):
+    """The state of a tetromino: its kind, its rotation index and the origin
+    of its rotation space"""
+
+    kind: str
+    rotation_index: int
+    origin: tuple[int, int]
+
+    @property
+    def cells(self) -> tuple[tuple[int, int], ...]:
+        """Return the map coordinates of the four blocks of the tetromino"""
+        return state_cells(self)
+
+    def translated(self, direction: tuple[int, int]) -> PieceState:
+        """Return the state reached after a translation"""
+        origin = self.origin
+        return PieceState(
+            self.kind,
+            self.rotation_index,
+            (origin[0] + direction[0], origin[1] + direction[1]),
+        )
+
+    def rotated(self) -> PieceState:
+        """Return the state reached after a rotation"""
+        return PieceState(
+            self.kind, NEXT_ROTATION_INDEX[self.kind][self.rotation_index], self.origin
+        )
+
+
+@lru_cache(maxsize=1 << 16)
+def state_cells(state: PieceState) -> tuple[tuple[int, int], ...]:
+    """Return the map coordinates of the blocks of a tetromino state"""
+    origin_x, origin_y = state.origin
+    return tuple(
+        (origin_x + offset_x, origin_y + offset_y)
+        for offset_x, offset_y in SHAPES[state.kind][state.rotation_index]
+    )
+
+
+@lru_cache(maxsize=1 << 16)
+def state_blocks(
+    state: PieceState, color: tuple[int, int, int]
+) -> Mapping[tuple[int, int], Block]:
+    """Return the read-only blocks of a tetromino state of a color, by map coordinate"""
+    block = Block(color)
+    return MappingProxyType({cell: block for cell in state_cells(state)})
+
 
 class BaseTetromino:
     """The base tetromino
@@ -36,142 +98,188 @@ class BaseTetromino:
 
     """
 
-    def __init__(self) -> None:
-        self.color: tuple[int, int, int]
-        self.rotation_space_origin: tuple[int, int]
-        self.rotation_template: list[list[tuple[int, int]]]
-        self.rotation_cycle_index: int = 0
+    kind: ClassVar[str]
+    color: ClassVar[tuple[int, int, int]]
+    spawn_origin: ClassVar[tuple[int, int]] = (4, 0)
+    rotation_template: ClassVar[RotationTemplate]
+
+    def __init__(
+        self,
+        rotation_cycle_index: int = 0,
+        rotation_space_origin: tuple[int, int] | None = None,
+    ) -> None:
+        self.rotation_space_origin: tuple[int, int] = (
+            self.spawn_origin if rotation_space_origin is None else rotation_space_origin
+        )
+        self.rotation_cycle_index: int = rotation_cycle_index
+
+    @property
+    def state(self) -> PieceState:
+        """Return the immutable state of the tetromino"""
+        return PieceState(self.kind, self.rotation_cycle_index, self.rotation_space_origin)
+
+    @classmethod
+    def from_state(cls, state: PieceState) -> BaseTetromino:
+        """Return a tetromino in a given state"""
+        return TETROMINO_CLASSES[state.kind](state.rotation_index, state.origin)
 
     def get_blocks(self) -> BlockCollection:
-        """Return  all currents blocks of the tetromino and their coordinates"""
-        blocks = BlockCollection()
-        rotation_template = self.rotation_template[self.rotation_cycle_index]
-        for template_coordinate in rotation_template:
-            map_coordinate: tuple[int, int] = coordinates_addition(
-                self.rotation_space_origin,
-                template_coordinate,
-            )
-            blocks.add(map_coordinate, Block(self.color))
-        return blocks
+        """Return  all currents blocks of the tetromino and their coordinates,
+        as a view of the cached blocks of its state"""
+        return BlockCollection.view_of(state_blocks(self.state, self.color))
 
     def __str__(self):
         return self.__class__.__name__
 
     @classmethod
-    def create_random_tetromino(cls) -> BaseTetromino:
-        """Return a random tetromino"""
-        random_tetromino_class = choice(
-            [
-                TetrominoI,
-                TetrominoO,
-                TetrominoL,
-                TetrominoJ,
-                TetrominoS,
-                TetrominoZ,
-                TetrominoT,
-            ]
-        )
+    def create_random_tetromino(cls, rng: Random | None = None) -> BaseTetromino:
+        """Return a random tetromino, drawn from rng if given"""
+        random_choice = choice if rng is None else rng.choice
+        random_tetromino_class = random_choice(list(TETROMINO_CLASSES.values()))
         return random_tetromino_class()
 
 
-@dataclass
+class TetrominoGenerator:
+    """The generator draws the tetrominos of a game from its own seeded
+    random number generator, so a game can be reproduced from its seed.
+    The next tetrominos are known in advance and kept in a preview queue.
+    """
+
+    def __init__(self, seed: int | None = None, preview_size: int = 1) -> None:
+        self.rng: Random = Random(seed)
+        self.queue: deque[BaseTetromino] = deque(
+            BaseTetromino.create_random_tetromino(self.rng) for _ in range(preview_size)
+        )
+
+    def reset(self, seed: int | None = None) -> None:
+        """Reseed the generator and refill the preview queue"""
+        self.rng.seed(seed)
+        preview_size = len(self.queue)
+        self.queue.clear()
+        for _ in range(preview_size):
+            self.queue.append(BaseTetromino.create_random_tetromino(self.rng))
+
+    def pop(self) -> BaseTetromino:
+        """Return the next tetromino and draw a new one in the preview queue"""
+        self.queue.append(BaseTetromino.create_random_tetromino(self.rng))
+        return self.queue.popleft()
+
+    @property
+    def preview(self) -> tuple[str, ...]:
+        """Return the kinds of the next tetrominos"""
+        return tuple(tetromino.kind for tetromino in self.queue)
+
+
 class TetrominoI(BaseTetromino):
     """The I tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (0, 255, 255)  # cyan
-        self.rotation_space_origin: tuple[int, int] = (3, -2)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 1), (1, 1), (2, 1), (3, 1)],
-            [(2, 0), (2, 1), (2, 2), (2, 3)],
-        ]
+    kind = "I"
+    color = (0, 255, 255)  # cyan
+    spawn_origin = (3, -2)
+    rotation_template = (
+        ((0, 1), (1, 1), (2, 1), (3, 1)),
+        ((2, 0), (2, 1), (2, 2), (2, 3)),
+    )
 
 
-@dataclass
 class TetrominoO(BaseTetromino):
     """The O tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (255, 255, 0)  # yellow
-        self.rotation_space_origin: tuple[int, int] = (4, 0)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 0), (0, 1), (1, 0), (1, 1)],
-        ]
+    kind = "O"
+    color = (255, 255, 0)  # yellow
+    rotation_template = (((0, 0), (0, 1), (1, 0), (1, 1)),)
 
 
-@dataclass
 class TetrominoJ(BaseTetromino):
     """The J tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (0, 0, 139)  # dark blue
-        self.rotation_space_origin: tuple[int, int] = (4, 0)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 1), (1, 1), (2, 1), (2, 2)],
-            [(1, 0), (1, 1), (1, 2), (0, 2)],
-            [(0, 1), (0, 2), (1, 2), (2, 2)],
-            [(1, 0), (2, 0), (2, 1), (2, 2)],
-        ]
+    kind = "J"
+    color = (0, 0, 139)  # dark blue
+    rotation_template = (
+        ((0, 1), (1, 1), (2, 1), (2, 2)),
+        ((1, 0), (1, 1), (1, 2), (0, 2)),
+        ((0, 1), (0, 2), (1, 2), (2, 2)),
+        ((1, 0), (2, 0), (2, 1), (2, 2)),
+    )
 
 
-@dataclass
 class TetrominoL(BaseTetromino):
     """The L tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (255, 136, 0)  # orange
-        self.rotation_space_origin: tuple[int, int] = (4, 0)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 2), (0, 1), (1, 1), (2, 1)],
-            [(0, 0), (1, 0), (1, 1), (1, 2)],
-            [(2, 1), (2, 2), (1, 2), (0, 2)],
-            [(1, 0), (1, 1), (1, 2), (2, 2)],
-        ]
+    kind = "L"
+    color = (255, 136, 0)  # orange
+    rotation_template = (
+        ((0, 2), (0, 1), (1, 1), (2, 1)),
+        ((0, 0), (1, 0), (1, 1), (1, 2)),
+        ((2, 1), (2, 2), (1, 2), (0, 2)),
+        ((1, 0), (1, 1), (1, 2), (2, 2)),
+    )
 
 
-@dataclass
 class TetrominoS(BaseTetromino):
     """The S tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (0, 128, 0)  # green
-        self.rotation_space_origin: tuple[int, int] = (4, 0)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 2), (1, 2), (1, 1), (2, 1)],
-            [(0, 0), (0, 1), (1, 1), (1, 2)],
-        ]
+    kind = "S"
+    color = (0, 128, 0)  # green
+    rotation_template = (
+        ((0, 2), (1, 2), (1, 1), (2, 1)),
+        ((0, 0), (0, 1), (1, 1), (1, 2)),
+    )
 
 
-@dataclass
 class TetrominoZ(BaseTetromino):
     """The Z tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (178, 34, 34)  # fire brick
-        self.rotation_space_origin: tuple[int, int] = (4, 0)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 1), (1, 1), (1, 2), (2, 2)],
-            [(1, 2), (1, 1), (2, 1), (2, 0)],
-        ]
+    kind = "Z"
+    color = (178, 34, 34)  # fire brick
+    rotation_template = (
+        ((0, 1), (1, 1), (1, 2), (2, 2)),
+        ((1, 2), (1, 1), (2, 1), (2, 0)),
+    )
 
 
-@dataclass
 class TetrominoT(BaseTetromino):
     """The T tretromino"""
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.color: tuple[int, int, int] = (186, 85, 211)  # medium orchid
-        self.rotation_space_origin: tuple[int, int] = (4, 0)
-        self.rotation_template: list[list[tuple[int, int]]] = [
-            [(0, 1), (1, 1), (2, 1), (1, 2)],
-            [(1, 0), (1, 1), (1, 2), (0, 1)],
-            [(0, 2), (1, 2), (2, 2), (1, 1)],
-            [(1, 0), (1, 1), (1, 2), (2, 1)],
-        ]
+    kind = "T"
+    color = (186, 85, 211)  # medium orchid
+    rotation_template = (
+        ((0, 1), (1, 1), (2, 1), (1, 2)),
+        ((1, 0), (1, 1), (1, 2), (0, 1)),
+        ((0, 2), (1, 2), (2, 2), (1, 1)),
+        ((1, 0), (1, 1), (1, 2), (2, 1)),
+    )
+
+
+# Tables computed once at import
+TETROMINO_CLASSES: dict[str, type[BaseTetromino]] = {
+    tetromino_class.kind: tetromino_class
+    for tetromino_class in (
+        TetrominoI,
+        TetrominoO,
+        TetrominoL,
+        TetrominoJ,
+        TetrominoS,
+        TetrominoZ,
+        TetrominoT,
+    )
+}
+SHAPES: dict[str, RotationTemplate] = {
+    kind: tetromino_class.rotation_template
+    for kind, tetromino_class in TETROMINO_CLASSES.items()
+}
+NEXT_ROTATION_INDEX: dict[str, tuple[int, ...]] = {
+    kind: tuple((index + 1) % len(template) for index in range(len(template)))
+    for kind, template in SHAPES.items()
+}
+# The bottom profile of a rotation lists (offset x, lowest offset y) for every column
+BOTTOM_PROFILES: dict[str, tuple[tuple[tuple[int, int], ...], ...]] = {
+    kind: tuple(
+        tuple(
+            (column, max(offset_y for offset_x, offset_y in offsets if offset_x == column))
+            for column in sorted({offset_x for offset_x, _ in offsets})
+        )
+        for offsets in template
+    )
+    for kind, template in SHAPES.items()
+}
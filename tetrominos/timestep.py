@@ -0,0 +1,110 @@
+"""This module contains the fixed timestep of the game loop
+The game logic advances in ticks of a fixed duration, whatever the frame rate:
+the time elapsed since the previous frame is accumulated and spent in whole
+ticks, so a game plays the same number of ticks per second on any machine.
+The time is counted in integer nanoseconds, so the ticks never drift.
+
+A machine too slow to keep up never drops ticks, the game time would fall
+behind the wall time: the ticks still due after a frame stay in the accumulator
+and the loop skips rendering until it caught up. Only a lag longer than max_lag,
+like after the process was suspended, is dropped, as the last resort against
+the spiral of death of a loop spending ever more time catching up.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+__all__ = ["LoopSettings", "FixedTimestep"]
+
+NANOSECONDS = 1_000_000_000
+
+
+@dataclass(frozen=True)
+class LoopSettings:
+    """The settings of the game loop
+
+    tick_rate is the number of logic ticks per second.
+    max_ticks_per_frame caps the ticks played per iteration of the loop, so the
+    events are still handled while catching up, the other ticks staying due.
+    max_lag is the lag in seconds above which the ticks due are dropped.
+    frame_rate_limit caps the frames per second, 0 meaning uncapped,
+    and vsync synchronizes the display updates with the screen refresh.
+    """
+
+    tick_rate: int = 240
+    max_ticks_per_frame: int = 24
+    max_lag: float = 0.25
+    frame_rate_limit: int = 0
+    vsync: bool = False
+
+
+class FixedTimestep:
+    """The fixed timestep counts the ticks to play every frame
+
+    Usage:
+        while running:
+            for _ in range(timestep.pending_ticks()):
+                ... advance the game by one tick
+            if not timestep.lagging:
+                ... render the frame
+            timestep.wait_for_next_frame()
+    """
+
+    def __init__(self, settings: LoopSettings = LoopSettings()) -> None:
+        self.settings: LoopSettings = settings
+        self.previous_time: int | None = None
+        # the time not spent in ticks yet, in nanoseconds multiplied by the tick rate
+        self.accumulator: int = 0
+        self.ticks: int = 0
+        # the ticks dropped by the max_lag clamp
+        self.skipped_ticks: int = 0
+
+    @property
+    def alpha(self) -> float:
+        """The fraction of a tick elapsed since the last tick, to interpolate a frame"""
+        return min(self.accumulator / NANOSECONDS, 1.0)
+
+    @property
+    def lagging(self) -> bool:
+        """True while whole ticks are still due, the frame is not worth rendering"""
+        return self.accumulator >= NANOSECONDS
+
+    def pending_ticks(self) -> int:
+        """Return the number of ticks due, up to max_ticks_per_frame,
+        the other ticks staying due for the next frames"""
+        now = time.perf_counter_ns()
+        if self.previous_time is None:
+            self.previous_time = now
+        self.accumulator += (now - self.previous_time) * self.settings.tick_rate
+        self.previous_time = now
+        # the last resort against the spiral of death, see the module documentation
+        max_accumulator = int(self.settings.max_lag * NANOSECONDS) * self.settings.tick_rate
+        overflow = self.accumulator - max_accumulator
+        if overflow > 0:
+            skipped = -(-overflow // NANOSECONDS)
+            self.skipped_ticks += skipped
+            self.accumulator -= skipped * NANOSECONDS
+        ticks = min(self.accumulator // NANOSECONDS, self.settings.max_ticks_per_frame)
+        self.accumulator -= ticks * NANOSECONDS
+        self.ticks += ticks
+        return ticks
+
+    def due_time(self, ticks_before_last: int = 0) -> int:
+        """Return the time in nanoseconds a tick played this frame was due,
+        ticks_before_last ticks before the last tick returned by pending_ticks"""
+        if self.previous_time is None:
+            return time.perf_counter_ns()
+        lag = self.accumulator + ticks_before_last * NANOSECONDS
+        return self.previous_time - lag // self.settings.tick_rate
+
+    def wait_for_next_frame(self) -> None:
+        """Sleep until the next frame is due, when the frame rate is limited
+        and the loop is not catching up"""
+        if not self.settings.frame_rate_limit or self.previous_time is None or self.lagging:
+            return
+        frame_end = self.previous_time + NANOSECONDS // self.settings.frame_rate_limit
+        remaining = frame_end - time.perf_counter_ns()
+        if remaining > 0:
+            time.sleep(remaining / NANOSECONDS)
@@ -0,0 +1,266 @@
+"""This module contains the VectorEngine class
+The vector engine advances a batch of independent boards in lockstep.
+The boards are stored in a single NumPy array and the collision checks,
+the gravity, the locking and the line clears are vectorized across the batch.
+The rules are the same as the ones of the Engine.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+from tetrominos.action import Action
+from tetrominos.engine import EngineRules
+from tetrominos.tetromino import TETROMINO_CLASSES
+
+__all__ = ["VectorEngine", "KINDS", "SHAPE_OFFSETS"]
+
+# The kind of a tetromino is its index in KINDS,
+# and a locked block is stored as this index + 1 (0 meaning empty),
+# which matches the palette indexes of the Map bitboard
+KINDS: tuple[str, ...] = tuple(TETROMINO_CLASSES)
+
+# Tables built from the rotation templates:
+# - SHAPE_OFFSETS[kind, rotation] are the four (x, y) offsets of a tetromino
+# - NEXT_ROTATION[kind, rotation] is the rotation reached after a rotation
+# - SPAWN_ORIGINS[kind] is the origin of a new tetromino
+MAX_ROTATIONS = max(
+    len(tetromino_class.rotation_template) for tetromino_class in TETROMINO_CLASSES.values()
+)
+SHAPE_OFFSETS: np.ndarray = np.array(
+    [
+        [
+            tetromino_class.rotation_template[rotation % len(tetromino_class.rotation_template)]
+            for rotation in range(MAX_ROTATIONS)
+        ]
+        for tetromino_class in TETROMINO_CLASSES.values()
+    ],
+    dtype=np.int64,
+)
+NEXT_ROTATION: np.ndarray = np.array(
+    [
+        [
+            (rotation + 1) % len(tetromino_class.rotation_template)
+            for rotation in range(MAX_ROTATIONS)
+        ]
+        for tetromino_class in TETROMINO_CLASSES.values()
+    ],
+    dtype=np.int64,
+)
+SPAWN_ORIGINS: np.ndarray = np.array(
+    [tetromino_class.spawn_origin for tetromino_class in TETROMINO_CLASSES.values()],
+    dtype=np.int64,
+)
+
+# Columns of the pieces array
+KIND, ROTATION, X, Y = 0, 1, 2, 3
+# Columns of the timers array
+GRAVITY, LOCK = 0, 1
+# Columns of the stats array
+TICKS, LINES_CLEARED, PIECES_PLACED = 0, 1, 2
+
+
+class VectorEngine:
+    """The vector engine advances N boards of the same size in lockstep.
+
+    - boards is a (N, lines, columns) uint8 array of the locked blocks
+    - pieces is a (N, 4) array of the active tetrominos (kind, rotation, x, y)
+    - done is a (N,) bool array, True when the game of a board is over
+
+    Boards whose game is over are frozen until reset_boards is called on them.
+    """
+
+    def __init__(
+        self,
+        num_boards: int,
+        columns: int = 10,
+        lines: int = 20,
+        rules: EngineRules = EngineRules(),
+    ) -> None:
+        self.rules: EngineRules = rules
+        self.rng: np.random.Generator = np.random.default_rng()
+        self.boards: np.ndarray = np.zeros((num_boards, lines, columns), dtype=np.uint8)
+        self.pieces: np.ndarray = np.zeros((num_boards, 4), dtype=np.int64)
+        self.timers: np.ndarray = np.zeros((num_boards, 2), dtype=np.int64)
+        self.stats: np.ndarray = np.zeros((num_boards, 3), dtype=np.int64)
+        self.done: np.ndarray = np.zeros(num_boards, dtype=bool)
+
+    @property
+    def num_boards(self) -> int:
+        """The number of boards of the batch"""
+        return self.boards.shape[0]
+
+    def reset(self, seed: int | None = None) -> np.ndarray:
+        """Start a new game on every board, the tetrominos being drawn from seed
+
+        Returns:
+            The boards array
+        """
+        self.rng = np.random.default_rng(seed)
+        self.reset_boards(np.ones(self.num_boards, dtype=bool))
+        return self.boards
+
+    def reset_boards(self, mask: np.ndarray) -> None:
+        """Start a new game on the boards selected by a (N,) bool mask"""
+        indexes = np.flatnonzero(mask)
+        self.boards[indexes] = 0
+        self.timers[indexes] = 0
+        self.stats[indexes] = 0
+        self.done[indexes] = False
+        self._spawn(indexes)
+
+    def cells(self, pieces: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (x, y) coordinates of the blocks of a (K, 4) pieces array
+        as two (K, 4) arrays"""
+        offsets = SHAPE_OFFSETS[pieces[:, KIND], pieces[:, ROTATION]]
+        return offsets[:, :, 0] + pieces[:, X, None], offsets[:, :, 1] + pieces[:, Y, None]
+
+    def fits(self, indexes: np.ndarray, pieces: np.ndarray) -> np.ndarray:
+        """Return a bool array, True where the piece is inside its board
+        and does not overlap its locked blocks"""
+        lines, columns = self.boards.shape[1:]
+        x, y = self.cells(pieces)
+        inbound = (x >= 0) & (x < columns) & (y >= 0) & (y < lines)
+        occupied = (
+            self.boards[indexes[:, None], y.clip(0, lines - 1), x.clip(0, columns - 1)] != 0
+        )
+        return (inbound & ~occupied).all(axis=1)
+
+    def apply(self, actions: np.ndarray) -> np.ndarray:
+        """Apply a (N,) array of Action values to the active tetrominos
+        without advancing the games
+
+        Returns:
+            A (N,) bool array, True where the tetromino moved
+        """
+        actions = np.asarray(actions)
+        moved = np.zeros(self.num_boards, dtype=bool)
+        live = ~self.done
+        for action, column, delta in (
+            (Action.LEFT, X, -1),
+            (Action.RIGHT, X, 1),
+            (Action.DOWN, Y, 1),
+        ):
+            indexes = np.flatnonzero(live & (actions == action.value))
+            moved[indexes] = self._translate(indexes, column, delta)
+
+        indexes = np.flatnonzero(live & (actions == Action.ROTATE.value))
+        if indexes.size:
+            candidates = self.pieces[indexes].copy()
+            candidates[:, ROTATION] = NEXT_ROTATION[candidates[:, KIND], candidates[:, ROTATION]]
+            valid = self.fits(indexes, candidates)
+            self.pieces[indexes[valid]] = candidates[valid]
+            moved[indexes] = valid
+
+        indexes = np.flatnonzero(live & (actions == Action.DROP.value))
+        while indexes.size:
+            valid = self._translate(indexes, Y, 1)
+            moved[indexes[valid]] = True
+            indexes = indexes[valid]
+        return moved
+
+    def tick(self) -> np.ndarray:
+        """Advance every game by one tick: apply gravity, then lock the
+        tetrominos that rested for the lock delay
+
+        Returns:
+            A (N,) array of the number of lines cleared during the tick
+        """
+        live = ~self.done
+        self.stats[live, TICKS] += 1
+        self.timers[live, GRAVITY] += 1
+        falling = np.flatnonzero(live & (self.timers[:, GRAVITY] >= self.rules.gravity_ticks))
+        self.timers[falling, GRAVITY] = 0
+        self._translate(falling, Y, 1)
+
+        indexes = np.flatnonzero(live)
+        below = self.pieces[indexes].copy()
+        below[:, Y] += 1
+        resting = ~self.fits(indexes, below)
+        self.timers[indexes[~resting], LOCK] = 0
+        self.timers[indexes[resting], LOCK] += 1
+        locking = indexes[resting & (self.timers[indexes, LOCK] > self.rules.lock_delay_ticks)]
+
+        lines_cleared = np.zeros(self.num_boards, dtype=np.int64)
+        if locking.size:
+            self._lock(locking)
+            lines_cleared[locking] = self._clear_lines(locking)
+            self.stats[locking, PIECES_PLACED] += 1
+            self.stats[locking, LINES_CLEARED] += lines_cleared[locking]
+            self._spawn(locking)
+        return lines_cleared
+
+    def step(
+        self, actions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict[str, Any]]:
+        """Apply a (N,) array of Action values and advance every game by one tick
+
+        Returns:
+            The boards, the (N,) lines cleared as rewards,
+            the (N,) done flags and a dict of (N,) statistics arrays
+        """
+        self.apply(actions)
+        rewards = self.tick()
+        info = {
+            "ticks": self.stats[:, TICKS],
+            "lines_cleared": self.stats[:, LINES_CLEARED],
+            "pieces_placed": self.stats[:, PIECES_PLACED],
+        }
+        return self.boards, rewards, self.done, info
+
+    def _translate(self, indexes: np.ndarray, column: int, delta: int) -> np.ndarray:
+        """Move the pieces of the selected boards where possible"""
+        if not indexes.size:
+            return np.zeros(0, dtype=bool)
+        candidates = self.pieces[indexes].copy()
+        candidates[:, column] += delta
+        valid = self.fits(indexes, candidates)
+        self.pieces[indexes[valid]] = candidates[valid]
+        return valid
+
+    def _lock(self, indexes: np.ndarray) -> None:
+        """Write the pieces of the selected boards into their boards
+        A block locked above a board ends its game"""
+        pieces = self.pieces[indexes]
+        x, y = self.cells(pieces)
+        colors = np.broadcast_to(pieces[:, KIND, None] + 1, x.shape)
+        inbound = y >= 0
+        board_indexes = np.broadcast_to(indexes[:, None], x.shape)
+        self.boards[board_indexes[inbound], y[inbound], x[inbound]] = colors[inbound]
+        self.done[indexes[~inbound.all(axis=1)]] = True
+
+    def _clear_lines(self, indexes: np.ndarray) -> np.ndarray:
+        """Delete the complete rows of the selected boards, the rows above falling down
+
+        Returns:
+            The number of rows deleted on each selected board
+        """
+        boards = self.boards[indexes]
+        complete = (boards != 0).all(axis=2)
+        cleared = complete.sum(axis=1)
+        if not cleared.any():
+            return cleared
+        # a stable sort moves the complete rows on top and keeps the order of the others
+        order = np.argsort(~complete, axis=1, kind="stable")
+        boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+        boards[np.arange(boards.shape[1])[None, :] < cleared[:, None]] = 0
+        self.boards[indexes] = boards
+        return cleared
+
+    def _spawn(self, indexes: np.ndarray) -> None:
+        """Draw a new tetromino on the selected boards
+        A new tetromino overlapping the locked blocks or the sides of the board,
+        when the board is narrower than the tetromino, ends the game"""
+        kinds = self.rng.integers(len(KINDS), size=indexes.size)
+        self.pieces[indexes, KIND] = kinds
+        self.pieces[indexes, ROTATION] = 0
+        self.pieces[indexes, X:] = SPAWN_ORIGINS[kinds]
+        self.timers[indexes] = 0
+        lines, columns = self.boards.shape[1:]
+        x, y = self.cells(self.pieces[indexes])
+        outside = (x < 0) | (x >= columns)
+        locked = self.boards[indexes[:, None], y.clip(0, lines - 1), x.clip(0, columns - 1)] != 0
+        occupied = outside | (locked & (y >= 0))
+        self.done[indexes[occupied.any(axis=1)]] = True
@@ -0,0 +1,160 @@
+"""This module contains the Viewer class and the split mode of the game
+In split mode the game logic runs in a simulation process, see
+tetrominos.shared_map, and every viewer process renders the latest map
+published by the simulation in its own window. The arrow keys of any viewer
+control the game, so a render hitch of a viewer never costs a logic tick.
+
+Usage:
+    python -m tetrominos.viewer
+    python -m tetrominos.viewer --viewers 2 --tick-rate 240
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import queue
+import time
+
+import pygame
+
+from tetrominos.app import KEY_ACTIONS
+from tetrominos.map import Map
+from tetrominos.matrix import Matrix
+from tetrominos.shared_map import SharedMapBuffer, run_simulation
+from tetrominos.timestep import LoopSettings
+from tetrominos.window import Window
+
+__all__ = ["Viewer", "run_split"]
+
+# The seconds a viewer waits for the first frame before giving up on the simulation
+FIRST_FRAME_TIMEOUT = 10.0
+
+
+class Viewer:
+    """The viewer renders the map published to a shared buffer
+    and sends the actions of the arrow keys to the simulation"""
+
+    def __init__(self, buffer: SharedMapBuffer, inputs: queue.Queue, frame_rate: int = 60) -> None:
+        pygame.init()
+        self.buffer: SharedMapBuffer = buffer
+        self.inputs: queue.Queue = inputs
+        self.frame_rate: int = frame_rate
+        self.running: bool = True
+        self.window: pygame.Surface = Window(width_in_pixels=1280, height_in_pixels=720).surface
+        self.map: Map = Map.from_snapshot(self.wait_for_first_frame())
+        self.matrix: Matrix = Matrix(
+            surface=self.window, block_size_in_pixels=30, game_map=self.map
+        )
+
+    def wait_for_first_frame(self) -> bytes:
+        """Return the first snapshot published by the simulation
+
+        Raises:
+            TimeoutError: if nothing was published within FIRST_FRAME_TIMEOUT seconds,
+            like when the simulation died while starting
+        """
+        deadline = time.monotonic() + FIRST_FRAME_TIMEOUT
+        while (snapshot := self.buffer.read()) is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"The simulation published no frame within {FIRST_FRAME_TIMEOUT}s"
+                )
+            pygame.time.wait(1)
+        return snapshot
+
+    def handle_event(self, event: pygame.event.Event) -> None:
+        """Forward the arrow keys to the simulation, and stop on exit"""
+        if event.type == pygame.QUIT:
+            self.running = False
+        elif event.type == pygame.WINDOWEXPOSED:
+            self.matrix.invalidate()
+        elif event.type == pygame.KEYDOWN and event.key in KEY_ACTIONS:
+            self.inputs.put(KEY_ACTIONS[event.key].value)
+
+    def render(self) -> None:
+        """Render the latest map published by the simulation, if it changed"""
+        snapshot = self.buffer.read()
+        if snapshot is not None:
+            self.map.restore(snapshot)
+        if self.matrix.drawn_rows is None:
+            self.window.fill(pygame.Color("grey"))
+            self.matrix.render_matrix()
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.matrix.render_matrix())
+
+    def run(self) -> None:
+        """Render frames until the window is closed"""
+        clock = pygame.time.Clock()
+        while self.running:
+            for event in pygame.event.get():
+                self.handle_event(event)
+            self.render()
+            clock.tick(self.frame_rate)
+        pygame.quit()
+
+
+def run_viewer(buffer_name: str, inputs: queue.Queue, frame_rate: int = 60) -> None:
+    """Entry point of a viewer process"""
+    buffer = SharedMapBuffer.attach(buffer_name)
+    try:
+        Viewer(buffer, inputs, frame_rate).run()
+    finally:
+        buffer.close()
+
+
+def run_split(
+    viewers: int = 1,
+    columns: int = 10,
+    lines: int = 20,
+    settings: LoopSettings = LoopSettings(),
+) -> None:
+    """Run a simulation process feeding viewer processes, until every viewer is closed"""
+    buffer = SharedMapBuffer.create(Map(columns, lines).snapshot_size)
+    inputs: multiprocessing.Queue = multiprocessing.Queue()
+    simulation = multiprocessing.Process(
+        target=run_simulation, args=(buffer.name, inputs, columns, lines, settings)
+    )
+    simulation.start()
+    viewer_processes = [
+        multiprocessing.Process(
+            target=run_viewer, args=(buffer.name, inputs, settings.frame_rate_limit or 60)
+        )
+        for _ in range(viewers)
+    ]
+    for process in viewer_processes:
+        process.start()
+    try:
+        for process in viewer_processes:
+            process.join()
+    finally:
+        inputs.put(None)
+        simulation.join()
+        buffer.close()
+        buffer.unlink()
+
+
+def build_parser(parser: argparse.ArgumentParser | None = None) -> argparse.ArgumentParser:
+    """Add the arguments of the split mode to a parser"""
+    parser = parser or argparse.ArgumentParser(description="Play with the logic in its own process")
+    parser.add_argument("--viewers", type=int, default=1, help="number of viewer windows")
+    parser.add_argument("--columns", type=int, default=10, help="columns of the board")
+    parser.add_argument("--lines", type=int, default=20, help="lines of the board")
+    parser.add_argument("--tick-rate", type=int, default=240, help="logic ticks per second")
+    parser.add_argument("--frame-rate", type=int, default=60, help="frames per second per viewer")
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> None:
+    """Run the split mode"""
+    run_split(
+        arguments.viewers,
+        arguments.columns,
+        arguments.lines,
+        LoopSettings(tick_rate=arguments.tick_rate, frame_rate_limit=arguments.frame_rate),
+    )
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -12,6 +12,7 @@ class Window:
 
     width_in_pixels: int
     height_in_pixels: int
+    vsync: bool = False
 
     @property
     def surface(self) -> pygame.Surface:
@@ -20,4 +21,9 @@ class Window:
         Returns:
             A Pygame Surface object reprenting the app window
         """
+        if self.vsync:
+            # vsync is only available to the scaled and OpenGL displays
+            return pygame.display.set_mode(
+                (self.width_in_pixels, self.height_in_pixels), flags=pygame.SCALED, vsync=1
+            )
         return pygame.display.set_mode((self.width_in_pixels, self.height_in_pixels))
@@ -0,0 +1,129 @@
+"""This module contains the code related to Zobrist hashing
+The hash of a map is the XOR of independent 64-bit keys:
+- one key per non-empty line, derived from its number and its occupancy bitmask
+- one key for the state of the active tetromino
+- one key for the kinds of the next tetrominos
+so moving, freezing a tetromino or clearing rows only updates a few keys.
+The keys are derived with the splitmix64 mixing function rather than drawn from
+a random table, so they are the same in every process and for any board size.
+
+The TranspositionTable caches evaluations of hashed maps for search code.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import Any
+
+from tetrominos.tetromino import TETROMINO_CLASSES, PieceState
+
+__all__ = [
+    "splitmix64",
+    "row_key",
+    "rows_hash",
+    "piece_key",
+    "queue_key",
+    "TranspositionTable",
+]
+
+MASK64 = (1 << 64) - 1
+ROW_SALT = 0x243F6A8885A308D3
+PIECE_SALT = 0x13198A2E03707344
+QUEUE_SALT = 0xA4093822299F31D0
+KIND_INDEXES: dict[str, int] = {kind: index for index, kind in enumerate(TETROMINO_CLASSES)}
+
+
+def splitmix64(value: int) -> int:
+    """Mix a 64-bit integer into a well distributed 64-bit key"""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def row_key(line: int, mask: int) -> int:
+    """Return the key of a line from its number and its occupancy bitmask"""
+    key = splitmix64(line ^ ROW_SALT)
+    while True:
+        key = splitmix64(key ^ (mask & MASK64))
+        mask >>= 64
+        if not mask:
+            return key
+
+
+def rows_hash(rows: list[int], lines: Iterable[int]) -> int:
+    """Return the XOR of the keys of the non-empty lines among some lines"""
+    result = 0
+    for line in lines:
+        if rows[line]:
+            result ^= row_key(line, rows[line])
+    return result
+
+
+@lru_cache(maxsize=1 << 16)
+def piece_key(state: PieceState) -> int:
+    """Return the key of the state of a tetromino"""
+    origin_x, origin_y = state.origin
+    packed = KIND_INDEXES[state.kind] | state.rotation_index << 3
+    packed |= (origin_x & 0xFFFFFF) << 8 | (origin_y & 0xFFFFFF) << 32
+    return splitmix64(packed ^ PIECE_SALT)
+
+
+@lru_cache(maxsize=1 << 12)
+def queue_key(kinds: tuple[str, ...]) -> int:
+    """Return the key of the kinds of the next tetrominos"""
+    key = QUEUE_SALT
+    for kind in kinds:
+        key = splitmix64(key ^ KIND_INDEXES[kind])
+    return key
+
+
+class TranspositionTable:
+    """A bounded cache of evaluations indexed by Zobrist hashes
+
+    Every entry stores the depth of the search that produced it:
+    - a lookup only hits entries searched at least as deep as requested
+    - a store never replaces an entry searched deeper (depth-preferred)
+    - when the table is full, the least recently used entry is evicted
+    """
+
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        self.capacity: int = capacity
+        self.entries: OrderedDict[int, tuple[int, Any]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: int, depth: int = 0, default: Any = None) -> Any:
+        """Return the value stored for a key at a depth of at least depth"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: int, value: Any, depth: int = 0) -> None:
+        """Store the value of a key searched at a depth"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if entry[0] > depth:
+                return
+        self.entries[key] = (depth, value)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)